@@ -8,16 +8,38 @@ def create_app(test_config=None):
     """Create and configure the Flask application instance"""
     app = Flask(__name__)
     
-    if test_config is None:
-        # Load production config
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.abspath('agent_app/instance/cash_flow.db')
-    else:
+    if test_config is not None:
         # Load test config
         app.config.update(test_config)
     
+    # Database from DATABASE_URL (SQLite file by default), pool settings and an optional read replica
+    from .src.database import configure_database
+    configure_database(app.config, default_url='sqlite:///' + os.path.abspath('agent_app/instance/cash_flow.db'))
+    
+    # Reject larger uploads with 413 before they are read; Werkzeug spools
+    # accepted files over 500 KB to disk rather than memory. MAX_CONTENT_LENGTH
+    # caps single-receipt requests; the batch endpoint replaces it with
+    # RECEIPT_BATCH_MAX_CONTENT_LENGTH for its own requests, sized for a few
+    # hundred phone photos. Photos barely compress, so zip archives in a batch
+    # may expand to the same size (RECEIPT_BATCH_MAX_EXPANDED_SIZE)
+    app.config.setdefault('MAX_CONTENT_LENGTH', 64 * 1024 * 1024)
+    app.config.setdefault('RECEIPT_BATCH_MAX_CONTENT_LENGTH', 4 * 1024 * 1024 * 1024)
+    app.config.setdefault('RECEIPT_BATCH_MAX_EXPANDED_SIZE', app.config['RECEIPT_BATCH_MAX_CONTENT_LENGTH'])
+    
+    # Receipt images are served from /static/image/receipts; create the folder once here
+    app.config.setdefault('RECEIPT_UPLOAD_FOLDER', os.path.join(app.static_folder, 'image', 'receipts'))
+    os.makedirs(app.config['RECEIPT_UPLOAD_FOLDER'], exist_ok=True)
+    
     # Initialize database
     db.init_app(app)
     
+    # SQLite pragmas (WAL, busy timeout, ...), connect hooks and optional write serialization
+    from .src.database import configure_engines, configure_replica
+    serializer = configure_engines(app)
+    if serializer is not None:
+        app.extensions['write_serializer'] = serializer
+    configure_replica(app)
+    
     # Initialize migration
     migrate = Migrate(app, db)
     
@@ -25,6 +47,34 @@ def create_app(test_config=None):
     from .src.routes import cashflow_bp
     app.register_blueprint(cashflow_bp)
     
+    # Forecast cache (FORECAST_CACHE_SIZE = 0 disables it)
+    from .src.cache import ForecastCache
+    if app.config.get('FORECAST_CACHE_SIZE', 256):
+        app.extensions['forecast_cache'] = ForecastCache.from_config(app.config)
+    
+    # Columnar ledger snapshots shared across requests, keyed by ledger version
+    from .src.snapshot import snapshot_cache_from_config
+    snapshots = snapshot_cache_from_config(app.config)
+    if snapshots is not None:
+        app.extensions['ledger_snapshots'] = snapshots
+    
+    # Dashboard KPIs, cached per user for DASHBOARD_CACHE_TTL seconds
+    from .src.dashboard import DashboardService
+    app.extensions['dashboard'] = DashboardService.from_config(app.config)
+    
+    # Pooled Anthropic clients shared by every request and worker thread
+    from .src.llm import LLMClientRegistry
+    app.extensions['llm_clients'] = LLMClientRegistry.from_config(app.config)
+    
+    # Receipt extraction worker pool (threads start on the first upload)
+    from .src.jobs import ReceiptJobQueue
+    app.extensions['receipt_jobs'] = ReceiptJobQueue.from_config(app)
+    
+    # Register CLI commands (importing the ledger also installs its write hooks)
+    from .src.commands import ledger_cli, transactions_cli
+    app.cli.add_command(ledger_cli)
+    app.cli.add_command(transactions_cli)
+    
     return app
 
 # Create an application instance for production
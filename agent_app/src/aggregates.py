@@ -0,0 +1,106 @@
+from sqlalchemy import case, func
+from .models import Transaction, InitialBalance, db, parse_date
+
+
+class LedgerAggregates:
+    """SQL-side aggregation over a user's ledger.
+
+    Every method runs a single SUM/GROUP BY statement in the database and returns
+    plain Python values, so memory use does not depend on how many rows the user has.
+    """
+
+    def __init__(self, user_id, session=None):
+        self.user_id = user_id
+        self.session = session or db.session
+
+    def _in_range(self, query, start_date=None, end_date=None):
+        """Apply the user filter and an optional inclusive date range to a query
+
+        The range is applied to the typed txn_date column so it can use the
+        (user_id, txn_date) / (user_id, type, txn_date) indexes. A bound that
+        isn't YYYY-MM-DD raises ValueError instead of silently matching nothing.
+        """
+        for bound, value in (("start_date", start_date), ("end_date", end_date)):
+            if value and parse_date(value) is None:
+                raise ValueError(f"{bound} must be YYYY-MM-DD")
+        query = query.filter(Transaction.user_id == self.user_id)
+        if start_date:
+            query = query.filter(Transaction.txn_date >= parse_date(start_date))
+        if end_date:
+            query = query.filter(Transaction.txn_date <= parse_date(end_date))
+        return query
+
+    def initial_balance(self):
+        """Get the user's starting balance (0.0 if none has been recorded)"""
+        balance = self.session.query(InitialBalance.balance)\
+            .filter(InitialBalance.user_id == self.user_id)\
+            .limit(1).scalar()
+        return float(balance) if balance is not None else 0.0
+
+    def net_total(self, start_date=None, end_date=None):
+        """Sum of income minus sum of expenses, computed in one statement"""
+        signed_amount = case(
+            (Transaction.type == "income", Transaction.amount),
+            (Transaction.type == "expense", -Transaction.amount),
+            else_=0.0
+        )
+        query = self._in_range(self.session.query(func.sum(signed_amount)), start_date, end_date)
+        return float(query.scalar() or 0.0)
+
+    def balance(self):
+        """Initial balance plus all income minus all expenses"""
+        return self.initial_balance() + self.net_total()
+
+    def totals_by_type(self, start_date=None, end_date=None):
+        """Return {"income": total, "expense": total} for the date range"""
+        query = self._in_range(
+            self.session.query(Transaction.type, func.sum(Transaction.amount)),
+            start_date, end_date
+        ).group_by(Transaction.type)
+
+        totals = {"income": 0.0, "expense": 0.0}
+        for tx_type, total in query:
+            totals[tx_type] = float(total or 0.0)
+        return totals
+
+    def monthly_totals(self, start_date=None, end_date=None):
+        """Return per-month income/expense totals grouped by (type, month) in SQL
+
+        Dates are stored as YYYY-MM-DD strings, so the month key is the first
+        seven characters, which works the same way on every supported backend.
+        """
+        month = func.substr(Transaction.date, 1, 7)
+        query = self._in_range(
+            self.session.query(month, Transaction.type, func.sum(Transaction.amount), func.count(Transaction.id)),
+            start_date, end_date
+        ).group_by(month, Transaction.type).order_by(month)
+
+        months = {}
+        for month_key, tx_type, total, count in query:
+            row = months.setdefault(month_key, {"month": month_key, "income": 0.0, "expense": 0.0, "count": 0})
+            row[tx_type] = float(total or 0.0)
+            row["count"] += count
+        return list(months.values())
+
+    def window_totals(self, window_start, previous_start):
+        """Per-type totals for all time, the current window and the one before, in one statement
+
+        Returns {type: {"total", "current", "previous"}} where "current" covers
+        dates on or after `window_start` and "previous" dates from `previous_start`
+        up to (not including) `window_start`.
+        """
+        window_start, previous_start = parse_date(window_start), parse_date(previous_start)
+        current = func.sum(case((Transaction.txn_date >= window_start, Transaction.amount), else_=0.0))
+        previous = func.sum(case(
+            ((Transaction.txn_date >= previous_start) & (Transaction.txn_date < window_start), Transaction.amount),
+            else_=0.0
+        ))
+        query = self._in_range(
+            self.session.query(Transaction.type, func.sum(Transaction.amount), current, previous)
+        ).group_by(Transaction.type)
+
+        totals = {tx_type: {"total": 0.0, "current": 0.0, "previous": 0.0} for tx_type in ("income", "expense")}
+        for tx_type, total, current_total, previous_total in query:
+            totals[tx_type] = {"total": float(total or 0.0), "current": float(current_total or 0.0),
+                               "previous": float(previous_total or 0.0)}
+        return totals
@@ -0,0 +1,190 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from flask import current_app, has_app_context
+from .database import analytics_session
+from .ledger import ledger_fingerprint, on_ledger_change
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a per-entry time to live"""
+
+    def __init__(self, max_size=256, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value, or None when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate):
+        """Drop every entry whose key matches predicate; returns how many were dropped"""
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheStore:
+    """Persistent second tier: JSON values in a standalone SQLite file
+
+    Kept separate from the application database so cache traffic never contends
+    with ledger writes, and so the file can be deleted at any time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS forecast_cache ("
+                "key TEXT PRIMARY KEY, user_id INTEGER NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_forecast_cache_user ON forecast_cache (user_id)")
+
+    def _connect(self):
+        # One short-lived connection per operation keeps the store safe to use from worker threads
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM forecast_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, user_id, value, ttl):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO forecast_cache (key, user_id, value, expires_at) VALUES (?, ?, ?, ?)",
+                (key, user_id, json.dumps(value), time.time() + ttl)
+            )
+            conn.execute("DELETE FROM forecast_cache WHERE expires_at <= ?", (time.time(),))
+
+    def invalidate_user(self, user_id):
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM forecast_cache WHERE user_id = ?", (user_id,)).rowcount
+
+
+class ForecastCache:
+    """Cache of finished forecasts keyed by (user, horizon, mode, ledger fingerprint, day)
+
+    The ledger fingerprint changes with every write, so a stale forecast is never
+    served even when several processes share the persistent tier; the ledger's
+    change notifications additionally drop a user's entries as soon as a write
+    commits. The current date is part of the key because forecasts start tomorrow.
+
+    The fingerprint is read through the analytics session, which is where the
+    forecast inputs come from: a forecast computed on a lagging replica is
+    keyed by the ledger state it saw, and is no longer found once the replica
+    catches up.
+    """
+
+    def __init__(self, max_size=256, ttl=3600, path=None):
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.store = SQLiteCacheStore(path) if path else None
+        self.ttl = ttl
+        self.store_hits = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the cache from FORECAST_CACHE_SIZE, FORECAST_CACHE_TTL and FORECAST_CACHE_PATH"""
+        return cls(
+            max_size=config.get('FORECAST_CACHE_SIZE', 256),
+            ttl=config.get('FORECAST_CACHE_TTL', 3600),
+            path=config.get('FORECAST_CACHE_PATH')
+        )
+
+    @staticmethod
+    def key(user_id, days, mode, fingerprint=None):
+        fingerprint = fingerprint if fingerprint is not None else ledger_fingerprint(user_id, analytics_session())
+        return (user_id, days, mode, fingerprint, date.today().isoformat())
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.store is not None:
+            value = self.store.get(self._store_key(key))
+            if value is not None:
+                self.store_hits += 1
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.store is not None:
+            self.store.set(self._store_key(key), key[0], value, self.ttl)
+
+    def invalidate_user(self, user_id):
+        dropped = self.memory.invalidate(lambda key: key[0] == user_id)
+        if self.store is not None:
+            dropped += self.store.invalidate_user(user_id)
+        return dropped
+
+    def clear(self):
+        self.memory.clear()
+
+    def stats(self):
+        lookups = self.memory.hits + self.memory.misses
+        return {
+            "hits": self.memory.hits + self.store_hits,
+            "memory_hits": self.memory.hits,
+            "persistent_hits": self.store_hits,
+            "misses": self.memory.misses - self.store_hits,
+            "hit_rate": round((self.memory.hits + self.store_hits) / lookups, 4) if lookups else 0.0,
+            "size": len(self.memory),
+            "max_size": self.memory.max_size,
+            "ttl": self.ttl,
+            "persistent": self.store is not None,
+        }
+
+    @staticmethod
+    def _store_key(key):
+        return ":".join(str(part) for part in key)
+
+
+def forecast_cache():
+    """The current app's forecast cache, or None outside an app or when disabled"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('forecast_cache')
+
+
+@on_ledger_change
+def _invalidate_forecasts(user_ids):
+    cache = forecast_cache()
+    if cache is not None:
+        for user_id in user_ids:
+            cache.invalidate_user(user_id)
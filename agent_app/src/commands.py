@@ -0,0 +1,67 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from .models import db
+from .importer import FORMATS, TransactionImporter
+from .ledger import rebuild_monthly_summaries, reconcile_balances
+
+ledger_cli = AppGroup('ledger', help='Maintain the materialized ledger tables.')
+
+
+@ledger_cli.command('reconcile')
+@click.option('--user-id', type=int, multiple=True, help='Only reconcile these users (repeatable).')
+@click.option('--dry-run', is_flag=True, help='Report drift without rebuilding the snapshots.')
+def reconcile_command(user_id, dry_run):
+    """Rebuild balance snapshots from InitialBalance + Transaction and report drift"""
+    reports = reconcile_balances(user_ids=list(user_id) or None, fix=not dry_run)
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+
+    drifted = 0
+    for report in reports:
+        if report["status"] == "missing":
+            click.echo(f"user {report['user_id']}: no snapshot, actual balance {report['actual_balance']:.2f}")
+        else:
+            click.echo(f"user {report['user_id']}: snapshot {report['snapshot_balance']:.2f}, "
+                       f"actual {report['actual_balance']:.2f}, drift {report['drift']:+.2f} [{report['status']}]")
+        drifted += report["status"] == "drift"
+
+    action = "reported" if dry_run else "rebuilt"
+    click.echo(f"{len(reports)} snapshot(s) {action}, {drifted} with drift")
+
+
+@ledger_cli.command('rebuild-summaries')
+@click.option('--user-id', type=int, multiple=True, help='Only rebuild these users (repeatable).')
+def rebuild_summaries_command(user_id):
+    """Recompute the monthly summary rollup from the transactions"""
+    rebuilt = rebuild_monthly_summaries(user_ids=list(user_id) or None)
+    db.session.commit()
+    for uid, rows in rebuilt.items():
+        click.echo(f"user {uid}: {rows} monthly summary row(s)")
+    click.echo(f"{len(rebuilt)} rollup(s) rebuilt")
+
+
+transactions_cli = AppGroup('transactions', help='Bulk operations on transactions.')
+
+
+@transactions_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user-id', type=int, default=1, show_default=True, help='Import into this user\'s ledger.')
+@click.option('--format', 'file_format', type=click.Choice(FORMATS), help='File format (detected if omitted).')
+@click.option('--batch-size', type=int, help='Rows per INSERT batch (default IMPORT_BATCH_SIZE or 1000).')
+@click.option('--date-format', help='strptime format of the date column, e.g. %d/%m/%Y.')
+def import_command(path, user_id, file_format, batch_size, date_format):
+    """Import a CSV or OFX bank export, skipping rows already in the ledger"""
+    importer = TransactionImporter.from_config(user_id, current_app.config,
+                                               batch_size=batch_size, date_format=date_format)
+    try:
+        report = importer.import_file(path, file_format)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    for error in report["errors"]:
+        click.echo(f"row {error['row']}: {error['message']}", err=True)
+    click.echo(f"{report['rows']} row(s) read: {report['inserted']} inserted, {report['duplicates']} duplicate(s), "
+               f"{report['invalid']} invalid in {report['seconds']:.2f}s ({report['rows_per_second']} rows/s)")
@@ -0,0 +1,121 @@
+import threading
+from datetime import date, datetime, timedelta
+from flask import current_app, has_app_context
+from .aggregates import LedgerAggregates
+from .cache import LRUCache
+from .database import analytics_session
+from .ledger import BalanceLedger, ledger_fingerprint, on_ledger_change
+from .models import db
+
+# Length of the trailing window the dashboard compares with the one before it
+WINDOW_DAYS = 30
+
+
+def percent_change(current, previous):
+    return round((current - previous) / previous * 100, 1) if previous else 0.0
+
+
+class DashboardService:
+    """Dashboard KPIs per user, computed in one grouped query and cached briefly
+
+    Revenue, expenses and net for all time, the last 30 days and the 30 days
+    before come from a single SUM/GROUP BY statement; the balance comes from the
+    materialized ledger snapshot. Results are kept for DASHBOARD_CACHE_TTL seconds
+    and dropped as soon as a write to the user's ledger commits, so repeated page
+    loads don't touch the transaction table at all. Concurrent misses for the
+    same user wait for one computation instead of each running the query.
+
+    KPIs read from a read replica that hasn't caught up with the user's last
+    write are returned but not cached, so the lag doesn't outlive the request.
+    """
+
+    def __init__(self, max_size=1024, ttl=30):
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        # Bumped by every invalidation, so a computation that raced a write isn't cached
+        self._generations = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the service from DASHBOARD_CACHE_SIZE and DASHBOARD_CACHE_TTL"""
+        return cls(max_size=config.get('DASHBOARD_CACHE_SIZE', 1024), ttl=config.get('DASHBOARD_CACHE_TTL', 30))
+
+    def kpis(self, user_id):
+        # The windows move at midnight, so the date is part of the key
+        key = (user_id, date.today().isoformat())
+        kpis = self.cache.get(key)
+        if kpis is not None:
+            return kpis
+        with self._locks_guard:
+            lock = self._locks.setdefault(user_id, threading.Lock())
+        with lock:
+            # Another request may have filled it while we waited
+            kpis = self.cache.get(key)
+            if kpis is None:
+                generation = self._generations.get(user_id, 0)
+                # Checked before computing: the replica only moves forward
+                current = self.replica_current(user_id)
+                kpis = self.compute(user_id)
+                if current and self._generations.get(user_id, 0) == generation:
+                    self.cache.set(key, kpis)
+        return kpis
+
+    @staticmethod
+    def replica_current(user_id):
+        """Whether the analytics session has every committed change to the user's ledger"""
+        session = analytics_session()
+        return session is db.session or ledger_fingerprint(user_id, session) == ledger_fingerprint(user_id)
+
+    @staticmethod
+    def compute(user_id):
+        # Read-only sums, so they may come from the read replica
+        session = analytics_session()
+        today = date.today()
+        window_start = today - timedelta(days=WINDOW_DAYS)
+        totals = LedgerAggregates(user_id, session).window_totals(window_start.isoformat(),
+                                                         (window_start - timedelta(days=WINDOW_DAYS)).isoformat())
+        income, expense = totals["income"], totals["expense"]
+        net = income["current"] - expense["current"]
+        previous_net = income["previous"] - expense["previous"]
+        margin = net / income["current"] * 100 if income["current"] else 0.0
+        previous_margin = previous_net / income["previous"] * 100 if income["previous"] else 0.0
+
+        return {
+            "user_id": user_id,
+            "window_days": WINDOW_DAYS,
+            "total_revenue": income["total"],
+            # Growth of all-time revenue over the last 30 days
+            "percent_change": percent_change(income["total"], income["total"] - income["current"]),
+            "revenue_30d": income["current"],
+            "revenue_change": percent_change(income["current"], income["previous"]),
+            "expenses_30d": expense["current"],
+            "expenses_change": percent_change(expense["current"], expense["previous"]),
+            "net_30d": net,
+            "net_change": percent_change(net, previous_net),
+            "net_total": income["total"] - expense["total"],
+            "profit_margin": round(margin, 1),
+            "profit_margin_change": round(margin - previous_margin, 1),
+            "balance": BalanceLedger(user_id, session).balance(),
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def invalidate_user(self, user_id):
+        with self._locks_guard:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        return self.cache.invalidate(lambda key: key[0] == user_id)
+
+
+def dashboard_service():
+    """The current app's dashboard service, or None outside an app"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('dashboard')
+
+
+@on_ledger_change
+def _invalidate_dashboard(user_ids):
+    service = dashboard_service()
+    if service is not None:
+        for user_id in user_ids:
+            service.invalidate_user(user_id)
@@ -0,0 +1,203 @@
+import os
+import re
+import threading
+from flask import current_app, has_app_context
+from flask.globals import app_ctx
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import scoped_session, sessionmaker
+from .models import db
+
+# Bind key of the optional read replica that analytics queries are routed to
+REPLICA = "replica"
+
+# Connection pool settings for server databases (PostgreSQL), overridable from config or the environment
+POOL_OPTIONS = {
+    # Connections kept open per process, and how many more may be opened under load
+    "DB_POOL_SIZE": ("pool_size", int, 10),
+    "DB_MAX_OVERFLOW": ("max_overflow", int, 20),
+    # Seconds to wait for a free connection before raising
+    "DB_POOL_TIMEOUT": ("pool_timeout", int, 30),
+    # Reopen connections older than this, before the server or a proxy drops them
+    "DB_POOL_RECYCLE": ("pool_recycle", int, 1800),
+    # Test each connection with a cheap round trip when it is checked out
+    "DB_POOL_PRE_PING": ("pool_pre_ping", lambda value: str(value).lower() in ("1", "true", "yes"), True),
+}
+
+# Applied to every new SQLite connection unless overridden through SQLITE_PRAGMAS
+SQLITE_PRAGMAS = {
+    # Readers no longer block the writer (or each other); commits append to the WAL
+    "journal_mode": "WAL",
+    # In WAL mode only checkpoints fsync; a power cut can lose the last commits, never corrupt
+    "synchronous": "NORMAL",
+    # Wait this many ms for a lock instead of failing with "database is locked"
+    "busy_timeout": 5000,
+    # Read through a 256 MB memory map instead of read() calls
+    "mmap_size": 256 * 1024 * 1024,
+    # Negative = KiB: a 16 MB page cache per connection
+    "cache_size": -16000,
+    "temp_store": "MEMORY",
+}
+
+WRITE_STATEMENT = re.compile(r"\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b", re.IGNORECASE)
+
+_connect_hooks = []
+
+
+def normalize_url(url):
+    """SQLAlchemy URL for a DATABASE_URL; the postgres:// scheme many hosts hand out becomes postgresql://"""
+    if url and url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def engine_options(url, config, environ):
+    """Pool options for a server database; SQLite keeps SQLAlchemy's own pool choice"""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    options = {}
+    for key, (option, convert, default) in POOL_OPTIONS.items():
+        value = config.get(key, environ.get(key))
+        options[option] = convert(value) if value is not None else default
+    return options
+
+
+def configure_database(config, default_url, environ=None):
+    """Fill in the engine settings of a Flask config from itself and the environment
+
+    The primary database is SQLALCHEMY_DATABASE_URI if the config sets it, else
+    DATABASE_URL, else `default_url`. Server databases get a tuned connection
+    pool (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING). DATABASE_REPLICA_URL adds a "replica" bind that
+    read-only analytics use (see analytics_session).
+    """
+    environ = os.environ if environ is None else environ
+    url = normalize_url(config.get('SQLALCHEMY_DATABASE_URI') or environ.get('DATABASE_URL') or default_url)
+    config['SQLALCHEMY_DATABASE_URI'] = url
+    options = config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    for option, value in engine_options(url, config, environ).items():
+        options.setdefault(option, value)
+
+    replica_url = normalize_url(config.get('DATABASE_REPLICA_URL') or environ.get('DATABASE_REPLICA_URL'))
+    if replica_url:
+        config.setdefault('SQLALCHEMY_BINDS', {}).setdefault(
+            REPLICA, dict(engine_options(replica_url, config, environ), url=replica_url))
+    return config
+
+
+def on_connect(hook):
+    """Register hook(dbapi_connection, dialect_name) to run on every new database connection"""
+    _connect_hooks.append(hook)
+    return hook
+
+
+def sqlite_pragmas(config):
+    """The pragmas for a config: SQLITE_PRAGMAS entries override the defaults, None removes one"""
+    pragmas = dict(SQLITE_PRAGMAS)
+    pragmas.update(config.get('SQLITE_PRAGMAS') or {})
+    return {name: value for name, value in pragmas.items() if value is not None}
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+class WriteSerializer:
+    """One writer at a time per process, queued in Python instead of in SQLite's busy loop
+
+    SQLite admits a single writer. When several threads write at once, the
+    losers sleep in SQLite's busy handler with growing back-off and retry, so
+    commits arrive late and in bursts. This lock is taken by a transaction's
+    first write statement and released when it commits or rolls back, so the
+    next writer starts as soon as the previous one is done. Reads never take it.
+    """
+
+    def __init__(self, timeout=5.0):
+        self.timeout = timeout
+        # Re-entrant: a thread that writes through a second connection fails on
+        # SQLite's busy timeout instead of deadlocking on itself
+        self._lock = threading.RLock()
+
+    def attach(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "commit", self._release)
+        event.listen(engine, "rollback", self._release)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get("write_lock") or not WRITE_STATEMENT.match(statement):
+            return
+        if not self._lock.acquire(timeout=self.timeout):
+            raise OperationalError(statement, parameters,
+                                   TimeoutError(f"waited {self.timeout}s for the write lock"))
+        conn.info["write_lock"] = True
+
+    def _release(self, conn):
+        if conn.info.pop("write_lock", False):
+            self._lock.release()
+
+
+def analytics_session():
+    """Session for read-only analytics: on the replica when one is configured, else db.session
+
+    A replica can lag the primary by a moment, so only use it for reads that
+    tolerate that (tool inputs, dashboard sums), never to read back a write.
+    """
+    if not has_app_context():
+        return db.session
+    replica = current_app.extensions.get('replica_session')
+    return replica() if replica is not None else db.session
+
+
+def _app_context_id():
+    return id(app_ctx._get_current_object())
+
+
+def configure_replica(app):
+    """Register a per-app-context session bound to the replica engine, if there is one"""
+    with app.app_context():
+        engine = db.engines.get(REPLICA)
+    # No model is bound to the replica; it gets its schema through replication,
+    # so keep create_all/drop_all (which visit every bind) off it
+    db.metadatas.pop(REPLICA, None)
+    if engine is None:
+        return None
+    session = scoped_session(sessionmaker(bind=engine, autoflush=False), scopefunc=_app_context_id)
+    app.extensions['replica_session'] = session
+    app.teardown_appcontext(lambda exception: session.remove())
+    return session
+
+
+def configure_engines(app):
+    """Install the SQLite pragmas, connect hooks and optional write serialization on the app's engines
+
+    SQLITE_TUNING = False leaves SQLite connections at the driver defaults;
+    SQLITE_SERIALIZE_WRITES = True queues writers in-process (see WriteSerializer).
+    """
+    tuning = app.config.get('SQLITE_TUNING', True)
+    pragmas = sqlite_pragmas(app.config)
+    serializer = None
+    if app.config.get('SQLITE_SERIALIZE_WRITES', False):
+        # Wait for the lock as long as SQLite would wait for its own
+        timeout = app.config.get('SQLITE_WRITE_TIMEOUT', pragmas.get('busy_timeout', 5000) / 1000)
+        serializer = WriteSerializer(timeout=timeout)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            dialect = engine.dialect.name
+
+            @event.listens_for(engine, "connect")
+            def _connected(dbapi_connection, connection_record, dialect=dialect):
+                if dialect == "sqlite" and tuning:
+                    apply_pragmas(dbapi_connection, pragmas)
+                for hook in _connect_hooks:
+                    hook(dbapi_connection, dialect)
+
+            if serializer is not None and dialect == "sqlite":
+                serializer.attach(engine)
+    return serializer
@@ -0,0 +1,124 @@
+import numpy as np
+from datetime import datetime, timedelta
+
+# Average number of days in a calendar month, used to spread monthly figures per day
+DAYS_PER_MONTH = 365.25 / 12
+
+
+def series_from_summaries(recurring):
+    """Turn the summaries from get_recurring_transactions into projectable series
+
+    Each series is {description, type, amount, period_days, next_date}. Series that
+    look inactive (several missed cycles) are left out of the projection.
+    """
+    return [{
+        "description": summary["description"],
+        "type": summary["type"],
+        "amount": summary["mean_amount"],
+        "period_days": summary["period_days"],
+        "next_date": summary["next_expected_date"],
+    } for summary in recurring if summary.get("active", True)]
+
+
+class LocalForecastEngine:
+    """Deterministic cash flow projection that runs without calling the LLM.
+
+    Recurring series are placed on their expected dates; whatever part of the monthly
+    averages they don't explain is spread evenly over every day as a baseline,
+    scaled by the month's seasonal multiplier when `seasonality` gives them
+    ({"income": [12 factors], "expense": [...]}, January first).
+    """
+
+    def __init__(self, balance, monthly_averages, recurring_series, start_date=None, seasonality=None):
+        self.balance = float(balance)
+        self.monthly_averages = monthly_averages
+        self.recurring_series = recurring_series
+        self.start_date = start_date or (datetime.now().date() + timedelta(days=1))
+        self.seasonality = seasonality or {}
+
+    def _baseline(self, tx_type, average):
+        """Daily amount of the monthly average not covered by recurring series"""
+        recurring_monthly = sum(
+            s["amount"] * DAYS_PER_MONTH / s["period_days"]
+            for s in self.recurring_series if s["type"] == tx_type
+        )
+        return max(average - recurring_monthly, 0.0) / DAYS_PER_MONTH
+
+    def project(self, days):
+        """Return day-by-day NumPy arrays: ordinals, income, expenses, net and running balance"""
+        start = self.start_date.toordinal()
+        ordinals = np.arange(start, start + days)
+
+        income = np.full(days, self._baseline("income", self.monthly_averages["avg_monthly_income"]))
+        expenses = np.full(days, self._baseline("expense", self.monthly_averages["avg_monthly_expenses"]))
+        if self.seasonality:
+            # Calendar month (0 = January) of every projected day
+            dates = np.datetime64(self.start_date, "D") + np.arange(days)
+            months = dates.astype("datetime64[M]").astype(np.int64) % 12
+            for tx_type, baseline in (("income", income), ("expense", expenses)):
+                if tx_type in self.seasonality:
+                    baseline *= np.asarray(self.seasonality[tx_type])[months]
+
+        for series in self.recurring_series:
+            first = datetime.strptime(series["next_date"], "%Y-%m-%d").date().toordinal() - start
+            if first >= days:
+                continue
+            # Every occurrence of the series inside the window, in one vectorized add
+            hits = np.arange(max(first, first % series["period_days"]), days, series["period_days"])
+            target = income if series["type"] == "income" else expenses
+            target[hits] += series["amount"]
+
+        net = income - expenses
+        balance = self.balance + np.cumsum(net)
+        return {"ordinals": ordinals, "income": income, "expenses": expenses, "net": net, "balance": balance}
+
+    def forecast(self, days):
+        """Project `days` days and return the daily rows plus period totals"""
+        arrays = self.project(days)
+        daily = [{
+            "date": datetime.fromordinal(int(ordinal)).strftime("%Y-%m-%d"),
+            "income": round(float(inc), 2),
+            "expenses": round(float(exp), 2),
+            "net": round(float(net), 2),
+            "balance": round(float(bal), 2),
+        } for ordinal, inc, exp, net, bal in zip(
+            arrays["ordinals"], arrays["income"], arrays["expenses"], arrays["net"], arrays["balance"])]
+
+        lowest = int(np.argmin(arrays["balance"])) if days else 0
+        summary = {
+            "total_income": round(float(arrays["income"].sum()), 2),
+            "total_expenses": round(float(arrays["expenses"].sum()), 2),
+            "net_cash_flow": round(float(arrays["net"].sum()), 2),
+            "final_balance": round(float(arrays["balance"][-1]), 2) if days else round(self.balance, 2),
+            "lowest_balance": round(float(arrays["balance"][lowest]), 2) if days else round(self.balance, 2),
+            "lowest_balance_date": daily[lowest]["date"] if days else None,
+        }
+        return {"daily": daily, "summary": summary}
+
+    def describe(self, days, result):
+        """Plain-text report in the same spirit as the LLM forecast"""
+        summary = result["summary"]
+        lines = [
+            f"Cash flow forecast for the next {days} days (deterministic projection)",
+            "",
+            f"Starting balance: ${self.balance:,.2f}",
+            f"Total expected income: ${summary['total_income']:,.2f}",
+            f"Total expected expenses: ${summary['total_expenses']:,.2f}",
+            f"Net cash flow: ${summary['net_cash_flow']:,.2f}",
+            f"Final projected balance: ${summary['final_balance']:,.2f}",
+            "",
+            "Key insights:",
+        ]
+        if summary["lowest_balance"] < 0:
+            first_negative = next(row["date"] for row in result["daily"] if row["balance"] < 0)
+            lines.append(f"- Balance is projected to go negative on {first_negative} "
+                         f"(low of ${summary['lowest_balance']:,.2f} on {summary['lowest_balance_date']}).")
+        else:
+            lines.append(f"- Lowest projected balance is ${summary['lowest_balance']:,.2f} "
+                         f"on {summary['lowest_balance_date']}.")
+        lines.append(f"- {len(self.recurring_series)} recurring series projected on their expected dates; "
+                     f"the rest of the monthly averages is spread evenly per day.")
+        for series in sorted(self.recurring_series, key=lambda s: -s["amount"])[:5]:
+            lines.append(f"- {series['description']}: ${series['amount']:,.2f} {series['type']} "
+                         f"every {series['period_days']} days, next on {series['next_date']}.")
+        return "\n".join(lines)
@@ -0,0 +1,135 @@
+import base64
+import io
+import logging
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are sent as uploaded
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# EXIF tag holding the camera orientation
+ORIENTATION = 0x0112
+# Multiple of 3, so chunks base64-encode without padding in the middle
+BASE64_CHUNK = 3 * 64 * 1024
+
+
+def base64_file(path, chunk_size=BASE64_CHUNK):
+    """Base64 text of a file, encoded a chunk at a time
+
+    The raw bytes are never held in full: the encoded text is built in one
+    preallocated buffer a chunk at a time and decoded once, so the peak is two
+    copies of the base64 (the request needs one anyway) instead of the file
+    plus two.
+    """
+    with open(path, "rb") as f:
+        # Sized from the open file, so a path that vanished fails once, on open
+        size = os.fstat(f.fileno()).st_size
+        encoded = bytearray(4 * ((size + 2) // 3))
+        position = 0
+        while chunk := f.read(chunk_size):
+            piece = base64.b64encode(chunk)
+            encoded[position:position + len(piece)] = piece
+            position += len(piece)
+    del encoded[position:]  # in place; only trims if the file shrank meanwhile
+    return encoded.decode("ascii")
+
+
+class ReceiptImagePreprocessor:
+    """Shrinks receipt photos before they are sent to the Vision model
+
+    Phone photos are often several megabytes and larger than the model will
+    look at anyway. The preprocessor applies the EXIF orientation, scales the
+    long edge down to `max_edge`, optionally converts to grayscale with
+    auto-contrast, and re-encodes at `quality`. JPEGs are decoded at reduced
+    scale when possible, so a 12 MP photo is never fully expanded in memory.
+
+    The output keeps the input format (JPEG stays JPEG, PNG stays PNG) so the
+    media type sent to the model is unchanged. If Pillow isn't installed, the
+    bytes can't be decoded, or processing wouldn't make the image smaller or
+    upright, the original bytes are returned.
+    """
+
+    def __init__(self, enabled=True, max_edge=1568, grayscale=True, autocontrast=True, quality=85):
+        self.enabled = enabled
+        self.max_edge = max_edge
+        self.grayscale = grayscale
+        self.autocontrast = autocontrast
+        self.quality = quality
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the preprocessor from the RECEIPT_PREPROCESS* / RECEIPT_IMAGE_* settings"""
+        return cls(enabled=config.get('RECEIPT_PREPROCESS', True),
+                   max_edge=config.get('RECEIPT_IMAGE_MAX_EDGE', 1568),
+                   grayscale=config.get('RECEIPT_IMAGE_GRAYSCALE', True),
+                   autocontrast=config.get('RECEIPT_IMAGE_AUTOCONTRAST', True),
+                   quality=config.get('RECEIPT_IMAGE_QUALITY', 85))
+
+    @property
+    def available(self):
+        return self.enabled and Image is not None
+
+    def process(self, data):
+        """Preprocessed image bytes for `data`, or `data` itself when nothing is gained"""
+        processed = self._try(io.BytesIO(data), len(data))
+        return data if processed is None else processed
+
+    def process_file(self, path):
+        """Preprocessed bytes for the image at `path`, or None to send the file as it is
+
+        The file is decoded straight from disk rather than read into memory first.
+        """
+        if not self.available:
+            return None
+        try:
+            size = os.path.getsize(path)
+        except OSError as e:
+            # Sending the file as it is reports the problem if it can't be read either
+            logger.warning("Receipt image preprocessing skipped: %s", e)
+            return None
+        return self._try(path, size)
+
+    def _try(self, source, size):
+        if not self.available:
+            return None
+        try:
+            return self._process(source, size)
+        except Exception as e:
+            # A file Pillow can't read is still worth sending to the model as is
+            logger.warning("Receipt image preprocessing skipped: %s", e)
+            return None
+
+    def _process(self, source, size):
+        with Image.open(source) as image:
+            image_format = image.format
+            if image_format not in ('JPEG', 'PNG'):
+                return None
+            rotated = image.getexif().get(ORIENTATION, 1) != 1
+            scale = self.max_edge / max(image.size) if self.max_edge else 1
+            if scale < 1 and image_format == 'JPEG':
+                # Let the JPEG decoder downscale by a power of two while decoding
+                image.draft('L' if self.grayscale else 'RGB',
+                            (max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+            image = ImageOps.exif_transpose(image)
+
+        if self.grayscale:
+            image = image.convert('L')
+            if self.autocontrast:
+                image = ImageOps.autocontrast(image, cutoff=1)
+        elif image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        if scale < 1:
+            image.thumbnail((self.max_edge, self.max_edge), Image.LANCZOS)
+
+        output = io.BytesIO()
+        if image_format == 'JPEG':
+            image.save(output, 'JPEG', quality=self.quality, optimize=True)
+        else:
+            image.save(output, 'PNG', optimize=True)
+        processed = output.getvalue()
+        if len(processed) >= size and not rotated:
+            return None
+        return processed
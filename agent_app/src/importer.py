@@ -0,0 +1,324 @@
+import csv
+import functools
+import hashlib
+import io
+import os
+import re
+import time
+from collections import Counter
+from datetime import date as Date, datetime
+from sqlalchemy import bindparam, func, select
+from .ledger import BalanceLedger, notify_ledger_change
+from .models import Transaction, db
+
+transactions = Transaction.__table__
+
+FORMATS = ("csv", "ofx")
+DEFAULT_BATCH_SIZE = 1000
+# Transaction.description is a String(100)
+DESCRIPTION_LENGTH = 100
+# Only the first few bad rows are reported, so the report stays small for any file
+MAX_ERRORS = 20
+
+# Tried in order when no date format is given; US month-first before day-first
+DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y", "%m/%d/%y", "%d.%m.%Y", "%d-%m-%Y",
+                "%d %b %Y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y", "%Y%m%d")
+
+# Header names bank exports use for each field, compared case-insensitively
+CSV_COLUMNS = {
+    "date": ("date", "transaction date", "posted date", "posting date", "booking date", "value date"),
+    "description": ("description", "payee", "name", "memo", "details", "narrative", "merchant"),
+    "amount": ("amount", "transaction amount", "value"),
+    "debit": ("debit", "withdrawal", "withdrawals", "money out", "paid out"),
+    "credit": ("credit", "deposit", "deposits", "money in", "paid in"),
+    "type": ("type", "transaction type"),
+}
+INCOME_TYPES = {"income", "credit", "cr", "deposit", "dep", "int", "div", "directdep"}
+EXPENSE_TYPES = {"expense", "debit", "dr", "withdrawal", "payment", "pos", "atm", "check", "fee",
+                 "srvchg", "directdebit", "xfer"}
+
+
+class ImportRowError(ValueError):
+    """A row that can't be turned into a transaction"""
+
+
+# Exports repeat the same few hundred dates, and strptime is the slowest step of a row
+@functools.lru_cache(maxsize=4096)
+def normalize_date(value, date_format=None):
+    """A bank-export date as the YYYY-MM-DD string Transaction.date holds
+
+    OFX timestamps (20240105120000.000[-5:EST]) keep only their date part.
+    Raises ImportRowError if no format matches.
+    """
+    value = (value or "").strip()
+    if re.fullmatch(r"\d{8}(\d{4,6}(\.\d+)?)?(\[.*\])?", value):
+        value = value[:8]
+    for pattern in ((date_format,) if date_format else DATE_FORMATS):
+        try:
+            return datetime.strptime(value, pattern).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ImportRowError(f"Unrecognized date {value!r}")
+
+
+def parse_amount(value):
+    """Float from '1,234.56', '1.234,56', '$-12.00', '(12.00)' or '12.00-'; None for an empty cell
+
+    A comma is the decimal separator when it comes after the last dot
+    ('1.234,56') or is the only one and has one or two digits after it
+    ('12,50'); otherwise commas group thousands ('1,234'). Numbers that still
+    don't parse (e.g. '1.234.567') raise ImportRowError.
+    """
+    text = (value or "").strip()
+    for symbol in ("$", "£", "€", " ", "\u00a0"):
+        text = text.replace(symbol, "")
+    if not text:
+        return None
+    negative = text.startswith("(") and text.endswith(")") or text.endswith("-")
+    text = text.strip("()").rstrip("-")
+    if "." in text and text.rfind(",") > text.rfind(".") or "." not in text and re.search(r"^[^,]*,\d{1,2}$", text):
+        text = text.replace(".", "").replace(",", ".")
+    else:
+        text = text.replace(",", "")
+    try:
+        amount = float(text)
+    except ValueError:
+        raise ImportRowError(f"Unrecognized amount {value!r}")
+    return -abs(amount) if negative else amount
+
+
+def clean_description(value):
+    return " ".join((value or "").split())[:DESCRIPTION_LENGTH] or "Imported transaction"
+
+
+def transaction_row(date, amount, description, type_hint=None):
+    """(date, amount, description, type) with a positive amount and income/expense type"""
+    hint = (type_hint or "").strip().lower()
+    if hint in INCOME_TYPES:
+        tx_type = "income"
+    elif hint in EXPENSE_TYPES:
+        tx_type = "expense"
+    else:
+        tx_type = "expense" if amount < 0 else "income"
+    return date, round(abs(amount), 2), clean_description(description), tx_type
+
+
+def row_key(date, amount, description):
+    """Dedupe key of a transaction: a short hash of (date, amount in cents, description)"""
+    text = f"{date}|{round(amount * 100)}|{description}"
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def parse_csv(stream, date_format=None):
+    """Yield (line, row or ImportRowError) for each data row of a CSV bank export
+
+    Columns are matched by header name (see CSV_COLUMNS). A single signed
+    amount column or separate debit/credit columns are both understood; a
+    type column, if present, decides income vs expense.
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    names = [name.strip().lower() for name in header]
+    columns = {field: next((names.index(alias) for alias in aliases if alias in names), None)
+               for field, aliases in CSV_COLUMNS.items()}
+    if columns["date"] is None or (columns["amount"] is None and columns["debit"] is None
+                                   and columns["credit"] is None):
+        raise ValueError("CSV needs a date column and an amount (or debit/credit) column")
+
+    def cell(record, field):
+        index = columns[field]
+        return record[index] if index is not None and index < len(record) else ""
+
+    for record in reader:
+        if not any(value.strip() for value in record):
+            continue
+        try:
+            date = normalize_date(cell(record, "date"), date_format)
+            if columns["amount"] is not None:
+                amount = parse_amount(cell(record, "amount"))
+            else:
+                credit, debit = parse_amount(cell(record, "credit")), parse_amount(cell(record, "debit"))
+                # Both cells empty is a missing amount, not a zero one
+                amount = None if credit is None and debit is None else (credit or 0.0) - abs(debit or 0.0)
+            if amount is None:
+                raise ImportRowError("Missing amount")
+            yield reader.line_num, transaction_row(date, amount, cell(record, "description"), cell(record, "type"))
+        except ImportRowError as e:
+            yield reader.line_num, e
+
+
+def _ofx_tags(stream, chunk_size=64 * 1024):
+    """Yield (tag, text) for each element of an OFX file, read a chunk at a time
+
+    Handles both SGML OFX 1.x (no closing tags) and XML OFX 2.x; a closing tag
+    is yielded as ('/TAG', '').
+    """
+    buffer = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        parts = buffer.split("<")
+        # The last part may be cut off mid-element unless the file has ended
+        buffer = parts.pop() if chunk else ""
+        for part in parts + ([buffer] if not chunk and buffer else []):
+            tag, _, text = part.partition(">")
+            if tag and not tag.startswith(("?", "!")):
+                yield tag.strip().upper(), text.strip()
+        if not chunk:
+            return
+
+
+def parse_ofx(stream, date_format=None):
+    """Yield (number, row or ImportRowError) for each <STMTTRN> of an OFX/QFX statement"""
+    fields, number = None, 0
+    for tag, text in _ofx_tags(stream):
+        if tag == "STMTTRN":
+            fields, number = {}, number + 1
+        elif tag == "/STMTTRN" and fields is not None:
+            try:
+                amount = parse_amount(fields.get("TRNAMT"))
+                if amount is None:
+                    raise ImportRowError("Missing TRNAMT")
+                description = " ".join(filter(None, [fields.get("NAME"), fields.get("MEMO")]))
+                yield number, transaction_row(normalize_date(fields.get("DTPOSTED"), date_format), amount,
+                                              description, None)
+            except ImportRowError as e:
+                yield number, e
+            fields = None
+        elif fields is not None and not tag.startswith("/"):
+            fields[tag] = text
+
+
+def detect_format(filename, head=""):
+    """csv or ofx from the file extension, falling back to the first bytes"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension in (".ofx", ".qfx"):
+        return "ofx"
+    if extension == ".csv":
+        return "csv"
+    return "ofx" if "OFXHEADER" in head or "<OFX" in head.upper() else "csv"
+
+
+class TransactionImporter:
+    """Streams a bank export into a user's ledger
+
+    Rows are parsed lazily, deduplicated and inserted with one executemany per
+    `batch_size` rows, all inside one database transaction, so memory depends on
+    the batch size rather than the file size. A row counts as a duplicate when the
+    ledger already held a row with the same (date, amount, description) before the
+    import started; each existing row absorbs at most one imported row, so
+    repeated purchases on one day are kept while re-importing a file adds nothing.
+    """
+
+    def __init__(self, user_id, batch_size=DEFAULT_BATCH_SIZE, date_format=None, session=None):
+        self.user_id = user_id
+        self.batch_size = max(int(batch_size), 1)
+        self.date_format = date_format
+        self.session = session or db.session
+
+    @classmethod
+    def from_config(cls, user_id, config, **overrides):
+        """Build an importer from IMPORT_BATCH_SIZE and IMPORT_DATE_FORMAT"""
+        options = {"batch_size": config.get("IMPORT_BATCH_SIZE", DEFAULT_BATCH_SIZE),
+                   "date_format": config.get("IMPORT_DATE_FORMAT")}
+        options.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(user_id, **options)
+
+    def rows(self, stream, file_format):
+        if file_format not in FORMATS:
+            raise ValueError(f"Unsupported format {file_format!r}")
+        parse = parse_ofx if file_format == "ofx" else parse_csv
+        return parse(stream, self.date_format)
+
+    def import_stream(self, stream, file_format="csv"):
+        """Import a text stream; commits once at the end and returns a report dict
+
+        Raises ValueError (after rolling back) if the file can't be read at all.
+        """
+        started = time.perf_counter()
+        report = {"rows": 0, "inserted": 0, "duplicates": 0, "invalid": 0, "errors": []}
+        # Rows above this id are our own inserts and never count as existing duplicates
+        self._existing_up_to = self.session.execute(
+            select(func.coalesce(func.max(transactions.c.id), 0)).where(transactions.c.user_id == self.user_id)
+        ).scalar()
+        # Existing rows already matched by an imported row, per key
+        self._matched = Counter()
+        try:
+            batch = []
+            for number, row in self.rows(stream, file_format):
+                report["rows"] += 1
+                if isinstance(row, ImportRowError):
+                    report["invalid"] += 1
+                    if len(report["errors"]) < MAX_ERRORS:
+                        report["errors"].append({"row": number, "message": str(row)})
+                    continue
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    self._flush(batch, report)
+                    batch = []
+            if batch:
+                self._flush(batch, report)
+            if report["inserted"]:
+                # Fold the new rows into the balance snapshot in the same transaction
+                BalanceLedger(self.user_id, self.session).checkpoint()
+            self.session.commit()
+        except (csv.Error, UnicodeDecodeError) as e:
+            self.session.rollback()
+            raise ValueError(f"Could not read the file: {e}")
+        except Exception:
+            self.session.rollback()
+            raise
+        if report["inserted"]:
+            notify_ledger_change({self.user_id})
+
+        seconds = time.perf_counter() - started
+        report["seconds"] = round(seconds, 3)
+        report["rows_per_second"] = round(report["rows"] / seconds) if seconds else report["rows"]
+        return report
+
+    def import_file(self, path, file_format=None):
+        """Import a CSV or OFX file from disk (the format is detected if not given)"""
+        with open(path, encoding="utf-8-sig", errors="replace", newline="") as stream:
+            file_format = file_format or detect_format(path, stream.read(512))
+            stream.seek(0)
+            return self.import_stream(stream, file_format)
+
+    def import_upload(self, upload, file_format=None):
+        """Import a werkzeug FileStorage without reading it into memory"""
+        stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", errors="replace", newline="")
+        try:
+            if file_format is None:
+                file_format = detect_format(upload.filename, stream.read(512))
+                stream.seek(0)
+            return self.import_stream(stream, file_format)
+        finally:
+            # Leave the upload stream to werkzeug
+            stream.detach()
+
+    def _existing(self, dates):
+        """Counter of keys of the rows that existed before the import, on the given dates"""
+        statement = select(transactions.c.date, transactions.c.amount, transactions.c.description).where(
+            transactions.c.user_id == self.user_id,
+            transactions.c.id <= self._existing_up_to,
+            transactions.c.txn_date.in_(bindparam("dates", expanding=True)),
+        )
+        return Counter(row_key(date, amount, description) for date, amount, description
+                       in self.session.execute(statement, {"dates": [Date.fromisoformat(d) for d in dates]}))
+
+    def _flush(self, batch, report):
+        existing = self._existing({row[0] for row in batch}) if self._existing_up_to else Counter()
+        mappings = []
+        for date, amount, description, tx_type in batch:
+            key = row_key(date, amount, description)
+            if self._matched[key] < existing[key]:
+                self._matched[key] += 1
+                report["duplicates"] += 1
+                continue
+            mappings.append({"user_id": self.user_id, "date": date, "txn_date": Date.fromisoformat(date),
+                             "description": description, "amount": amount, "type": tx_type})
+        if mappings:
+            # One executemany per batch; the ORM hooks are bypassed, hence the checkpoint at the end
+            self.session.execute(transactions.insert(), mappings)
+            report["inserted"] += len(mappings)
@@ -0,0 +1,157 @@
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from .models import ReceiptJob, db
+from .services import ReceiptExtraction
+
+FINISHED = ('done', 'error')
+
+
+class ReceiptJobQueue:
+    """Worker pool that runs receipt extractions recorded in the receipt_job table
+
+    Uploads save the image, insert a queued job and return straight away; worker
+    threads claim jobs and run the Vision call. The table is the source of truth:
+    a job is claimed with a conditional UPDATE, so it runs once. On start, jobs
+    left queued are picked up again, and so are jobs whose 'running' claim is
+    older than the lease: their worker is presumed dead. The lease must be
+    longer than any extraction takes, or a job still running in another
+    process (several workers, a rolling restart) would run twice.
+
+    Threads start lazily on the first enqueue or job poll, so creating an app
+    for the CLI or tests doesn't spawn workers; run.py starts them as soon as
+    it serves, so leftover jobs resume without waiting for a request.
+    """
+
+    def __init__(self, app, workers=2, max_queued=100, lease=900):
+        self.app = app
+        self.workers = workers
+        self.max_queued = max_queued
+        self.lease = lease
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        # Notified whenever a job changes state; SSE streams wait on it
+        self.changed = threading.Condition()
+
+    @classmethod
+    def from_config(cls, app):
+        """Build the queue from RECEIPT_JOB_WORKERS, RECEIPT_JOB_MAX_QUEUED and RECEIPT_JOB_LEASE (seconds)"""
+        return cls(app, workers=app.config.get('RECEIPT_JOB_WORKERS', 2),
+                   max_queued=app.config.get('RECEIPT_JOB_MAX_QUEUED', 100),
+                   lease=app.config.get('RECEIPT_JOB_LEASE', 900))
+
+    def start(self):
+        """Start the worker threads and requeue unfinished jobs; later calls do nothing"""
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"receipt-job-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            with self.app.app_context():
+                for job_id in self.recover():
+                    self._queue.put(job_id)
+
+    def recover(self):
+        """Requeue 'running' jobs whose lease expired; returns the ids of every queued job"""
+        expired = datetime.now() - timedelta(seconds=self.lease)
+        ReceiptJob.query.filter(ReceiptJob.status == 'running',
+                                db.or_(ReceiptJob.started_at.is_(None), ReceiptJob.started_at < expired))\
+            .update({'status': 'queued', 'started_at': None}, synchronize_session=False)
+        db.session.commit()
+        return [job_id for (job_id,) in db.session.query(ReceiptJob.id).filter_by(status='queued')]
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def pending(self):
+        return ReceiptJob.query.filter(ReceiptJob.status.in_(('queued', 'running'))).count()
+
+    def full(self):
+        """True when RECEIPT_JOB_MAX_QUEUED jobs are already waiting or running"""
+        return self.pending() >= self.max_queued
+
+    def enqueue(self, user_id, filename, file_path, image_url):
+        """Record a queued job for an already saved image and hand it to the workers"""
+        self.start()
+        job = ReceiptJob(id=uuid.uuid4().hex, user_id=user_id, filename=filename,
+                         file_path=file_path, image_url=image_url, status='queued')
+        db.session.add(job)
+        db.session.commit()
+        self._queue.put(job.id)
+        return job
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job has finished (or timeout); returns its final status or None"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            db.session.expire_all()
+            job = db.session.get(ReceiptJob, job_id)
+            if job is None or job.status in FINISHED:
+                return job.status if job else None
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            with self.changed:
+                self.changed.wait(timeout=min(remaining, 1.0) if remaining is not None else 1.0)
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            with self.app.app_context():
+                try:
+                    self._run(job_id)
+                except Exception as e:
+                    current_app.logger.exception("Receipt job %s failed: %s", job_id, e)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+    def _run(self, job_id):
+        # Claim the job; another worker (or process) may have got there first
+        claimed = ReceiptJob.query.filter_by(id=job_id, status='queued')\
+            .update({'status': 'running', 'started_at': datetime.now()})
+        db.session.commit()
+        if not claimed:
+            return
+        self._notify()
+
+        job = db.session.get(ReceiptJob, job_id)
+        try:
+            result = ReceiptExtraction(user_id=job.user_id).process_saved_image(job.file_path, job.image_url)
+        except Exception as e:
+            db.session.rollback()
+            result = {"status": "error", "message": f"Error processing receipt: {str(e)}"}
+
+        job = db.session.get(ReceiptJob, job_id)
+        if result["status"] == "success":
+            job.status, job.receipt_id = 'done', result["data"]["id"]
+        else:
+            job.status, job.error = 'error', result.get("message")
+        job.finished_at = datetime.now()
+        db.session.commit()
+        self._notify()
+
+    def _notify(self):
+        with self.changed:
+            self.changed.notify_all()
+
+
+def receipt_jobs():
+    """The current app's receipt job queue"""
+    return current_app.extensions['receipt_jobs']
@@ -0,0 +1,382 @@
+from datetime import datetime
+from sqlalchemy import case, event, func, inspect, select
+from sqlalchemy.orm import Session, object_session
+from .models import Transaction, InitialBalance, BalanceSnapshot, MonthlySummary, db
+from .rollup import add_transaction, fold_rows, month_key, rebuild_summaries, refresh_group
+
+transactions = Transaction.__table__
+initial_balances = InitialBalance.__table__
+snapshots = BalanceSnapshot.__table__
+
+
+def signed_amount(tx_type, amount):
+    """Income counts positive, expenses negative, anything else is ignored"""
+    if tx_type == "income":
+        return amount
+    if tx_type == "expense":
+        return -amount
+    return 0.0
+
+
+def _net_statement(user_id, after_id=None, upto_id=None):
+    """SUM of signed amounts for a user, optionally only for ids in (after_id, upto_id]"""
+    signed = case(
+        (transactions.c.type == "income", transactions.c.amount),
+        (transactions.c.type == "expense", -transactions.c.amount),
+        else_=0.0
+    )
+    statement = select(func.sum(signed), func.max(transactions.c.id), func.max(transactions.c.date))\
+        .where(transactions.c.user_id == user_id)
+    if after_id is not None:
+        statement = statement.where(transactions.c.id > after_id)
+    if upto_id is not None:
+        statement = statement.where(transactions.c.id <= upto_id)
+    return statement
+
+
+def _initial_statement(user_id):
+    return select(initial_balances.c.balance).where(initial_balances.c.user_id == user_id).limit(1)
+
+
+def _compute(connection, user_id):
+    """Full recomputation: (initial balance, balance, max transaction id, max date)"""
+    initial = connection.execute(_initial_statement(user_id)).scalar()
+    initial = float(initial) if initial is not None else 0.0
+    net, max_id, max_date = connection.execute(_net_statement(user_id)).one()
+    return initial, initial + float(net or 0.0), max_id or 0, max_date
+
+
+def _write_snapshot(connection, user_id, initial, balance, last_id, last_date):
+    """Insert or overwrite the user's snapshot row"""
+    values = {
+        "initial_balance": initial,
+        "balance": balance,
+        "last_transaction_id": last_id,
+        "last_transaction_date": last_date,
+        "updated_at": datetime.now(),
+    }
+    updated = connection.execute(
+        snapshots.update().where(snapshots.c.user_id == user_id).values(**values)
+    ).rowcount
+    if not updated:
+        connection.execute(snapshots.insert().values(user_id=user_id, **values))
+
+
+class BalanceLedger:
+    """Reads and maintains the materialized balance snapshot for one user
+
+    The user's MonthlySummary rollup shares the snapshot's checkpoint, so it is
+    folded forward and rebuilt together with it.
+    """
+
+    def __init__(self, user_id, session=None):
+        self.user_id = user_id
+        self.session = session or db.session
+
+    def balance(self):
+        """Snapshot balance plus the delta of rows inserted after the checkpoint
+
+        Column queries are used on purpose so a stale BalanceSnapshot instance in
+        the session identity map can never shadow the row updated by the hooks.
+        """
+        row = self.session.query(BalanceSnapshot.balance, BalanceSnapshot.last_transaction_id)\
+            .filter(BalanceSnapshot.user_id == self.user_id).first()
+        if row is None:
+            # No snapshot yet (the user has never written through the ORM)
+            _, balance, _, _ = _compute(self.session.connection(), self.user_id)
+            return balance
+
+        snapshot_balance, last_id = row
+        delta, _, _ = self.session.execute(_net_statement(self.user_id, after_id=last_id)).one()
+        return snapshot_balance + float(delta or 0.0)
+
+    def checkpoint(self):
+        """Fold rows inserted after the checkpoint (e.g. bulk Core inserts) into the snapshot and rollup"""
+        connection = self.session.connection()
+        row = connection.execute(
+            select(snapshots.c.balance, snapshots.c.last_transaction_id, snapshots.c.last_transaction_date)
+            .where(snapshots.c.user_id == self.user_id)
+        ).first()
+        if row is None:
+            return self.rebuild()
+
+        balance, last_id, last_date = row
+        delta, max_id, max_date = connection.execute(_net_statement(self.user_id, after_id=last_id)).one()
+        if max_id is not None:
+            fold_rows(connection, self.user_id, last_id, max_id)
+            connection.execute(snapshots.update().where(snapshots.c.user_id == self.user_id).values(
+                balance=snapshots.c.balance + float(delta or 0.0),
+                last_transaction_id=max_id,
+                last_transaction_date=max(filter(None, [last_date, max_date])),
+                updated_at=datetime.now()
+            ))
+            balance += float(delta or 0.0)
+        return balance
+
+    def rebuild(self):
+        """Recompute the snapshot and rollup from InitialBalance + Transaction and store them"""
+        connection = self.session.connection()
+        initial, balance, last_id, last_date = _compute(connection, self.user_id)
+        _write_snapshot(connection, self.user_id, initial, balance, last_id, last_date)
+        rebuild_summaries(connection, self.user_id, last_id)
+        return balance
+
+
+def reconcile_balances(user_ids=None, fix=True, tolerance=0.005):
+    """Compare stored snapshots with a full recomputation and report drift
+
+    Returns one report per user. With `fix=True` every snapshot is rebuilt (and
+    created if missing); the caller is responsible for committing.
+    """
+    if user_ids is None:
+        user_ids = sorted(
+            {uid for (uid,) in db.session.query(Transaction.user_id).distinct()}
+            | {uid for (uid,) in db.session.query(InitialBalance.user_id).distinct()}
+            | {uid for (uid,) in db.session.query(BalanceSnapshot.user_id)}
+        )
+
+    reports = []
+    connection = db.session.connection()
+    for user_id in user_ids:
+        has_snapshot = db.session.query(BalanceSnapshot.id).filter_by(user_id=user_id).first() is not None
+        stored = BalanceLedger(user_id).balance() if has_snapshot else None
+        _, actual, _, _ = _compute(connection, user_id)
+        drift = (stored - actual) if stored is not None else None
+        reports.append({
+            "user_id": user_id,
+            "snapshot_balance": stored,
+            "actual_balance": actual,
+            "drift": drift,
+            "status": "missing" if stored is None else ("drift" if abs(drift) > tolerance else "ok"),
+        })
+        if fix:
+            BalanceLedger(user_id).rebuild()
+    return reports
+
+
+def rebuild_monthly_summaries(user_ids=None):
+    """Recompute the MonthlySummary rollup from the transactions; returns {user_id: summary rows}
+
+    Users without a balance snapshot get one too, since the rollup is defined
+    relative to its checkpoint. The caller is responsible for committing.
+    """
+    if user_ids is None:
+        user_ids = sorted(
+            {uid for (uid,) in db.session.query(Transaction.user_id).distinct()}
+            | {uid for (uid,) in db.session.query(MonthlySummary.user_id).distinct()}
+        )
+
+    connection = db.session.connection()
+    rebuilt = {}
+    for user_id in user_ids:
+        last_id = connection.execute(
+            select(snapshots.c.last_transaction_id).where(snapshots.c.user_id == user_id)
+        ).scalar()
+        if last_id is None:
+            BalanceLedger(user_id).rebuild()
+        else:
+            rebuild_summaries(connection, user_id, last_id)
+        rebuilt[user_id] = db.session.query(MonthlySummary).filter_by(user_id=user_id).count()
+    return rebuilt
+
+
+#Write hooks: keep the snapshot and rollup in step with ORM inserts, edits and deletes.
+#They run inside the flush, on the same connection, so they commit or roll back with it.
+def _track_previous_value(target, value, oldvalue, initiator):
+    """No-op 'set' listener; registering it with active_history=True makes the ORM
+    load the old value of an expired attribute before it is overwritten"""
+    return value
+
+
+for _attribute in (Transaction.user_id, Transaction.amount, Transaction.type, Transaction.txn_date,
+                   InitialBalance.user_id):
+    event.listen(_attribute, "set", _track_previous_value, retval=True, active_history=True)
+
+
+def _committed(target, attr):
+    """Value of an attribute before the pending change (current value if unchanged)"""
+    history = inspect(target).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attr)
+
+
+def _snapshot_row(connection, user_id):
+    return connection.execute(
+        select(snapshots.c.last_transaction_id, snapshots.c.initial_balance).where(snapshots.c.user_id == user_id)
+    ).first()
+
+
+def _materialize(connection, user_id):
+    """Create the snapshot and rollup from the full history (already including the pending change)"""
+    initial, balance, last_id, last_date = _compute(connection, user_id)
+    _write_snapshot(connection, user_id, initial, balance, last_id, last_date)
+    rebuild_summaries(connection, user_id, last_id)
+
+
+def _refresh_month(connection, user_id, txn_date, tx_type, last_id):
+    """Recompute the rollup row of a transaction's (old or new) month and type"""
+    if txn_date is not None:
+        refresh_group(connection, user_id, month_key(txn_date), tx_type, last_id)
+
+
+def _shift(connection, user_id, delta):
+    if delta:
+        connection.execute(snapshots.update().where(snapshots.c.user_id == user_id).values(
+            balance=snapshots.c.balance + delta,
+            updated_at=datetime.now()
+        ))
+
+
+def _touch(target, connection, *user_ids):
+    """Bump the ledger version and remember the users to notify once the session commits"""
+    for user_id in set(user_ids):
+        connection.execute(snapshots.update().where(snapshots.c.user_id == user_id).values(
+            ledger_version=snapshots.c.ledger_version + 1
+        ))
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("ledger_changed_users", set()).update(user_ids)
+
+
+@event.listens_for(Transaction, "after_insert")
+def _transaction_inserted(mapper, connection, target):
+    row = _snapshot_row(connection, target.user_id)
+    if row is None:
+        # First write for this user: materialize the whole history once
+        _materialize(connection, target.user_id)
+    elif target.id > row.last_transaction_id:
+        delta, last_date = signed_amount(target.type, target.amount), target.date
+        if target.id > row.last_transaction_id + 1:
+            # Moving the checkpoint past rows that were never folded in (e.g. bulk Core inserts)
+            # would drop them from the balance and the rollup for good, so take in the whole
+            # range like checkpoint()
+            delta, _, last_date = connection.execute(
+                _net_statement(target.user_id, after_id=row.last_transaction_id, upto_id=target.id)).one()
+            delta = float(delta or 0.0)
+            fold_rows(connection, target.user_id, row.last_transaction_id, target.id)
+        else:
+            add_transaction(connection, target)
+        connection.execute(snapshots.update().where(snapshots.c.user_id == target.user_id).values(
+            balance=snapshots.c.balance + delta,
+            last_transaction_id=target.id,
+            last_transaction_date=case(
+                (snapshots.c.last_transaction_date > last_date, snapshots.c.last_transaction_date),
+                else_=last_date
+            ),
+            updated_at=datetime.now()
+        ))
+    _touch(target, connection, target.user_id)
+
+
+@event.listens_for(Transaction, "after_update")
+def _transaction_updated(mapper, connection, target):
+    old_user = _committed(target, "user_id")
+    old_signed = signed_amount(_committed(target, "type"), _committed(target, "amount"))
+    new_signed = signed_amount(target.type, target.amount)
+
+    # Rows above a user's checkpoint are covered by the delta scan already
+    # The rollup rows of the old and new (month, type), unless the edit didn't touch the money
+    state = inspect(target)
+    months = set()
+    if any(state.attrs[attr].history.has_changes() for attr in ("user_id", "amount", "type", "txn_date")):
+        months = {(old_user, _committed(target, "txn_date"), _committed(target, "type")),
+                  (target.user_id, target.txn_date, target.type)}
+
+    old_row = _snapshot_row(connection, old_user)
+    if old_row is not None and target.id <= old_row.last_transaction_id:
+        _shift(connection, old_user, -old_signed)
+    new_row = old_row if old_user == target.user_id else _snapshot_row(connection, target.user_id)
+    if new_row is not None and target.id <= new_row.last_transaction_id:
+        _shift(connection, target.user_id, new_signed)
+    for user_id, txn_date, tx_type in months:
+        row = old_row if user_id == old_user else new_row
+        if row is not None and target.id <= row.last_transaction_id:
+            _refresh_month(connection, user_id, txn_date, tx_type, row.last_transaction_id)
+
+    # Without a snapshot there is no version to bump, so create one from the current state
+    for user_id, row in {old_user: old_row, target.user_id: new_row}.items():
+        if row is None:
+            _materialize(connection, user_id)
+    _touch(target, connection, old_user, target.user_id)
+
+
+@event.listens_for(Transaction, "after_delete")
+def _transaction_deleted(mapper, connection, target):
+    user_id = _committed(target, "user_id")
+    row = _snapshot_row(connection, user_id)
+    if row is None:
+        _materialize(connection, user_id)
+    elif target.id <= row.last_transaction_id:
+        _shift(connection, user_id, -signed_amount(_committed(target, "type"), _committed(target, "amount")))
+        _refresh_month(connection, user_id, _committed(target, "txn_date"), _committed(target, "type"),
+                       row.last_transaction_id)
+    _touch(target, connection, user_id)
+
+
+def _initial_balance_changed(mapper, connection, target):
+    """Re-read the effective initial balance and shift the snapshot by the difference"""
+    user_ids = {target.user_id, _committed(target, "user_id")}
+    for user_id in user_ids:
+        row = _snapshot_row(connection, user_id)
+        if row is None:
+            continue
+        initial = connection.execute(_initial_statement(user_id)).scalar()
+        initial = float(initial) if initial is not None else 0.0
+        connection.execute(snapshots.update().where(snapshots.c.user_id == user_id).values(
+            balance=snapshots.c.balance + (initial - row.initial_balance),
+            initial_balance=initial,
+            updated_at=datetime.now()
+        ))
+    _touch(target, connection, *user_ids)
+
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(InitialBalance, _event_name, _initial_balance_changed)
+
+
+#Change notifications: callbacks registered with on_ledger_change run after a commit
+#that touched the ledger, e.g. to drop cached forecasts for those users.
+_change_callbacks = []
+
+
+def on_ledger_change(callback):
+    """Register callback(user_ids) to run after a commit changed those users' ledgers"""
+    _change_callbacks.append(callback)
+    return callback
+
+
+def notify_ledger_change(user_ids):
+    """Run the change callbacks directly (for writes that bypass the ORM hooks)"""
+    for callback in _change_callbacks:
+        callback(set(user_ids))
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session):
+    user_ids = session.info.pop("ledger_changed_users", None)
+    if user_ids:
+        notify_ledger_change(user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("ledger_changed_users", None)
+
+
+def ledger_fingerprint(user_id, session=None):
+    """Cheap identifier that changes whenever the user's ledger changes
+
+    Combines the highest transaction id and row count (which also catch bulk
+    inserts that bypass the hooks), the initial balance and the snapshot's
+    ledger version (which catches edits and deletes).
+    """
+    session = session or db.session
+    max_id, count = session.execute(
+        select(func.max(transactions.c.id), func.count(transactions.c.id)).where(transactions.c.user_id == user_id)
+    ).one()
+    initial = session.execute(_initial_statement(user_id)).scalar()
+    version = session.execute(
+        select(snapshots.c.ledger_version).where(snapshots.c.user_id == user_id)
+    ).scalar()
+    return f"{max_id or 0}:{count}:{initial if initial is not None else '-'}:{version or 0}"
@@ -0,0 +1,72 @@
+import threading
+import anthropic
+from flask import current_app, has_app_context
+
+# httpx.Limits, taken from the SDK's defaults so it always matches the SDK's httpx
+Limits = type(anthropic.DEFAULT_CONNECTION_LIMITS)
+
+
+class LLMClientRegistry:
+    """App-scoped Anthropic clients that share one pooled HTTP connection pool
+
+    Constructing anthropic.Anthropic per request opens a new pool, so every
+    forecast or receipt paid for a fresh TCP and TLS handshake. The registry
+    keeps one client per API key for the life of the app, all on a single
+    thread-safe HTTP client with keep-alive, so worker threads and successive
+    requests reuse connections. Clients are built on first use.
+    """
+
+    def __init__(self, max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0,
+                 timeout=120.0, connect_timeout=5.0, max_retries=2, base_url=None):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.base_url = base_url
+        self._http_client = None
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the registry from the LLM_* settings (and ANTHROPIC_BASE_URL)"""
+        return cls(max_connections=config.get('LLM_MAX_CONNECTIONS', 20),
+                   max_keepalive_connections=config.get('LLM_MAX_KEEPALIVE_CONNECTIONS', 10),
+                   keepalive_expiry=config.get('LLM_KEEPALIVE_EXPIRY', 30.0),
+                   timeout=config.get('LLM_TIMEOUT', 120.0),
+                   connect_timeout=config.get('LLM_CONNECT_TIMEOUT', 5.0),
+                   max_retries=config.get('LLM_MAX_RETRIES', 2),
+                   base_url=config.get('ANTHROPIC_BASE_URL'))
+
+    def get(self, api_key=None):
+        """The shared client for `api_key` (None: the SDK reads ANTHROPIC_API_KEY)"""
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                if self._http_client is None:
+                    self._http_client = anthropic.DefaultHttpxClient(
+                        limits=Limits(max_connections=self.max_connections,
+                                      max_keepalive_connections=self.max_keepalive_connections,
+                                      keepalive_expiry=self.keepalive_expiry),
+                        timeout=anthropic.Timeout(self.timeout, connect=self.connect_timeout))
+                client = anthropic.Anthropic(api_key=api_key, base_url=self.base_url, http_client=self._http_client,
+                                             max_retries=self.max_retries)
+                self._clients[api_key] = client
+            return client
+
+    def close(self):
+        """Close the pooled connections; clients handed out afterwards start a new pool"""
+        with self._lock:
+            http_client, self._http_client = self._http_client, None
+            self._clients.clear()
+        if http_client is not None:
+            http_client.close()
+
+
+def llm_client(api_key=None):
+    """Anthropic client from the current app's registry, or a standalone one outside an app"""
+    if has_app_context() and 'llm_clients' in current_app.extensions:
+        return current_app.extensions['llm_clients'].get(api_key)
+    return anthropic.Anthropic(api_key=api_key)
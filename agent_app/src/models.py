@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.orm import validates
+from datetime import date, datetime
 
 db = SQLAlchemy()
 
@@ -8,16 +10,47 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(20), unique=True, nullable=False)
     password = db.Column(db.String(80), nullable=False)
 
+def parse_date(value):
+    """Convert a YYYY-MM-DD string (or date) to a date; None if it can't be parsed"""
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+def _txn_date_default(context):
+    """Column default so Core/bulk inserts fill txn_date from the date string too"""
+    return parse_date(context.get_current_parameters().get('date'))
+
 class Transaction(db.Model):
+    __table_args__ = (
+        db.Index('ix_transaction_user_date', 'user_id', 'txn_date'),
+        db.Index('ix_transaction_user_type_date', 'user_id', 'type', 'txn_date'),
+        # Range seek for the rows past a checkpoint (balance delta, pending monthly rollup rows)
+        db.Index('ix_transaction_user_id', 'user_id', 'id'),
+        # Never hand out an id again: the snapshot and rollup count every id up to their
+        # checkpoint as folded in, and SQLite would otherwise reuse a deleted newest row's id
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_transaction_user'), nullable=False)
     date = db.Column(db.String(10), nullable=False)
+    # Typed copy of `date` used for range filters and ordering (NULL if `date` isn't YYYY-MM-DD)
+    txn_date = db.Column(db.Date, nullable=True, default=_txn_date_default)
     description = db.Column(db.String(100), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     type = db.Column(db.String(10), nullable=False)
     
     user = db.relationship('User', backref=db.backref('transactions', lazy=True))
 
+    @validates('date')
+    def _sync_txn_date(self, key, value):
+        """Keep txn_date in sync whenever the date string is assigned through the ORM"""
+        self.txn_date = parse_date(value)
+        return value
+
 class InitialBalance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_initial_balance_user'), nullable=False)
@@ -25,6 +58,43 @@ class InitialBalance(db.Model):
     
     user = db.relationship('User', backref=db.backref('initial_balance', lazy=True))
 
+class BalanceSnapshot(db.Model):
+    """Materialized running balance for a user.
+
+    `balance` is the initial balance plus every transaction with an id up to
+    `last_transaction_id`; rows inserted after the checkpoint are picked up by a
+    small delta scan when the balance is read.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_balance_snapshot_user'), nullable=False, unique=True)
+    initial_balance = db.Column(db.Float, nullable=False, default=0.0)
+    balance = db.Column(db.Float, nullable=False, default=0.0)
+    last_transaction_id = db.Column(db.Integer, nullable=False, default=0)
+    last_transaction_date = db.Column(db.String(10), nullable=True)
+    # Incremented on every ledger write; part of the cache fingerprint
+    ledger_version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+class MonthlySummary(db.Model):
+    """Per-user, per-calendar-month, per-type rollup of dated transactions.
+
+    Covers the same rows as the user's BalanceSnapshot (ids up to its
+    `last_transaction_id`); readers add the rows inserted after that checkpoint.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'year_month', 'type', name='uq_monthly_summary_user_month_type'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', name='fk_monthly_summary_user'), nullable=False)
+    # YYYY-MM of txn_date
+    year_month = db.Column(db.String(7), nullable=False)
+    type = db.Column(db.String(10), nullable=False)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    min_amount = db.Column(db.Float, nullable=True)
+    max_amount = db.Column(db.Float, nullable=True)
+
 class UserPreferences(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -42,6 +112,9 @@ class ReceiptDetail(db.Model):
     tax = db.Column(db.Float, nullable=False)
     total = db.Column(db.Float, nullable=False)
     image_url = db.Column(db.String(255), nullable=False)
+    # SHA-256 of the image and the model/prompt version it was extracted with; duplicates reuse the extraction
+    image_hash = db.Column(db.String(64), nullable=True, index=True)
+    extraction_version = db.Column(db.String(16), nullable=True)
     
     items = db.relationship('ReceiptItem', backref='receipt', cascade='all, delete-orphan')
     user = db.relationship('User', backref=db.backref('receipts', lazy=True))
@@ -58,6 +131,17 @@ class ReceiptDetail(db.Model):
             'image_url': self.image_url
         }
 
+    def extracted_fields(self):
+        """The fields in the shape the extraction produces them, for reusing an extraction"""
+        return {
+            'date': self.date,
+            'currency': self.currency,
+            'vendor_name': self.vendor_name,
+            'receipt_items': [item.to_dict() for item in self.items],
+            'tax': self.tax,
+            'total': self.total
+        }
+
 class ReceiptItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     receipt_id = db.Column(db.Integer, db.ForeignKey('receipt_detail.id'), nullable=False)
@@ -68,4 +152,34 @@ class ReceiptItem(db.Model):
         return {
             'item_name': self.item_name,
             'item_cost': self.item_cost
-        }
\ No newline at end of file
+        }
+
+class ReceiptJob(db.Model):
+    """A queued receipt extraction; the upload returns its id and the worker pool fills in the result"""
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # queued -> running -> done | error
+    status = db.Column(db.String(10), nullable=False, default='queued', index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(255), nullable=False)
+    image_url = db.Column(db.String(255), nullable=False)
+    receipt_id = db.Column(db.Integer, db.ForeignKey('receipt_detail.id'), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    receipt = db.relationship('ReceiptDetail')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'receipt_id': self.receipt_id,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'data': self.receipt.to_dict() if self.receipt else None
+        }
@@ -0,0 +1,119 @@
+import base64
+import binascii
+import json
+from datetime import date
+from sqlalchemy import select, tuple_
+from .models import Transaction, db, parse_date
+
+transactions = Transaction.__table__
+
+# Columns a client may ask for with `fields`
+FIELDS = ("id", "date", "description", "amount", "type")
+TYPES = ("income", "expense")
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(txn_date, transaction_id):
+    """Opaque cursor for the position after the row (txn_date, id)"""
+    position = [txn_date.isoformat() if txn_date else None, transaction_id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(txn_date or None, id) from a cursor; ValueError if it wasn't made by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        txn_date, transaction_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(transaction_id, int):
+            raise TypeError(transaction_id)
+        return (date.fromisoformat(txn_date) if txn_date is not None else None), transaction_id
+    except (binascii.Error, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+class TransactionPages:
+    """Newest-first pages of a user's transactions, addressed by a (txn_date, id) cursor
+
+    Each page is one indexed range read of the (user_id, txn_date) index that
+    starts right after the cursor row and stops after `limit` rows, so its cost
+    does not depend on how many rows the ledger has or how deep the page is.
+    Only the requested columns are selected and rows are returned as plain
+    dicts, without building ORM objects. Rows whose date couldn't be parsed
+    (txn_date NULL) come after all dated rows, newest id first.
+    """
+
+    def __init__(self, user_id, session=None):
+        self.user_id = user_id
+        self.session = session or db.session
+
+    def page(self, cursor=None, limit=DEFAULT_PAGE_SIZE, fields=None, start_date=None, end_date=None,
+             type=None, search=None):
+        """One page: {"transactions": [...], "next_cursor": str or None, "has_more": bool, "limit": n}
+
+        `fields` projects the rows onto a subset of FIELDS, `start_date` and
+        `end_date` are inclusive YYYY-MM-DD bounds, `type` is income or expense
+        and `search` matches the description case-insensitively. Raises
+        ValueError for arguments that can't be used.
+        """
+        fields = self._fields(fields)
+        limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+        filters = self._filters(start_date, end_date, type, search)
+        after_date, after_id = decode_cursor(cursor) if cursor else (None, None)
+        # id and txn_date are always read: the cursor is built from them
+        selected = [transactions.c.id, transactions.c.txn_date] + [transactions.c[name] for name in fields if name != "id"]
+
+        rows = []
+        if after_id is None or after_date is not None:
+            dated = select(*selected).where(*filters, transactions.c.txn_date.is_not(None))
+            if after_id is not None:
+                # Row-value comparison so the index range starts at the cursor
+                dated = dated.where(tuple_(transactions.c.txn_date, transactions.c.id) < (after_date, after_id))
+            dated = dated.order_by(transactions.c.txn_date.desc(), transactions.c.id.desc()).limit(limit + 1)
+            rows = self.session.execute(dated).all()
+        # A date range never matches undated rows; otherwise they follow the dated ones
+        if len(rows) <= limit and not (start_date or end_date):
+            undated = select(*selected).where(*filters, transactions.c.txn_date.is_(None))
+            if after_date is None and after_id is not None:
+                undated = undated.where(transactions.c.id < after_id)
+            undated = undated.order_by(transactions.c.id.desc()).limit(limit + 1 - len(rows))
+            rows += self.session.execute(undated).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        last = rows[-1] if rows else None
+        return {
+            "transactions": [{name: row._mapping[name] for name in fields} for row in rows],
+            "next_cursor": encode_cursor(last.txn_date, last.id) if has_more else None,
+            "has_more": has_more,
+            "limit": limit,
+        }
+
+    @staticmethod
+    def _fields(fields):
+        if not fields:
+            return FIELDS
+        if isinstance(fields, str):
+            fields = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in fields if name not in FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        # Keep the canonical order and drop repeats
+        return tuple(name for name in FIELDS if name in fields)
+
+    def _filters(self, start_date, end_date, type, search):
+        filters = [transactions.c.user_id == self.user_id]
+        for bound, value in (("start_date", start_date), ("end_date", end_date)):
+            if value and parse_date(value) is None:
+                raise ValueError(f"{bound} must be YYYY-MM-DD")
+        if start_date:
+            filters.append(transactions.c.txn_date >= parse_date(start_date))
+        if end_date:
+            filters.append(transactions.c.txn_date <= parse_date(end_date))
+        if type:
+            if type not in TYPES:
+                raise ValueError("type must be income or expense")
+            filters.append(transactions.c.type == type)
+        if search:
+            filters.append(transactions.c.description.icontains(search, autoescape=True))
+        return filters
@@ -0,0 +1,193 @@
+import numpy as np
+from datetime import date, timedelta
+
+# (name, period in days, allowed deviation of the typical gap in days)
+CADENCES = (
+    ("weekly", 7.0, 1.0),
+    ("biweekly", 14.0, 2.0),
+    ("monthly", 365.25 / 12, 4.0),
+)
+
+def normalize_descriptions(descriptions):
+    """Lower-case, drop any token containing a digit, and keep only letters
+
+    "NETFLIX 123" and "Netflix #456" both become "netflix", so reference numbers and
+    card suffixes don't split one series into many. A description with nothing left
+    after cleaning keeps its lower-cased original.
+
+    All descriptions are joined into one byte buffer and cleaned with array
+    operations, which is what keeps large ledgers fast.
+    """
+    if not descriptions:
+        return []
+    lowered = "\n".join(descriptions).lower()
+    buf = np.frombuffer(lowered.encode("utf-8"), dtype=np.uint8)
+
+    is_newline = buf == 10
+    is_digit = (buf >= 48) & (buf <= 57)
+    # Non-ASCII bytes count as letters so accented vendor names survive intact
+    is_word = ((buf >= 97) & (buf <= 122)) | is_digit | (buf >= 128)
+
+    # Give every token an id and drop tokens that contain a digit
+    token = np.cumsum(is_word & ~np.concatenate(([False], is_word[:-1])), dtype=np.int32)
+    has_digit = np.zeros(int(token[-1]) + 1, dtype=bool)
+    has_digit[token[is_digit]] = True
+    keep = is_word & ~has_digit[token]
+
+    # Everything else except newlines separates words; keep one space between two kept words only
+    sep = ~keep & ~is_newline
+    run_start = sep & ~np.concatenate(([True], sep[:-1]))
+    run_id = np.cumsum(run_start, dtype=np.int32)
+    after = np.concatenate((~sep[1:] & keep[1:], [False]))
+    run_end = sep & ~np.concatenate((sep[1:], [False]))
+    followed_by_word = np.zeros(int(run_id[-1]) + 1, dtype=bool)
+    followed_by_word[run_id[run_end & after]] = True
+    preceded_by_word = np.concatenate(([False], keep[:-1]))
+    space = run_start & preceded_by_word & followed_by_word[run_id]
+
+    cleaned = np.where(sep, 32, buf)[keep | is_newline | space].tobytes().decode("utf-8")
+    normalized = cleaned.split("\n")
+    if len(normalized) != len(descriptions):
+        # A description contained a newline; fall back to one at a time
+        return [normalize_description(d) for d in descriptions]
+    for index in [i for i, n in enumerate(normalized) if not n]:
+        normalized[index] = descriptions[index].lower().strip()
+    return normalized
+
+
+def normalize_description(description):
+    """Normalize a single description (see normalize_descriptions)"""
+    return normalize_descriptions([description.replace("\n", " ")])[0]
+
+
+def _intern(values):
+    """Map each value to a small integer id; returns (codes array, list of unique values)"""
+    lookup = dict.fromkeys(values)
+    for code, value in enumerate(lookup):
+        lookup[value] = code
+    codes = np.fromiter(map(lookup.__getitem__, values), dtype=np.int64, count=len(values))
+    return codes, list(lookup)
+
+
+def detect_recurring(dates, amounts, types, descriptions, min_occurrences=2, amount_tolerance=0.1,
+                     today=None, labels=None):
+    """Find recurring series in a ledger using array operations
+
+    Rows are grouped by normalized description and type, amounts inside each group
+    are clustered (a new cluster starts when an amount is more than
+    `amount_tolerance` above the previous one), and the cadence of each cluster is
+    estimated from the median gap between its dates. Only clusters matching a known
+    cadence are returned, one summary dict per series, most confident first.
+
+    `descriptions` is a sequence of strings, or an integer array of ids into
+    `labels` when the caller has already interned them. `types` may also be a
+    boolean is-income array.
+    """
+    count = len(amounts)
+    if count == 0:
+        return []
+    today = today or date.today()
+
+    days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    is_income = np.asarray(types)
+    if is_income.dtype != bool:
+        is_income = is_income == "income"
+
+    # Normalize each distinct description once, not once per row
+    if labels is None:
+        desc_codes, unique_descriptions = _intern(descriptions)
+    else:
+        desc_codes, unique_descriptions = np.asarray(descriptions, dtype=np.int64), list(labels)
+    norm_of_unique, normalized = _intern(normalize_descriptions(unique_descriptions))
+    group = norm_of_unique[desc_codes] * 2 + is_income
+
+    # Composite sort keys are packed into one int64 (high bits = group, low bits =
+    # value) because a single argsort is much faster than np.lexsort on large ledgers
+    cents = np.round(amounts * 100).astype(np.int64)
+    days_offset = days - days.min()
+
+    # Amount clusters: sort by (group, amount) and split on group changes or large jumps
+    order = np.argsort((group << 40) | (cents - cents.min()))
+    sorted_group, sorted_amounts = group[order], amounts[order]
+    breaks = np.empty(count, dtype=bool)
+    breaks[0] = True
+    breaks[1:] = (sorted_group[1:] != sorted_group[:-1]) | \
+        (sorted_amounts[1:] > sorted_amounts[:-1] * (1 + amount_tolerance) + 0.01)
+    cluster = np.empty(count, dtype=np.int64)
+    cluster[order] = np.cumsum(breaks) - 1
+    n_clusters = int(cluster.max()) + 1
+
+    # Date gaps inside each cluster
+    order = np.argsort((cluster << 32) | days_offset)
+    cluster_s, days_s = cluster[order], days[order]
+    same = cluster_s[1:] == cluster_s[:-1]
+    gap_cluster = cluster_s[1:][same]
+    gaps = (days_s[1:] - days_s[:-1])[same]
+
+    occurrences = np.bincount(cluster, minlength=n_clusters)
+    ends = np.cumsum(occurrences) - 1
+    last_day = days_s[ends]
+    last_row = order[ends]
+    amount_sum = np.bincount(cluster, weights=amounts, minlength=n_clusters)
+    amount_sq = np.bincount(cluster, weights=amounts * amounts, minlength=n_clusters)
+    mean_amount = amount_sum / occurrences
+    std_amount = np.sqrt(np.maximum(amount_sq / occurrences - mean_amount ** 2, 0.0))
+
+    # Median gap per cluster: sort gaps within clusters and take the middle element(s)
+    gap_counts = np.bincount(gap_cluster, minlength=n_clusters)
+    sorted_gaps = gaps[np.argsort((gap_cluster << 32) | gaps)].astype(np.float64)
+    starts = np.cumsum(gap_counts) - gap_counts
+    has_gaps = gap_counts > 0
+    median_gap = np.zeros(n_clusters)
+    if sorted_gaps.size:
+        low = np.minimum(starts + (gap_counts - 1) // 2, sorted_gaps.size - 1)
+        high = np.minimum(starts + gap_counts // 2, sorted_gaps.size - 1)
+        median_gap[has_gaps] = (sorted_gaps[low[has_gaps]] + sorted_gaps[high[has_gaps]]) / 2
+
+    # Nearest known cadence, if the median gap is within its tolerance
+    periods = np.array([c[1] for c in CADENCES])
+    tolerances = np.array([c[2] for c in CADENCES])
+    nearest = np.argmin(np.abs(median_gap[:, None] - periods[None, :]), axis=1)
+    regular = has_gaps & (np.abs(median_gap - periods[nearest]) <= tolerances[nearest])
+
+    # Confidence = share of on-cadence gaps x amount consistency x support
+    on_cadence = np.abs(gaps - periods[nearest[gap_cluster]]) <= tolerances[nearest[gap_cluster]]
+    regularity = np.bincount(gap_cluster, weights=on_cadence, minlength=n_clusters) / np.maximum(gap_counts, 1)
+    consistency = np.clip(1 - std_amount / np.maximum(mean_amount, 0.01), 0, 1)
+    support = 1 - 1 / occurrences
+    confidence = regularity * consistency * support
+
+    keep = np.flatnonzero(regular & (occurrences >= min_occurrences))
+    keep = keep[np.argsort(-confidence[keep], kind="stable")]
+
+    epoch = date(1970, 1, 1)
+    summaries = []
+    for c in keep:
+        name, period, _ = CADENCES[nearest[c]]
+        last = epoch + timedelta(days=int(last_day[c]))
+        next_expected = _add_months(last, 1) if name == "monthly" else last + timedelta(days=int(period))
+        row = last_row[c]
+        summaries.append({
+            "description": normalized[norm_of_unique[desc_codes[row]]],
+            "sample_description": unique_descriptions[desc_codes[row]],
+            "type": "income" if is_income[row] else "expense",
+            "cadence": name,
+            "period_days": int(round(period)),
+            "occurrences": int(occurrences[c]),
+            "mean_amount": round(float(mean_amount[c]), 2),
+            "last_date": last.strftime("%Y-%m-%d"),
+            "next_expected_date": next_expected.strftime("%Y-%m-%d"),
+            "confidence": round(float(confidence[c]), 2),
+            # A series that has missed more than two cycles has probably stopped
+            "active": bool((today - last).days <= 2 * period + tolerances[nearest[c]]),
+        })
+    return summaries
+
+
+def _add_months(day, months):
+    """Same day of month `months` later, clamped to the month's last day"""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return date(year, month, min(day.day, (next_month - timedelta(days=1)).day))
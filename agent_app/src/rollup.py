@@ -0,0 +1,259 @@
+import calendar
+import numpy as np
+from datetime import date
+from sqlalchemy import String, case, cast, func, select, union_all
+from .models import Transaction, MonthlySummary, BalanceSnapshot, db
+
+transactions = Transaction.__table__
+summaries = MonthlySummary.__table__
+snapshots = BalanceSnapshot.__table__
+
+# Complete months of history needed before seasonal indexes are reported (two of each calendar month)
+SEASONAL_MIN_MONTHS = 24
+
+# YYYY-MM of txn_date; the cast renders dates as ISO strings on every supported backend
+_month = func.substr(cast(transactions.c.txn_date, String), 1, 7)
+
+
+def month_key(value):
+    """'YYYY-MM' of a date"""
+    return f"{value.year:04d}-{value.month:02d}"
+
+
+def add_months(year_month, months):
+    """Shift a 'YYYY-MM' key by a number of calendar months"""
+    year, month = divmod(int(year_month[:4]) * 12 + int(year_month[5:7]) - 1 + months, 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+
+def month_range(first, last):
+    """Every 'YYYY-MM' from first to last, inclusive"""
+    months = []
+    while first <= last:
+        months.append(first)
+        first = add_months(first, 1)
+    return months
+
+
+def days_in_month(year_month):
+    return calendar.monthrange(int(year_month[:4]), int(year_month[5:7]))[1]
+
+
+def _grouped(user_id, *criteria):
+    """(month, type, sum, count, min, max) of the user's dated transactions matching `criteria`"""
+    return select(_month, transactions.c.type, func.sum(transactions.c.amount), func.count(transactions.c.id),
+                  func.min(transactions.c.amount), func.max(transactions.c.amount))\
+        .where(transactions.c.user_id == user_id, transactions.c.txn_date.isnot(None), *criteria)\
+        .group_by(_month, transactions.c.type)
+
+
+def _group_key(user_id, year_month, tx_type):
+    return (summaries.c.user_id == user_id, summaries.c.year_month == year_month, summaries.c.type == tx_type)
+
+
+#Maintenance: called from the ledger write hooks and BalanceLedger.checkpoint/rebuild with the
+#connection of the current flush or transaction, so the rollup commits or rolls back with the rows.
+def _add(connection, user_id, year_month, tx_type, total, count, low, high):
+    """Add a group's totals into its summary row, creating the row if needed"""
+    updated = connection.execute(summaries.update().where(*_group_key(user_id, year_month, tx_type)).values(
+        total=summaries.c.total + total,
+        count=summaries.c.count + count,
+        min_amount=case((summaries.c.min_amount <= low, summaries.c.min_amount), else_=low),
+        max_amount=case((summaries.c.max_amount >= high, summaries.c.max_amount), else_=high)
+    )).rowcount
+    if not updated:
+        connection.execute(summaries.insert().values(user_id=user_id, year_month=year_month, type=tx_type,
+                                                     total=total, count=count, min_amount=low, max_amount=high))
+
+
+def add_transaction(connection, target):
+    """Fold one inserted transaction into its month (undated rows are not rolled up)"""
+    if target.txn_date is not None:
+        _add(connection, target.user_id, month_key(target.txn_date), target.type,
+             target.amount, 1, target.amount, target.amount)
+
+
+def fold_rows(connection, user_id, after_id, upto_id):
+    """Fold the user's transactions with after_id < id <= upto_id into the rollup"""
+    rows = connection.execute(_grouped(user_id, transactions.c.id > after_id, transactions.c.id <= upto_id))
+    for year_month, tx_type, total, count, low, high in rows.all():
+        _add(connection, user_id, year_month, tx_type, float(total), count, low, high)
+
+
+def refresh_group(connection, user_id, year_month, tx_type, upto_id):
+    """Recompute one summary row from the transactions with id <= upto_id
+
+    Used after edits and deletes: a sum can be adjusted in place, but a removed
+    minimum or maximum can only be found again by looking at the month's rows.
+    """
+    start = date(int(year_month[:4]), int(year_month[5:7]), 1)
+    following = add_months(year_month, 1)
+    end = date(int(following[:4]), int(following[5:7]), 1)
+    total, count, low, high = connection.execute(
+        select(func.sum(transactions.c.amount), func.count(transactions.c.id),
+               func.min(transactions.c.amount), func.max(transactions.c.amount))
+        .where(transactions.c.user_id == user_id, transactions.c.type == tx_type,
+               transactions.c.txn_date >= start, transactions.c.txn_date < end, transactions.c.id <= upto_id)
+    ).one()
+
+    key = _group_key(user_id, year_month, tx_type)
+    if not count:
+        connection.execute(summaries.delete().where(*key))
+        return
+    values = {"total": float(total), "count": count, "min_amount": low, "max_amount": high}
+    if not connection.execute(summaries.update().where(*key).values(**values)).rowcount:
+        connection.execute(summaries.insert().values(user_id=user_id, year_month=year_month, type=tx_type, **values))
+
+
+def rebuild_summaries(connection, user_id, upto_id):
+    """Replace the user's rollup with one computed from the transactions with id <= upto_id"""
+    connection.execute(summaries.delete().where(summaries.c.user_id == user_id))
+    rows = [{"user_id": user_id, "year_month": year_month, "type": tx_type, "total": float(total), "count": count,
+             "min_amount": low, "max_amount": high}
+            for year_month, tx_type, total, count, low, high in
+            connection.execute(_grouped(user_id, transactions.c.id <= upto_id))]
+    if rows:
+        connection.execute(summaries.insert(), rows)
+    return len(rows)
+
+
+class MonthlyRollup:
+    """Reads per-month totals for one user from the rollup
+
+    The summary rows cover transactions up to the balance snapshot's
+    checkpoint; rows inserted after it (e.g. bulk inserts not yet checkpointed)
+    are grouped on the fly in the same statement, so reads cost O(months) plus
+    whatever is pending.
+    """
+
+    def __init__(self, user_id, session=None):
+        self.user_id = user_id
+        self.session = session or db.session
+
+    def groups(self):
+        """{(year_month, type): {"total", "count", "min", "max"}} over the user's dated history"""
+        checkpoint = func.coalesce(
+            select(snapshots.c.last_transaction_id).where(snapshots.c.user_id == self.user_id).scalar_subquery(), 0)
+        stored = select(summaries.c.year_month, summaries.c.type, summaries.c.total, summaries.c.count,
+                        summaries.c.min_amount, summaries.c.max_amount)\
+            .where(summaries.c.user_id == self.user_id)
+        pending = _grouped(self.user_id, transactions.c.id > checkpoint)
+
+        groups = {}
+        for year_month, tx_type, total, count, low, high in self.session.execute(union_all(stored, pending)):
+            group = groups.get((year_month, tx_type))
+            if group is None:
+                groups[(year_month, tx_type)] = {"total": float(total), "count": count, "min": low, "max": high}
+            else:
+                group["total"] += float(total)
+                group["count"] += count
+                group["min"] = min(group["min"], low)
+                group["max"] = max(group["max"], high)
+        return groups
+
+    def monthly_totals(self):
+        """Per-month income/expense totals in month order, shaped like LedgerAggregates.monthly_totals"""
+        months = {}
+        for (year_month, tx_type), group in sorted(self.groups().items()):
+            row = months.setdefault(year_month, {"month": year_month, "income": 0.0, "expense": 0.0, "count": 0})
+            row[tx_type] = group["total"]
+            row["count"] += group["count"]
+        return list(months.values())
+
+
+#Analytics over monthly_totals() rows; `today` is a parameter so results are reproducible.
+def _complete_months(history, last):
+    """Every complete month from the first one with activity up to `last`"""
+    return month_range(history[0]["month"], last) if history else []
+
+
+def monthly_averages(history, months=3, today=None):
+    """Average monthly income and expenses over the last `months` complete calendar months
+
+    Months before the ledger's first activity don't count, so a two-month-old
+    ledger is averaged over two months; one younger than a complete month is
+    extrapolated from the month to date.
+    """
+    today = today or date.today()
+    current = month_key(today)
+    by_month = {row["month"]: row for row in history}
+    window = month_range(add_months(current, -months), add_months(current, -1))
+    if history:
+        window = [month for month in window if month >= history[0]["month"]]
+
+    if window:
+        rows = [by_month[month] for month in window if month in by_month]
+        income = sum(row["income"] for row in rows) / len(window)
+        expenses = sum(row["expense"] for row in rows) / len(window)
+    else:
+        row = by_month.get(current, {})
+        elapsed = today.day / days_in_month(current)
+        income = row.get("income", 0.0) / elapsed
+        expenses = row.get("expense", 0.0) / elapsed
+
+    return {"avg_monthly_income": income,
+            "avg_monthly_expenses": expenses,
+            "avg_monthly_net": income - expenses}
+
+
+def _slope(values):
+    """Least-squares change per month"""
+    if len(values) < 2:
+        return 0.0
+    return round(float(np.polyfit(np.arange(len(values)), values, 1)[0]), 2)
+
+
+def _seasonal_index(series, key):
+    """Mean of each calendar month (January first) relative to the mean of all months"""
+    values = np.array([row[key] for row in series])
+    overall = values.mean()
+    months = np.array([int(row["month"][5:7]) - 1 for row in series])
+    index = []
+    for month in range(12):
+        selected = values[months == month]
+        index.append(round(float(selected.mean() / overall), 3) if overall and len(selected) else 1.0)
+    return index
+
+
+def monthly_trend(history, months=12, today=None):
+    """Totals of the last `months` complete calendar months, their linear trends and seasonal indexes
+
+    Months without transactions count as zero. Seasonal indexes (one per
+    calendar month, 1.0 = an average month) use every complete month and are
+    only given once there are SEASONAL_MIN_MONTHS of them.
+    """
+    current = month_key(today or date.today())
+    by_month = {row["month"]: row for row in history}
+    series = []
+    for month in _complete_months(history, add_months(current, -1)):
+        row = by_month.get(month, {})
+        income, expense = row.get("income", 0.0), row.get("expense", 0.0)
+        series.append({"month": month, "income": income, "expense": expense, "net": income - expense})
+
+    recent = series[-months:] if months > 0 else []
+    seasonality = None
+    if len(series) >= SEASONAL_MIN_MONTHS:
+        seasonality = {"income": _seasonal_index(series, "income"), "expense": _seasonal_index(series, "expense")}
+    return {
+        "months": recent,
+        "trend": {key: _slope([row[key] for row in recent]) for key in ("income", "expense", "net")},
+        "seasonality": seasonality,
+    }
+
+
+def seasonal_multipliers(seasonality, months=3, today=None):
+    """Per-calendar-month factors for projecting averages taken over the last `months` complete months
+
+    The averages already carry the season of the months they were taken from,
+    so each index is divided by the mean index of those months. None without
+    seasonal indexes.
+    """
+    if not seasonality:
+        return None
+    current = month_key(today or date.today())
+    window = [int(month[5:7]) - 1 for month in month_range(add_months(current, -months), add_months(current, -1))]
+    multipliers = {}
+    for tx_type, index in seasonality.items():
+        base = sum(index[month] for month in window) / len(window) if window else 1.0
+        multipliers[tx_type] = [value / base if base else 1.0 for value in index]
+    return multipliers
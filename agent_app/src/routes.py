@@ -1,36 +1,29 @@
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, current_app
-from .models import Transaction, db
-from .services import CashFlowForecast, ReceiptExtraction
+import json
+import time
+import zipfile
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, current_app, Response, stream_with_context
+from .models import ReceiptJob, db
+from .services import BatchTooLarge, CashFlowForecast, ReceiptExtraction
+from .cache import forecast_cache
+from .dashboard import dashboard_service
+from .pagination import DEFAULT_PAGE_SIZE, TransactionPages
+from .importer import FORMATS as IMPORT_FORMATS, TransactionImporter
+from .jobs import FINISHED, receipt_jobs
 
 # Initialize blueprint with no URL prefix
 cashflow_bp = Blueprint('cashflow', __name__, url_prefix='')
 
+FORECAST_MODES = ('local', 'llm', 'hybrid')
+
 @cashflow_bp.route('/')
 def index():
-    """Render the homepage"""
-    # Calculate total revenue (sum of all income transactions)
-    total_revenue = db.session.query(db.func.sum(Transaction.amount))\
-        .filter(Transaction.user_id == 1, Transaction.type == 'income')\
-        .scalar() or 0.0
-    
-    # Calculate previous month's revenue for comparison
-    from datetime import datetime, timedelta
-    last_month = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
-    prev_month_revenue = db.session.query(db.func.sum(Transaction.amount))\
-        .filter(Transaction.user_id == 1, 
-                Transaction.type == 'income',
-                Transaction.date < last_month)\
-        .scalar() or 0.0
-    
-    # Calculate percentage change
-    if prev_month_revenue > 0:
-        percent_change = ((total_revenue - prev_month_revenue) / prev_month_revenue) * 100
-    else:
-        percent_change = 0
-    
-    return render_template('index.html', 
-                         total_revenue=total_revenue,
-                         percent_change=percent_change)
+    """Render the homepage; the KPI cards are filled in from /api/dashboard"""
+    return render_template('index.html')
+
+@cashflow_bp.route('/api/dashboard', methods=['GET'])
+def dashboard():
+    """API endpoint for the dashboard KPIs (revenue, expenses, net, margin and balance)"""
+    return jsonify(dashboard_service().kpis(user_id=1))
 
 # Receipt Extractor route
 @cashflow_bp.route('/receipt-extractor')
@@ -50,32 +43,124 @@ def generate_forecast(days):
     # Validate days parameter
     if days not in [30, 90, 180]:
         return jsonify({"error": "Days parameter must be 30, 90, or 180"}), 400
+    
+    # local = deterministic engine only, llm = Claude with tools, hybrid = local numbers + LLM narrative
+    mode = request.args.get('mode', 'llm')
+    if mode not in FORECAST_MODES:
+        return jsonify({"error": "Mode parameter must be local, llm, or hybrid"}), 400
         
     # Use a hardcoded user_id instead of current_user
     forecast_service = CashFlowForecast(user_id=1)
     
     # Generate forecast
-    result = forecast_service.forecast(days=days)
+    result = forecast_service.forecast(days=days, mode=mode)
     
     return jsonify(result)
 
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def sse_response(events):
+    """Stream an iterable of SSE messages without proxy buffering"""
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@cashflow_bp.route('/api/forecast/<int:days>/stream', methods=['GET'])
+def stream_forecast(days):
+    """Streaming variant of the forecast endpoint (Server-Sent Events)
+
+    Emits status, text, tool_call and tools events while the forecast is being
+    generated, then a forecast event with the same payload as /api/forecast/<days>,
+    or an error event.
+    """
+    if days not in [30, 90, 180]:
+        return jsonify({"error": "Days parameter must be 30, 90, or 180"}), 400
+    mode = request.args.get('mode', 'llm')
+    if mode not in FORECAST_MODES:
+        return jsonify({"error": "Mode parameter must be local, llm, or hybrid"}), 400
+
+    forecast_service = CashFlowForecast(user_id=1)
+
+    def events():
+        for event in forecast_service.stream_forecast(days=days, mode=mode):
+            name = event.pop("event")
+            yield sse_event(name, event)
+
+    return sse_response(events())
+
 @cashflow_bp.route('/api/forecast/all', methods=['GET'])
 def generate_all_forecasts():
     """API endpoint to generate forecasts for 30, 90, and 180 days"""
+    mode = request.args.get('mode', 'llm')
+    if mode not in FORECAST_MODES:
+        return jsonify({"error": "Mode parameter must be local, llm, or hybrid"}), 400
+    
     # Use a hardcoded user_id
     forecast_service = CashFlowForecast(user_id=1)
     
     # Generate all forecasts
-    results = forecast_service.forecast_periods()
+    results = forecast_service.forecast_periods(mode=mode)
     
     return jsonify(results)
 
+@cashflow_bp.route('/api/forecast/cache-stats', methods=['GET'])
+def forecast_cache_stats():
+    """API endpoint exposing forecast cache hit/miss counters"""
+    cache = forecast_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(cache.stats(), enabled=True))
+
 @cashflow_bp.route('/transactions')
 def transactions():
-    """Render the transactions page"""
-    # Use a hardcoded user_id
-    transactions = Transaction.query.filter_by(user_id=1).order_by(Transaction.date.desc()).all()
-    return render_template('transactions.html', transactions=transactions)
+    """Render the transactions page; rows are loaded page by page from /api/transactions"""
+    return render_template('transaction.html', page_size=DEFAULT_PAGE_SIZE)
+
+@cashflow_bp.route('/api/transactions', methods=['GET'])
+def list_transactions():
+    """API endpoint for one newest-first page of transactions
+
+    Query parameters: cursor (next_cursor of the previous page), limit,
+    fields (comma-separated projection), start_date and end_date (YYYY-MM-DD,
+    inclusive), type (income or expense) and q (description search).
+    """
+    try:
+        page = TransactionPages(user_id=1).page(  # Hardcoded user_id for now
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+            fields=request.args.get('fields'),
+            start_date=request.args.get('start_date'),
+            end_date=request.args.get('end_date'),
+            type=request.args.get('type'),
+            search=request.args.get('q'),
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(page)
+
+@cashflow_bp.route('/api/transactions/import', methods=['POST'])
+def import_transactions():
+    """API endpoint to import a CSV or OFX bank export under `file`
+
+    Optional form fields: format (csv or ofx, detected if omitted), date_format
+    (strptime format of the dates) and batch_size. Returns the import report.
+    """
+    upload = request.files.get('file')
+    if upload is None or upload.filename == '':
+        return jsonify({"status": "error", "message": "No file in the request"}), 400
+    file_format = request.form.get('format') or None
+    if file_format is not None and file_format not in IMPORT_FORMATS:
+        return jsonify({"status": "error", "message": "Format must be csv or ofx"}), 400
+
+    importer = TransactionImporter.from_config(1, current_app.config,  # Hardcoded user_id for now
+                                               batch_size=request.form.get('batch_size', type=int),
+                                               date_format=request.form.get('date_format') or None)
+    try:
+        report = importer.import_upload(upload, file_format)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(dict(report, status="success"))
 
 # Simple test route
 @cashflow_bp.route('/test')
@@ -96,10 +181,21 @@ def debug_routes():
         })
     return jsonify(routes)
 
+@cashflow_bp.errorhandler(413)
+def upload_too_large(error):
+    """JSON answer for requests over MAX_CONTENT_LENGTH (or the route's own limit)"""
+    return jsonify({"status": "error", "message": "Upload too large",
+                    "max_bytes": request.max_content_length}), 413
+
 # Receipt extraction endpoint
 @cashflow_bp.route('/api/extract-receipt-details', methods=['POST'])
 def extract_receipt_details():
-    """API endpoint to extract details from a receipt image using AI"""
+    """API endpoint to queue a receipt image for AI extraction
+
+    Returns 202 with a job id; poll /api/receipt-jobs/<id> or subscribe to
+    /api/receipt-jobs/<id>/events for the result. An image that was already
+    extracted returns its receipt straight away with 200.
+    """
     # Check if the request has a file
     if 'file' not in request.files:
         return jsonify({"status": "error", "message": "No file part in the request"}), 400
@@ -110,12 +206,112 @@ def extract_receipt_details():
     if image_file.filename == '':
         return jsonify({"status": "error", "message": "No file selected"}), 400
     
-    # Process the receipt
     receipt_service = ReceiptExtraction(user_id=1)  # Hardcoded user_id for now
-    result = receipt_service.extract_receipt_details(image_file)
+    if not receipt_service.allowed_file(image_file.filename):
+        return jsonify({"status": "error", "message": "Invalid file type. Only JPG, JPEG, and PNG files are allowed."}), 400
+    
+    # Save now (the upload stream is gone after this request); extract in a worker
+    jobs = receipt_jobs()
+    if jobs.full():
+        return jsonify({"status": "error", "message": "Too many receipts queued, try again shortly"}), 503, \
+            {"Retry-After": "5"}
+    try:
+        file_path, image_url = receipt_service._save_image(image_file)
+        # Already extracted (same image bytes, model and prompt): answer at once
+        existing, same_user = receipt_service.find_duplicate(receipt_service.content_hash(file_path))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"status": "error", "message": f"Error processing receipt: {str(e)}"}), 500
+    if existing is not None:
+        return jsonify(receipt_service._reuse_extraction(existing, same_user, image_url)), 200
+    
+    job = jobs.enqueue(receipt_service.user_id, image_file.filename, file_path, image_url)
+    
+    return jsonify({
+        "status": "queued",
+        "job_id": job.id,
+        "status_url": url_for('cashflow.receipt_job_status', job_id=job.id),
+        "events_url": url_for('cashflow.receipt_job_events', job_id=job.id)
+    }), 202, {"Location": url_for('cashflow.receipt_job_status', job_id=job.id)}
+
+@cashflow_bp.route('/api/extract-receipt-details/batch', methods=['POST'])
+def extract_receipt_batch():
+    """API endpoint to extract many receipts at once
+
+    Accepts any number of images and/or .zip archives of images under `files`
+    and returns one result per image. The request body is capped by
+    RECEIPT_BATCH_MAX_CONTENT_LENGTH instead of the app-wide MAX_CONTENT_LENGTH.
+    """
+    config = current_app.config
+    # Must be set before the form is parsed
+    request.max_content_length = config['RECEIPT_BATCH_MAX_CONTENT_LENGTH']
+    uploads = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+    if not uploads:
+        return jsonify({"status": "error", "message": "No files in the request"}), 400
+    
+    receipt_service = ReceiptExtraction(user_id=1)  # Hardcoded user_id for now
+    try:
+        image_files, skipped = receipt_service.expand_uploads(
+            uploads, max_files=config.get('RECEIPT_BATCH_MAX_FILES', 500),
+            max_total_size=config['RECEIPT_BATCH_MAX_EXPANDED_SIZE'])
+    except zipfile.BadZipFile:
+        return jsonify({"status": "error", "message": "Invalid zip archive"}), 400
+    except BatchTooLarge as e:
+        return jsonify({"status": "error", "message": str(e)}), 413
     
-    if result["status"] == "success":
-        return jsonify(result), 200
-    else:
-        return jsonify(result), 500
+    try:
+        results = receipt_service.extract_batch(image_files)
+    finally:
+        # Unzipped members are spooled to temporary files
+        for image_file in image_files:
+            image_file.close()
+    results += [{"filename": name, "status": "error", "message": "File too large"} for name in skipped]
+    succeeded = sum(1 for r in results if r["status"] == "success")
+    return jsonify({
+        "status": "success" if succeeded == len(results) else ("partial" if succeeded else "error"),
+        "processed": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "usage": receipt_service.usage,
+        "results": results
+    })
+
+@cashflow_bp.route('/api/receipt-jobs/<job_id>', methods=['GET'])
+def receipt_job_status(job_id):
+    """API endpoint to poll a receipt extraction job"""
+    # After a restart nothing may have been uploaded yet; make sure the jobs left over get picked up
+    receipt_jobs().start()
+    job = ReceiptJob.query.filter_by(id=job_id, user_id=1).first()
+    if job is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@cashflow_bp.route('/api/receipt-jobs/<job_id>/events', methods=['GET'])
+def receipt_job_events(job_id):
+    """Server-Sent Events for a receipt job: one "job" event per status change, ending when it finishes"""
+    receipt_jobs().start()
+    if ReceiptJob.query.filter_by(id=job_id, user_id=1).first() is None:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    jobs = receipt_jobs()
+    timeout = current_app.config.get('RECEIPT_JOB_EVENTS_TIMEOUT', 300)
+
+    def events():
+        deadline = time.monotonic() + timeout
+        last_status = None
+        while True:
+            db.session.expire_all()
+            job = db.session.get(ReceiptJob, job_id)
+            if job is None:
+                # Deleted while being watched
+                yield sse_event("error", {"message": "Job not found"})
+                return
+            if job.status != last_status:
+                last_status = job.status
+                yield sse_event("job", job.to_dict())
+            if job.status in FINISHED or time.monotonic() >= deadline:
+                return
+            # Woken by the workers on every state change; the timeout is a safety net
+            with jobs.changed:
+                jobs.changed.wait(timeout=1.0)
 
+    return sse_response(events())
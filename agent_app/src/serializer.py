@@ -0,0 +1,184 @@
+import json
+from datetime import timedelta
+from .models import parse_date
+
+# Rough size of a token for English text and JSON; good enough to enforce a budget
+# without shipping a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Approximate token count of a string"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compact_json(value):
+    """JSON without whitespace, floats rounded to cents"""
+    return json.dumps(_round(value), separators=(",", ":"), default=str)
+
+
+def _round(value):
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, dict):
+        return {key: _round(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_round(item) for item in value]
+    return value
+
+
+def _is_transaction_list(value):
+    return isinstance(value, list) and bool(value) and isinstance(value[0], dict) \
+        and {"date", "amount", "type"} <= set(value[0])
+
+
+def _signed(row):
+    """Income positive, expenses negative, other types zero (as in the ledger balance)"""
+    if row["type"] == "income":
+        return round(row["amount"], 2)
+    if row["type"] == "expense":
+        return round(-row["amount"], 2)
+    return 0.0
+
+
+def _split_by_date(transactions):
+    """([(date, row)] sorted by date, [undated rows]); undated rows are labelled by the snapshot
+    or have a date string that isn't YYYY-MM-DD"""
+    dated, undated = [], []
+    for row in transactions:
+        day = None if row.get("undated") else parse_date(row["date"])
+        if day is None:
+            undated.append(row)
+        else:
+            dated.append((day, row))
+    dated.sort(key=lambda pair: pair[0])
+    return dated, undated
+
+
+def columnar_transactions(transactions):
+    """Column-per-field layout with dates stored as day deltas
+
+    Rows are sorted by date; "start" is the first date and "day_delta" the
+    number of days since the previous row. Amounts are signed (expenses
+    negative), which makes a separate type column unnecessary. Rows without a
+    usable date go in an "undated" block with their date string as stored.
+    """
+    dated, undated = _split_by_date(transactions)
+    start = dated[0][0] if dated else None
+    previous = start
+    deltas = []
+    for current, _ in dated:
+        deltas.append((current - previous).days)
+        previous = current
+    result = {
+        "format": "columnar",
+        "count": len(dated),
+        "start": start.isoformat() if start else None,
+        "day_delta": deltas,
+        "amount": [_signed(row) for _, row in dated],
+        "description": [row["description"] for _, row in dated],
+    }
+    if undated:
+        result["undated"] = {
+            "count": len(undated),
+            "date": [row["date"] for row in undated],
+            "amount": [_signed(row) for row in undated],
+            "description": [row["description"] for row in undated],
+        }
+    return result
+
+
+def bucketed_transactions(transactions, days=7):
+    """Income, expense and count per `days`-day bucket, columnar, plus period totals
+
+    Rows without a usable date are summed in a separate "undated" bucket.
+    """
+    dated, undated = _split_by_date(transactions)
+    start = dated[0][0] if dated else None
+    # Align weekly buckets to Mondays so they read as calendar weeks
+    if start is not None and days == 7:
+        start -= timedelta(days=start.weekday())
+    buckets = {}
+    for day, row in dated:
+        _add_to_bucket(buckets.setdefault((day - start).days // days, [0.0, 0.0, 0]), row)
+    indexes = sorted(buckets)
+    result = {
+        "format": "buckets",
+        "bucket_days": days,
+        "count": len(dated),
+        "start": [(start + timedelta(days=i * days)).isoformat() for i in indexes],
+        "income": [round(buckets[i][0], 2) for i in indexes],
+        "expense": [round(buckets[i][1], 2) for i in indexes],
+        "n": [buckets[i][2] for i in indexes],
+        "total_income": round(sum(b[0] for b in buckets.values()), 2),
+        "total_expense": round(sum(b[1] for b in buckets.values()), 2),
+    }
+    if undated:
+        bucket = [0.0, 0.0, 0]
+        for row in undated:
+            _add_to_bucket(bucket, row)
+        result["undated"] = {"income": round(bucket[0], 2), "expense": round(bucket[1], 2), "n": bucket[2]}
+    return result
+
+
+def _add_to_bucket(bucket, row):
+    """Add a row to an [income, expense, count] bucket; other types are only counted"""
+    if row["type"] == "income":
+        bucket[0] += row["amount"]
+    elif row["type"] == "expense":
+        bucket[1] += row["amount"]
+    bucket[2] += 1
+
+
+def _truncated(value, text, token_budget):
+    """A well-formed JSON stand-in for a result that doesn't fit the budget
+
+    Lists keep as many leading items as fit; anything else becomes a preview of
+    the start of its JSON text. Either way a "truncated" object says what was kept.
+    """
+    tokens = estimate_tokens(text)
+    if isinstance(value, list):
+        def stub(kept):
+            return compact_json({"items": value[:kept],
+                                 "truncated": {"items_returned": kept, "items_total": len(value),
+                                               "tokens_total": tokens, "token_budget": token_budget}})
+        low, high = 0, len(value)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if estimate_tokens(stub(middle)) <= token_budget:
+                low = middle
+            else:
+                high = middle - 1
+        return stub(low)
+
+    def preview(chars):
+        return compact_json({"preview": text[:chars],
+                             "truncated": {"chars_returned": chars, "chars_total": len(text),
+                                           "tokens_total": tokens, "token_budget": token_budget}})
+    chars = token_budget * CHARS_PER_TOKEN
+    result = preview(chars)
+    # Escaping can make the preview longer than the text it shows
+    while chars and estimate_tokens(result) > token_budget:
+        chars = chars * 3 // 4
+        result = preview(chars)
+    return result
+
+
+def serialize_tool_result(value, token_budget=2000):
+    """Encode a tool result for the model within roughly `token_budget` tokens
+
+    Transaction lists go out columnar; when that is over budget they are
+    pre-aggregated into weekly buckets, then 30-day buckets. Other results are
+    compact JSON. Only results that still don't fit are truncated (see _truncated).
+    """
+    if _is_transaction_list(value):
+        candidates = (columnar_transactions, bucketed_transactions,
+                      lambda rows: bucketed_transactions(rows, days=30))
+        for encode in candidates:
+            text = compact_json(encode(value))
+            if estimate_tokens(text) <= token_budget:
+                return text
+    text = compact_json(value)
+    if estimate_tokens(text) <= token_budget:
+        return text
+    return _truncated(value, text, token_budget)
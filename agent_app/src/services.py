@@ -1,264 +1,325 @@
-import anthropic
 import os
 import json
 import uuid
 import base64
+import hashlib
+import re
+import time
+import random
+import mimetypes
+import shutil
+import tempfile
+import threading
+import zipfile
+import anthropic
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-from .models import Transaction, InitialBalance, ReceiptDetail, ReceiptItem, db
+from .models import ReceiptDetail, ReceiptItem, db
+from .ledger import ledger_fingerprint
+from .cache import forecast_cache
+from .forecast_engine import LocalForecastEngine, series_from_summaries
+from .recurring import detect_recurring
+from .database import analytics_session
+from .rollup import MonthlyRollup, monthly_averages, monthly_trend, seasonal_multipliers
+from .snapshot import ledger_snapshot
+from .tool_loop import ToolMemo, run_tool_calls
+from .imaging import ReceiptImagePreprocessor, base64_file
+from .llm import llm_client
+from .tools import BoundTools, tool, tool_registry, tool_schemas
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Names of content-addressed receipt images (see ReceiptExtraction._save_image)
+CONTENT_HASH = re.compile(r"[0-9a-f]{64}")
+# Bytes copied per read when saving an upload
+UPLOAD_CHUNK = 64 * 1024
+# Prompt-caching breakpoint: everything up to and including the marked block is cached
+EPHEMERAL = {"type": "ephemeral"}
+
+#Static instructions for LLM forecasts; sent as a cached system prompt, the figures go in the user message
+FORECAST_SYSTEM_PROMPT = """
+        You are a financial analyst agent tasked with forecasting cash flow.
+
+        You will be given the current balance, monthly averages and the forecast horizon.
+
+        Consider:
+        1. Recurring transactions identified from historical data
+        2. Expected changes in income or expenses
+        3. Seasonal variations if applicable
+
+        Generate a day-by-day forecast showing:
+        - Date
+        - Expected income
+        - Expected expenses
+        - Net daily cash flow
+        - Running balance
+
+        Then provide:
+        1. A summary of total expected income over this period
+        2. Total expected expenses
+        3. Net cash flow
+        4. Final projected balance
+        5. Key insights about the forecasted period
+
+        Use the available tools to analyze transaction history and identify patterns.
+        """
+
+#Static instructions for hybrid-mode narratives
+NARRATIVE_SYSTEM_PROMPT = """
+        You are a financial analyst agent. A deterministic model has already projected the
+        cash flow you will be given. Do not recompute or change its numbers;
+        write a concise narrative explaining them.
+
+        Provide:
+        1. A short summary of the period
+        2. Key risks (e.g. low or negative balance dates)
+        3. Key insights and recommendations
+        """
+
 class FinancialAnalysis:
     """Base class for all financial analysis agent functions"""
 
-    def __init__(self, user_id, api_key=None): #Initialize the basic settings of LLM services
+    def __init__(self, user_id, api_key=None, client=None): #Initialize the basic settings of LLM services
         self.user_id = user_id
         self.api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+        # Tools run in worker threads; the first one to need the ledger (or the monthly rollup) loads it
+        self._ledger = None
+        self._monthly = None
+        self._ledger_lock = threading.Lock()
         
         if not self.api_key:
             print("Warning: ANTHROPIC_API_KEY not found in environment variables or provided as parameter")
-            
-        self.tools = {
-            "get_transactions": self.get_transactions,
-            "get_balance": self.get_balance,
-            "calculate_monthly_averages": self.calculate_monthly_averages,
-            "get_recurring_transactions": self.get_recurring_transactions
-        }
 
-        #Initialize Anthropic client if API key is provided
-        if self.api_key:
-            self.client = anthropic.Anthropic(api_key=self.api_key)
+        #Use the app's pooled Anthropic client if an API key (or a client) is provided
+        if self.api_key or client is not None:
+            self.client = client or llm_client(self.api_key)
             self.model = "claude-3-haiku-20240307"
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Build subclasses' tool schemas at import too, not on the first LLM call
+        tool_registry(cls)
+
+    @property
+    def ledger(self):
+        """Columnar snapshot of the user's ledger, loaded on first use and shared by every tool call"""
+        with self._ledger_lock:
+            if self._ledger is None:
+                self._ledger = ledger_snapshot(self.user_id)
+            return self._ledger
+
+    @property
+    def monthly_history(self):
+        """Per-month income/expense totals from the MonthlySummary rollup, loaded on first use"""
+        with self._ledger_lock:
+            if self._monthly is None:
+                self._monthly = MonthlyRollup(self.user_id, analytics_session()).monthly_totals()
+            return self._monthly
+
+    @property
+    def tools(self):
+        """The @tool methods of this class by name (see tools.tool_registry)"""
+        return BoundTools(self)
+
     #start writing for the agent tools
     #1st tool: get_transactions
-    def get_transactions(self, start_date=None, end_date=None):
-        """Get filtered transactions from the database for analysis"""
-        query = Transaction.query.filter_by(user_id=self.user_id)
-
-        if start_date:
-            query = query.filter(Transaction.date >= start_date)
-        if end_date:
-            query = query.filter(Transaction.date <= end_date)
-
-        transactions = query.all()
-
-        # Convert to serializable format
-        return [{
-            "id": t.id,
-            "date": t.date,
-            "description": t.description,
-            "amount": t.amount,
-            "type": t.type
-        } for t in transactions]
+    @tool(start_date="Start date in YYYY-MM-DD format", end_date="End date in YYYY-MM-DD format")
+    def get_transactions(self, start_date: str = None, end_date: str = None):
+        """Get filtered transactions from the database for analysis.
+        Returned columnar: dates as day_delta from "start", signed amounts (expenses negative).
+        Long ranges come back as weekly or 30-day income/expense buckets instead."""
+        try:
+            return self.ledger.rows(start_date, end_date)
+        except ValueError as e:
+            return {"error": str(e)}
 
+    @tool()
     def get_balance(self):
         """Get current balance for the user"""
-        initial = InitialBalance.query.filter_by(user_id=self.user_id).first()
-        balance = initial.balance if initial else 0.0
+        return self.ledger.balance()
 
-        #Add all income and subtract all expenses
-        transactions = Transaction.query.filter_by(user_id=self.user_id).all()
-        for tx in transactions:
-            if tx.type == "income":
-                balance += tx.amount
-            elif tx.type == "expense":
-                balance -= tx.amount
+    @tool(months="Number of months to analyze")
+    def calculate_monthly_averages(self, months: int = 3):
+        """Calculate average monthly income and expenses over the last complete calendar months"""
+        return monthly_averages(self.monthly_history, months)
 
-        return balance
+    @tool(months="Number of complete months to return")
+    def get_monthly_trend(self, months: int = 12):
+        """Get monthly income, expense and net totals for the last complete calendar months with their
+        linear trend (change per month), plus seasonal indexes per calendar month (January first,
+        1.0 = an average month) once there are two years of history."""
+        return monthly_trend(self.monthly_history, months)
 
-    def calculate_monthly_averages(self, months=3):
-        """Calculate average monthly income and expenses"""
-        today = datetime.now()
-        start_date = (today - timedelta(days=30 * months)).strftime("%Y-%m-%d")
+    @tool(min_occurrences="Minimum number of occurrences to consider recurring")
+    def get_recurring_transactions(self, min_occurrences: int = 2):
+        """Identify recurring transactions (weekly, biweekly or monthly series with a similar amount).
+        Returns one summary per series with its cadence, mean amount, next expected date and confidence."""
+        days, amounts, is_income, description_ids = self.ledger.dated()
+        if not len(days):
+            return []
+        return detect_recurring(days, amounts, is_income, description_ids, min_occurrences=min_occurrences,
+                                labels=self.ledger.descriptions)
 
-        transactions = Transaction.query.filter_by(user_id=self.user_id).filter(
-            Transaction.date >= start_date).all()
-        
-        total_income = 0
-        total_expenses = 0
-
-        for tx in transactions:
-            if tx.type == "income":
-                total_income += tx.amount
-            elif tx.type == "expense":
-                total_expenses += tx.amount
-        #calculate monthly averages
-        avg_income = total_income / months
-        avg_expenses = total_expenses / months
-
-        return {"avg_monthly_income": avg_income,
-                "avg_monthly_expenses": avg_expenses,
-                "avg_monthly_net": avg_income - avg_expenses
-                }
+    def _call_llm(self, prompt, max_tokens=4000, tools=None, timeout=None, memo=None, max_turns=None, system=None):
+        """Utility method for calling Claude with proper error handling
 
-    def get_recurring_transactions(self, min_occurrences=2):
-        """Identify recurring transactions based on description and similar amount"""
-        transactions = Transaction.query.filter_by(user_id=self.user_id).all()
-
-        #Group by description
-        tx_by_desc = {}
-        for tx in transactions:
-            if tx.description not in tx_by_desc:
-                tx_by_desc[tx.description] = []
-            tx_by_desc[tx.description].append({
-                "id": tx.id,
-                "date": tx.date,
-                "amount": tx.amount,
-                "type": tx.type
-            })
-
-        # Filter to recurring transactions (appear multiple times)
-        recurring = {}
-        for desc, txs in tx_by_desc.items():
-            if len(txs) >= min_occurrences:
-                recurring[desc] = txs
-
-        return recurring
-
-    def _call_llm(self, prompt, max_tokens=4000, tools=None):
-        """Utility method for calling Claude with proper error handling"""
+        With `tools`, tool_use turns are answered in a loop of at most `max_turns`
+        model calls (LLM_MAX_TOOL_TURNS by default). Tool results are memoized in
+        `memo` (a ToolMemo) for the whole request, and the result carries a
+        per-turn latency report under "turns".
+
+        `system` holds the static instructions; it and the tool definitions are
+        marked for prompt caching, so only `prompt` (the per-request data) is
+        processed from scratch on repeated calls. Token usage summed over all
+        turns, including cache reads and writes, is returned under "usage".
+        """
         if not self.api_key:
             return {"error": "API key not configured"}
 
         try:
-            #Format messages based on whether tools are provided
-            messages = [{"role": "user", "content": prompt}]
-
+            for event in self._llm_events(prompt, max_tokens, tools, timeout, memo, max_turns, system):
+                pass
+            result = {"result": event["result"], "usage": event["usage"]}
             if tools:
-                #Convert the instance methods to tool schemas for Claude
-                tool_schemas = []
-                for tool_name, tool_fn in tools.items():
-                    # Basic schema with name and description from docstring
-                    schema = {
-                        "name": tool_name,
-                        "description": tool_fn.__doc__ or f"Call the {tool_name} function",
-                        "input_schema": {
-                            "type": "object",
-                            "properties": {}
-                        }
-                    }
-                    
-                    # Add specific parameters for each tool based on function name
-                    if tool_name == "get_transactions":
-                        schema["input_schema"]["properties"] = {
-                            "start_date": {"type": "string", "description": "Start date in YYYY-MM-DD format"},
-                            "end_date": {"type": "string", "description": "End date in YYYY-MM-DD format"}
-                        }
-                    elif tool_name == "calculate_monthly_averages":
-                        schema["input_schema"]["properties"] = {
-                            "months": {"type": "integer", "description": "Number of months to analyze"}
-                        }
-                    elif tool_name == "get_recurring_transactions":
-                        schema["input_schema"]["properties"] = {
-                            "min_occurrences": {"type": "integer", "description": "Minimum number of occurrences to consider recurring"}
-                        }
-                    
-                    tool_schemas.append(schema)
-                
-                # Initial response from Claude
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=messages,
-                    tools=tool_schemas
-                )
-                
-                # Handle tool use if Claude wants to use a tool
-                if response.stop_reason == "tool_use":
-                    # Find tool_use blocks in the response
-                    tool_use_blocks = [block for block in response.content if block.type == "tool_use"]
-                    
-                    if tool_use_blocks:
-                        # Process each tool use request
-                        tool_results = []
-                        for tool_block in tool_use_blocks:
-                            # Get the tool function
-                            tool_name = tool_block.name
-                            tool_fn = tools.get(tool_name)
-                            
-                            if tool_fn:
-                                # Execute the tool with the provided input
-                                try:
-                                    result = tool_fn(**tool_block.input)
-                                    # Format the result
-                                    tool_results.append({
-                                        "type": "tool_result",
-                                        "tool_use_id": tool_block.id,
-                                        "content": str(result)
-                                    })
-                                except Exception as e:
-                                    # Handle tool execution error
-                                    tool_results.append({
-                                        "type": "tool_result",
-                                        "tool_use_id": tool_block.id,
-                                        "content": f"Error executing tool: {str(e)}",
-                                        "is_error": True
-                                    })
-                        
-                        # Send the tool results back to Claude to get the final response
-                        if tool_results:
-                            final_messages = messages + [
-                                {"role": "assistant", "content": response.content},
-                                {"role": "user", "content": tool_results}
-                            ]
-                            
-                            # Get final response with the tool results
-                            final_response = self.client.messages.create(
-                                model=self.model,
-                                max_tokens=max_tokens,
-                                messages=final_messages
-                            )
-                            
-                            # Extract text from the final response
-                            text_blocks = [block.text for block in final_response.content if block.type == "text"]
-                            return {"result": "\n".join(text_blocks)}
-                
-                # If no tool was used or if tool processing is complete, return the text content
-                text_blocks = [block.text for block in response.content if block.type == "text"]
-                return {"result": "\n".join(text_blocks)}
-            else:
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=max_tokens,
-                    messages=messages
-                )
-                
-                # Extract text from the response
-                text_blocks = [block.text for block in response.content if block.type == "text"]
-                return {"result": "\n".join(text_blocks)}
+                result["turns"] = event["turns"]
+            return result
         except Exception as e:
             import traceback
             return {"error": str(e), "traceback": traceback.format_exc()}
 
+    def _stream_llm(self, prompt, max_tokens=4000, tools=None, timeout=None, memo=None, max_turns=None, system=None):
+        """Streaming counterpart of _call_llm: yields progress events as they happen
+
+        Events are dicts with an "event" key: "text" (a text delta), "tool_call"
+        (Claude started a tool_use block), "tools" (a turn's tools finished, with
+        its stats), and finally "done" (result, turns and usage) or "error".
+        """
+        if not self.api_key:
+            yield {"event": "error", "error": "API key not configured"}
+            return
+        try:
+            yield from self._llm_events(prompt, max_tokens, tools, timeout, memo, max_turns, system, stream=True)
+        except Exception as e:
+            yield {"event": "error", "error": str(e)}
+
+    def _model_turn(self, stream, **params):
+        """One model call; when streaming, yields text and tool_call events before returning the message"""
+        if not stream:
+            return self.client.messages.create(**params)
+        with self.client.messages.stream(**params) as events:
+            for event in events:
+                if event.type == "text":
+                    yield {"event": "text", "delta": event.text}
+                elif event.type == "content_block_start" and event.content_block.type == "tool_use":
+                    yield {"event": "tool_call", "name": event.content_block.name}
+            return events.get_final_message()
+
+    def _llm_events(self, prompt, max_tokens, tools, timeout, memo, max_turns, system=None, stream=False):
+        """The model/tool loop shared by _call_llm and _stream_llm"""
+        #Format messages based on whether tools are provided
+        messages = [{"role": "user", "content": prompt}]
+        # Per-request timeout (seconds) so one slow call can't outlive its caller's deadline
+        params = {"model": self.model, "max_tokens": max_tokens}
+        if timeout:
+            params["timeout"] = timeout
+        caching = current_app.config.get('LLM_PROMPT_CACHING', True)
+        if system:
+            params["system"] = cached_system(system) if caching else system
+        usage = {}
+
+        if not tools:
+            response = yield from self._model_turn(stream, messages=messages, **params)
+            add_usage(usage, response)
+            text_blocks = [block.text for block in response.content if block.type == "text"]
+            yield {"event": "done", "result": "\n".join(text_blocks), "turns": [], "usage": usage}
+            return
+
+        params["tools"] = tool_schemas(type(self), tools)
+        if caching:
+            # Tools come first in the prompt; a breakpoint on the last one caches them all
+            params["tools"][-1] = {**params["tools"][-1], "cache_control": EPHEMERAL}
+
+        # Agent loop: keep answering tool_use turns until Claude produces its
+        # answer or the turn budget runs out
+        memo = memo if memo is not None else ToolMemo()
+        max_turns = max_turns or current_app.config.get('LLM_MAX_TOOL_TURNS', 5)
+        turns = []
+        for turn in range(1, max_turns + 1):
+            started = time.perf_counter()
+            response = yield from self._model_turn(
+                stream,
+                messages=messages,
+                # Last turn: the model has to answer with what it already has
+                **({"tool_choice": {"type": "none"}} if turn == max_turns else {}),
+                **params
+            )
+            report = {"turn": turn, "llm_ms": round((time.perf_counter() - started) * 1000, 1),
+                      "stop_reason": response.stop_reason, **add_usage({}, response)}
+            add_usage(usage, response)
+            turns.append(report)
+
+            tool_use_blocks = [block for block in response.content if block.type == "tool_use"]
+            if response.stop_reason != "tool_use" or not tool_use_blocks:
+                break
+
+            # Independent tool calls from one turn run in parallel
+            tool_results, stats = run_tool_calls(
+                tool_use_blocks, tools, memo,
+                token_budget=current_app.config.get('TOOL_RESULT_TOKEN_BUDGET', 2000)
+            )
+            report.update(stats)
+            yield {"event": "tools", **report}
+            messages = messages + [
+                {"role": "assistant", "content": response.content},
+                {"role": "user", "content": tool_results}
+            ]
+
+        for report in turns:
+            current_app.logger.info("LLM turn %(turn)s: %(llm_ms)sms, stop=%(stop_reason)s", report)
+
+        text_blocks = [block.text for block in response.content if block.type == "text"]
+        yield {"event": "done", "result": "\n".join(text_blocks), "turns": turns, "usage": usage}
+
     def call_tool(self, tool_name, **kwargs):
         """Utility to call a tool by name with parameters"""
-        if tool_name in self.tools:
-            tool_fn = self.tools(tool_name)
+        tools = self.tools
+        if tool_name in tools:
+            tool_fn = tools[tool_name]
             return tool_fn(**kwargs) # **kwargs allows passing arguments dynamically
         return {"error": f"Tool {tool_name} not found"}
 
+tool_registry(FinancialAnalysis)
+
 #CashFlowForecast class which inherits from FinancialAnalysis, using tools from FinancialAnalysis
 class CashFlowForecast(FinancialAnalysis):
     """Service for forecasting future cash flow"""
 
+    def data_snapshot(self):
+        """Compute the inputs every forecast horizon shares: balance, monthly averages and trend, recurring series"""
+        return {
+            "balance": self.get_balance(),
+            "monthly_averages": self.calculate_monthly_averages(),
+            "monthly_trend": self.get_monthly_trend(),
+            "recurring": self.get_recurring_transactions()
+        }
+
     #generate_forecast_prompt method for the later tool to use for the LLM generated results
-    def generate_forecast_prompt(self, days=30):
-        """Generate a prompt for cash flow forecasting"""
-        balance = self.get_balance()
-        monthly_avgs = self.calculate_monthly_averages()
-        recurring = self.get_recurring_transactions()
+    def generate_forecast_prompt(self, days=30, snapshot=None):
+        """Generate a prompt for cash flow forecasting (the per-request part; see FORECAST_SYSTEM_PROMPT)"""
+        snapshot = snapshot or self.data_snapshot()
+        balance = snapshot["balance"]
+        monthly_avgs = snapshot["monthly_averages"]
 
         #Convert dates to a consistent format for the prompt
         today = datetime.now()
         forecast_end = today + timedelta(days=days)
 
         prompt = f"""
-        You are a financial analyst agent tasked with forecasting cash flow.
-
         Current Information:
         - Current Balance: ${balance:.2f}
         - Average Monthly Income: ${monthly_avgs['avg_monthly_income']:.2f}
@@ -267,63 +328,175 @@ class CashFlowForecast(FinancialAnalysis):
 
         Forecasting Task:
         Forecast the cash flow for the next {days} days (until {forecast_end.strftime("%Y-%m-%d")}).
+        """
 
-        Consider:
-        1. Recurring transactions identified from historical data
-        2. Expected changes in income or expenses
-        3. Seasonal variations if applicable
+        return prompt
 
-        Generate a day-by-day forecast showing:
-        - Date
-        - Expected income
-        - Expected expenses
-        - Net daily cash flow
-        - Running balance
+    def local_forecast(self, days=30, snapshot=None):
+        """Project the next `days` days deterministically, without calling the LLM"""
+        snapshot = snapshot or self.data_snapshot()
+        engine = LocalForecastEngine(
+            balance=snapshot["balance"],
+            monthly_averages=snapshot["monthly_averages"],
+            recurring_series=series_from_summaries(snapshot["recurring"]),
+            # Relative to the 3 months calculate_monthly_averages() averaged over
+            seasonality=seasonal_multipliers((snapshot.get("monthly_trend") or {}).get("seasonality"), months=3)
+        )
+        return engine, engine.forecast(days)
 
-        Then provide:
-        1. A summary of total expected income over this period
-        2. Total expected expenses
-        3. Net cash flow
-        4. Final projected balance
-        5. Key insights about the forecasted period
+    def generate_narrative_prompt(self, days, engine, projection):
+        """Prompt asking the LLM to explain an already computed projection (no tools needed; see NARRATIVE_SYSTEM_PROMPT)"""
+        weekly_rows = "\n".join(
+            f"{row['date']}: income ${row['income']:.2f}, expenses ${row['expenses']:.2f}, balance ${row['balance']:.2f}"
+            for row in projection["daily"][::7]
+        )
+        summary = projection["summary"]
 
-        Use the available tools to analyze transaction history and identify patterns.
-        """
+        return f"""
+        Projection for the next {days} days:
 
-        return prompt
+        Starting Balance: ${engine.balance:.2f}
+        Total Expected Income: ${summary['total_income']:.2f}
+        Total Expected Expenses: ${summary['total_expenses']:.2f}
+        Net Cash Flow: ${summary['net_cash_flow']:.2f}
+        Final Projected Balance: ${summary['final_balance']:.2f}
+        Lowest Projected Balance: ${summary['lowest_balance']:.2f} on {summary['lowest_balance_date']}
+
+        Recurring series used: {json.dumps(engine.recurring_series)}
+
+        Projected balance (every 7th day):
+        {weekly_rows}
+        """
 
     #
-    def forecast(self, days=30):
-        """Generate a cash flow forecast for the specified number of days"""
+    def forecast(self, days=30, mode="llm", snapshot=None, timeout=None):
+        """Generate a cash flow forecast for the specified number of days
+
+        mode="llm" lets Claude produce the forecast with tools, mode="local" uses the
+        deterministic engine only, and mode="hybrid" computes the numbers locally and
+        asks Claude for the narrative. A pre-computed `snapshot` (see data_snapshot)
+        avoids re-reading the ledger when several horizons are forecast together.
+
+        Finished forecasts are cached per ledger fingerprint (see cache.ForecastCache);
+        errors are never cached.
+        """
+        cache = forecast_cache()
+        if cache is None:
+            return self._forecast_uncached(days, mode, snapshot, timeout)
+
+        key = cache.key(self.user_id, days, mode)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        result = self._forecast_uncached(days, mode, snapshot, timeout)
+        if "error" not in result:
+            cache.set(key, result)
+        return result
+
+    def _forecast_uncached(self, days, mode, snapshot, timeout):
+        for event in self._forecast_events(days, mode, snapshot, timeout):
+            pass
+        if event["event"] == "forecast":
+            return event["forecast"]
+        return {key: value for key, value in event.items() if key != "event"}
+
+    def stream_forecast(self, days=30, mode="llm", timeout=None):
+        """Generator version of forecast() for the streaming endpoint
+
+        Yields a "status" event straight away, then the model's "text", "tool_call"
+        and "tools" events as they arrive, and finally "forecast" (the same payload
+        forecast() returns) or "error".
+        """
+        cache = forecast_cache()
+        key = cache.key(self.user_id, days, mode) if cache is not None else None
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            yield {"event": "forecast", "forecast": cached, "cached": True}
+            return
+
+        yield {"event": "status", "message": "Reading ledger"}
+        for event in self._forecast_events(days, mode, None, timeout, stream=True):
+            if event["event"] == "forecast" and cache is not None:
+                cache.set(key, event["forecast"])
+            yield event
+
+    def _llm_as_events(self, *args, **kwargs):
+        """_call_llm wrapped in the event protocol of _stream_llm"""
+        result = self._call_llm(*args, **kwargs)
+        if "error" in result:
+            yield {"event": "error", "error": result["error"]}
+        else:
+            yield {"event": "done", **result}
+
+    def _forecast_events(self, days, mode, snapshot, timeout, stream=False):
+        """The forecast pipeline as events; the final one is "forecast" or "error"
+
+        forecast() drains it with the blocking _call_llm, stream_forecast() runs it
+        with _stream_llm and forwards the events.
+        """
+        llm = self._stream_llm if stream else self._llm_as_events
         try:
+            snapshot = snapshot or self.data_snapshot()
+
+            if mode in ("local", "hybrid"):
+                engine, projection = self.local_forecast(days, snapshot=snapshot)
+                forecast_text = engine.describe(days, projection)
+
+                if mode == "hybrid":
+                    for event in llm(self.generate_narrative_prompt(days, engine, projection),
+                                     max_tokens=1500, timeout=timeout, system=NARRATIVE_SYSTEM_PROMPT):
+                        if event["event"] == "error":
+                            yield event
+                            return
+                        if event["event"] != "done":
+                            yield event
+                    forecast_text = event["result"]
+
+                processed = self._process_forecast_result(forecast_text, days, mode=mode,
+                                                          current_balance=snapshot["balance"])
+                if mode == "hybrid":
+                    processed["metadata"]["llm_usage"] = event.get("usage", {})
+                processed["daily"] = projection["daily"]
+                processed["summary"] = projection["summary"]
+                yield {"event": "forecast", "forecast": processed}
+                return
+
             # Generate the prompt
-            prompt = self.generate_forecast_prompt(days)
-
-            # Call Claude with tools
-            forecast_tools = {
-                "get_transactions": self.get_transactions,
-                "get_balance": self.get_balance,
-                "calculate_monthly_averages": self.calculate_monthly_averages,
-                "get_recurring_transactions": self.get_recurring_transactions
-            }
+            prompt = self.generate_forecast_prompt(days, snapshot=snapshot)
 
-            # Call the LLM with the prompt and tools
-            result = self._call_llm(prompt, max_tokens=4000, tools=forecast_tools)  # Increased token limit
+            # The prompt already carries the snapshot; seed it so asking again is free
+            memo = ToolMemo()
+            memo.seed("get_balance", self.get_balance, snapshot["balance"])
+            memo.seed("calculate_monthly_averages", self.calculate_monthly_averages, snapshot["monthly_averages"])
+            if "monthly_trend" in snapshot:
+                memo.seed("get_monthly_trend", self.get_monthly_trend, snapshot["monthly_trend"])
+            memo.seed("get_recurring_transactions", self.get_recurring_transactions, snapshot["recurring"])
 
-            if "error" in result:
-                return {"error": result["error"]}
+            # Call the LLM with the prompt and every registered tool
+            for event in llm(prompt, max_tokens=4000, tools=self.tools, timeout=timeout,
+                             memo=memo, system=FORECAST_SYSTEM_PROMPT):  # Increased token limit
+                if event["event"] == "error":
+                    yield event
+                    return
+                if event["event"] != "done":
+                    yield event
 
             # Process the raw forecast result
-            return self._process_forecast_result(result["result"], days)
+            processed = self._process_forecast_result(event["result"], days, mode=mode,
+                                                      current_balance=snapshot["balance"])
+            processed["metadata"]["llm_turns"] = event.get("turns", [])
+            processed["metadata"]["llm_usage"] = event.get("usage", {})
+            yield {"event": "forecast", "forecast": processed}
         except Exception as e:
             import traceback
-            return {"error": str(e), "traceback": traceback.format_exc()}
+            yield {"event": "error", "error": str(e), "traceback": traceback.format_exc()}
 
-    def _process_forecast_result(self, raw_forecast, days):
+    def _process_forecast_result(self, raw_forecast, days, mode="llm", current_balance=None):
         """Process the raw forecast to add structure if needed"""
         try:
-            # Get current balance for reference
-            current_balance = self.get_balance()
+            # Get current balance for reference (reuse the snapshot's when the caller has one)
+            if current_balance is None:
+                current_balance = self.get_balance()
 
             # Get time information
             today = datetime.now()
@@ -336,7 +509,8 @@ class CashFlowForecast(FinancialAnalysis):
                     "forecast_start": today.strftime("%Y-%m-%d"),
                     "forecast_end": forecast_end.strftime("%Y-%m-%d"),
                     "current_balance": current_balance,
-                    "forecast_days": days
+                    "forecast_days": days,
+                    "mode": mode
                 }
             }
         except Exception as e:
@@ -349,18 +523,104 @@ class CashFlowForecast(FinancialAnalysis):
                 }
             }
 
-    def forecast_periods(self):
-        """Generate forecasts for 30, 90, and 180 day periods"""
-        return {
-            "30d": self.forecast(days=30),
-            "90d": self.forecast(days=90),
-            "180d": self.forecast(days=180)
+    def forecast_periods(self, mode="llm", timeout=None):
+        """Generate forecasts for 30, 90, and 180 day periods
+
+        The horizons run concurrently on one shared data snapshot. Each horizon gets
+        `timeout` seconds (FORECAST_HORIZON_TIMEOUT by default); a horizon that runs
+        out of time is returned as an error without holding back the others.
+        """
+        app = current_app._get_current_object()
+        timeout = timeout or app.config.get('FORECAST_HORIZON_TIMEOUT', 120)
+        horizons = {"30d": 30, "90d": 90, "180d": 180}
+
+        # Cached horizons are answered directly; the ledger is only read for the rest
+        results = {}
+        cache = forecast_cache()
+        if cache is not None:
+            # From the session the snapshot is read from, see ForecastCache
+            fingerprint = ledger_fingerprint(self.user_id, analytics_session())
+            for key, days in horizons.items():
+                cached = cache.get(cache.key(self.user_id, days, mode, fingerprint))
+                if cached is not None:
+                    results[key] = cached
+        pending = {key: days for key, days in horizons.items() if key not in results}
+        if not pending:
+            return results
+        snapshot = self.data_snapshot()
+
+        def run(days):
+            # Worker threads need their own app context (and with it their own DB session)
+            with app.app_context():
+                forecast = self._forecast_uncached(days, mode, snapshot, timeout)
+                if cache is not None and "error" not in forecast:
+                    cache.set(cache.key(self.user_id, days, mode, fingerprint), forecast)
+                return forecast
+
+        executor = ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="forecast")
+        try:
+            futures = {key: executor.submit(run, days) for key, days in pending.items()}
+            deadline = time.monotonic() + timeout
+            for key, future in futures.items():
+                try:
+                    results[key] = future.result(timeout=max(deadline - time.monotonic(), 0))
+                except FuturesTimeoutError:
+                    results[key] = {"error": f"Forecast for {horizons[key]} days timed out after {timeout} seconds"}
+            return {key: results[key] for key in horizons}
+        finally:
+            # Don't wait for a timed-out horizon; its LLM call is bounded by the same timeout
+            executor.shutdown(wait=False, cancel_futures=True)
+
+#Prompt for receipt extraction (the cached system prompt); part of the extraction version together
+#with RECEIPT_REQUEST, so changing either invalidates cached extractions
+RECEIPT_PROMPT = """
+        You are an expert receipt scanner. I'll provide you with an image of a receipt.
+        Extract and return ONLY the following information in valid JSON format:
+        
+        1. Date (in YYYY-MM-DD format)
+        2. Currency (3-character currency code like USD, CAD, EUR)
+        3. Vendor name (company/store name)
+        4. Receipt items (array of objects with item_name and item_cost as a number)
+        5. GST/tax amount (for the entire receipt, as a number) - This MUST be returned as "tax" in your JSON
+        6. Total amount (as a number)
+        
+        If any information is not visible or unclear, provide a reasonable default value.
+        If you can't determine the currency, use "USD".
+        If tax/GST is not visible, set it to 0.
+        
+        Your response MUST be in this exact format:
+        
+        {
+            "date": "YYYY-MM-DD",
+            "currency": "USD",
+            "vendor_name": "Store Name",
+            "receipt_items": [
+                {
+                    "item_name": "Item 1",
+                    "item_cost": 11.11
+                },
+                {
+                    "item_name": "Item 2",
+                    "item_cost": 22.22
+                }
+            ],
+            "tax": 12.34,
+            "total": 567.89
         }
+        
+        Return ONLY the extracted JSON data without any explanation or additional text.
+        """
+
+#User message sent with each receipt image
+RECEIPT_REQUEST = "Extract the details of this receipt."
+
+class BatchTooLarge(ValueError):
+    """A batch upload with too many files, or archives that expand to too many bytes"""
 
 class ReceiptExtraction:
     """Service class for extracting data from receipt images using AI"""
     
-    def __init__(self, user_id=1):
+    def __init__(self, user_id=1, client=None):
         self.user_id = user_id
         self.api_key = os.environ.get("ANTHROPIC_API_KEY")
         
@@ -368,12 +628,22 @@ class ReceiptExtraction:
             print("Warning: ANTHROPIC_API_KEY not found in environment variables. Receipt extraction may fail.")
             
         self.model = "claude-3-opus-20240229"
-        self.client = anthropic.Anthropic(api_key=self.api_key)
+        self.client = client or llm_client(self.api_key)
         self.allowed_extensions = {'jpg', 'jpeg', 'png'}
-        self.upload_folder = os.path.join('agent_app', 'static', 'image', 'receipts')
-        
-        # Create upload folder if it doesn't exist
-        os.makedirs(self.upload_folder, exist_ok=True)
+        # Token usage of this instance's Vision calls (batch threads add to it concurrently)
+        self.usage = {}
+        self._usage_lock = threading.Lock()
+        # Read here rather than per image: batch extraction runs outside the app context
+        if has_app_context():
+            # create_app has already made the folder
+            self.upload_folder = current_app.config['RECEIPT_UPLOAD_FOLDER']
+            self.preprocessor = ReceiptImagePreprocessor.from_config(current_app.config)
+            self.prompt_caching = current_app.config.get('LLM_PROMPT_CACHING', True)
+        else:
+            self.upload_folder = os.path.join('agent_app', 'static', 'image', 'receipts')
+            self.preprocessor = ReceiptImagePreprocessor()
+            self.prompt_caching = True
+            os.makedirs(self.upload_folder, exist_ok=True)
     
     def allowed_file(self, filename):
         """Check if the file has an allowed extension"""
@@ -393,108 +663,362 @@ class ReceiptExtraction:
             # Save the image file
             file_path, image_url = self._save_image(image_file)
             print(f"Saved to: {file_path}")
-            
-            # Convert image to base64 for the AI model
-            with open(file_path, "rb") as img_file:
-                base64_image = base64.b64encode(img_file.read()).decode("utf-8")
-            
-            # Call the AI model
-            ai_response = self._call_ai_model(file_path, base64_image)
-            
-            # Parse the JSON response
-            try:
-                extracted_data = json.loads(ai_response)
-                
-                # Provide default values for any missing required fields
-                default_values = {
-                    'date': datetime.now().strftime('%Y-%m-%d'),
-                    'currency': 'USD',
-                    'vendor_name': 'Unknown Vendor',
-                    'receipt_items': [],
-                    'tax': 0.0,
-                    'total': 0.0
-                }
-                
-                # Apply defaults for missing fields
-                for field, default_value in default_values.items():
-                    if field not in extracted_data:
-                        print(f"Warning: Missing field '{field}' in AI response. Using default value.")
-                        extracted_data[field] = default_value
-                
-                # Make sure receipt_items is a list, even if empty
-                if not isinstance(extracted_data['receipt_items'], list):
-                    extracted_data['receipt_items'] = []
-                
-                # Ensure numeric fields are numbers
-                for field in ['tax', 'total']:
-                    if not isinstance(extracted_data[field], (int, float)):
-                        try:
-                            extracted_data[field] = float(extracted_data[field])
-                        except (ValueError, TypeError):
-                            extracted_data[field] = 0.0
-                
-                # Process each receipt item to ensure it has the required fields
-                for item in extracted_data['receipt_items']:
-                    if 'item_name' not in item:
-                        item['item_name'] = 'Unnamed Item'
-                    if 'item_cost' not in item:
-                        item['item_cost'] = 0.0
-                    elif not isinstance(item['item_cost'], (int, float)):
-                        try:
-                            item['item_cost'] = float(item['item_cost'])
-                        except (ValueError, TypeError):
-                            item['item_cost'] = 0.0
-                
-                # Save to database
-                receipt = ReceiptDetail(
-                    user_id=self.user_id,
-                    date=extracted_data['date'],
-                    currency=extracted_data['currency'],
-                    vendor_name=extracted_data['vendor_name'],
-                    tax=extracted_data['tax'],
-                    total=extracted_data['total'],
-                    image_url=image_url
-                )
-                
-                db.session.add(receipt)
-                db.session.flush()  # To get the receipt ID before committing
-                
-                # Add receipt items
-                for item_data in extracted_data['receipt_items']:
-                    item = ReceiptItem(
-                        receipt_id=receipt.id,
-                        item_name=item_data['item_name'],
-                        item_cost=item_data['item_cost']
-                    )
-                    db.session.add(item)
-                
-                db.session.commit()
-                
-                # Return the saved receipt data
-                return {
-                    "status": "success",
-                    "data": receipt.to_dict()
-                }
-                
-            except json.JSONDecodeError:
-                return {"status": "error", "message": "Invalid JSON response from AI model"}
-            
+        except Exception as e:
+            return {"status": "error", "message": f"Error processing receipt: {str(e)}"}
+
+        return self.process_saved_image(file_path, image_url)
+
+    def process_saved_image(self, file_path, image_url):
+        """Extract and store the details of an image already saved by _save_image
+
+        This is the slow part of extract_receipt_details (the Vision call); the
+        receipt job queue runs it in a worker after the upload has returned.
+        """
+        try:
+            # Same image already extracted with this model and prompt: skip the Vision call
+            image_hash = self.content_hash(file_path)
+            existing, same_user = self.find_duplicate(image_hash)
+            if existing is not None:
+                return self._reuse_extraction(existing, same_user, image_url)
+
+            extracted_data, usage = self._extract_data(file_path)
+
+            # Save to database
+            receipt = self._build_receipt(extracted_data, image_url, image_hash)
+            db.session.add(receipt)
+            db.session.commit()
+
+            # Return the saved receipt data
+            return {
+                "status": "success",
+                "data": receipt.to_dict(),
+                "usage": usage
+            }
+        except json.JSONDecodeError:
+            return {"status": "error", "message": "Invalid JSON response from AI model"}
         except Exception as e:
             db.session.rollback()
             return {"status": "error", "message": f"Error processing receipt: {str(e)}"}
 
+    def _extract_data(self, file_path):
+        """Run the Vision model on a saved image; returns the cleaned-up fields and the call's token usage (no database access)"""
+        # Shrink the photo, then convert it to base64 for the AI model; an image
+        # sent as uploaded is encoded from disk in chunks rather than read whole
+        image_data = self.preprocessor.process_file(file_path)
+        if image_data is not None:
+            base64_image = base64.b64encode(image_data).decode("ascii")
+        else:
+            base64_image = base64_file(file_path)
+        
+        # Call the AI model
+        ai_response, usage = self._call_ai_model(file_path, base64_image)
+        
+        # Parse the JSON response
+        extracted_data = json.loads(ai_response)
+        
+        # Provide default values for any missing required fields
+        default_values = {
+            'date': datetime.now().strftime('%Y-%m-%d'),
+            'currency': 'USD',
+            'vendor_name': 'Unknown Vendor',
+            'receipt_items': [],
+            'tax': 0.0,
+            'total': 0.0
+        }
+        
+        # Apply defaults for missing fields
+        for field, default_value in default_values.items():
+            if field not in extracted_data:
+                print(f"Warning: Missing field '{field}' in AI response. Using default value.")
+                extracted_data[field] = default_value
+        
+        # Make sure receipt_items is a list, even if empty
+        if not isinstance(extracted_data['receipt_items'], list):
+            extracted_data['receipt_items'] = []
+        
+        # Ensure numeric fields are numbers
+        for field in ['tax', 'total']:
+            if not isinstance(extracted_data[field], (int, float)):
+                try:
+                    extracted_data[field] = float(extracted_data[field])
+                except (ValueError, TypeError):
+                    extracted_data[field] = 0.0
+        
+        # Process each receipt item to ensure it has the required fields
+        for item in extracted_data['receipt_items']:
+            if 'item_name' not in item:
+                item['item_name'] = 'Unnamed Item'
+            if 'item_cost' not in item:
+                item['item_cost'] = 0.0
+            elif not isinstance(item['item_cost'], (int, float)):
+                try:
+                    item['item_cost'] = float(item['item_cost'])
+                except (ValueError, TypeError):
+                    item['item_cost'] = 0.0
+        
+        return extracted_data, usage
+
+    def _build_receipt(self, extracted_data, image_url, image_hash=None):
+        """ReceiptDetail (with its items) for the extracted fields; the caller adds and commits it"""
+        return ReceiptDetail(
+            user_id=self.user_id,
+            image_hash=image_hash,
+            extraction_version=self.extraction_version if image_hash else None,
+            date=extracted_data['date'],
+            currency=extracted_data['currency'],
+            vendor_name=extracted_data['vendor_name'],
+            tax=extracted_data['tax'],
+            total=extracted_data['total'],
+            image_url=image_url,
+            items=[ReceiptItem(item_name=item_data['item_name'], item_cost=item_data['item_cost'])
+                   for item_data in extracted_data['receipt_items']]
+        )
+
+    def extract_batch(self, image_files, concurrency=None, commit_size=None):
+        """Extract many receipts concurrently and store them in bulk
+
+        At most `concurrency` Vision calls (RECEIPT_BATCH_CONCURRENCY, default 4)
+        are in flight at once; rate-limited or failed calls back off and retry
+        (RECEIPT_BATCH_MAX_RETRIES times) without holding a slot. Receipts are
+        committed `commit_size` at a time (RECEIPT_BATCH_COMMIT_SIZE, default 50)
+        instead of once each. Returns one result per input file, in order; each
+        extracted receipt's result carries the token usage of its Vision call.
+        """
+        config = current_app.config
+        concurrency = concurrency or config.get('RECEIPT_BATCH_CONCURRENCY', 4)
+        commit_size = commit_size or config.get('RECEIPT_BATCH_COMMIT_SIZE', 50)
+        max_retries = config.get('RECEIPT_BATCH_MAX_RETRIES', 4)
+        backoff = config.get('RECEIPT_BATCH_BACKOFF', 1.0)
+
+        results = [None] * len(image_files)
+        saved = []
+        for index, image_file in enumerate(image_files):
+            if not self.allowed_file(image_file.filename):
+                results[index] = {"filename": image_file.filename, "status": "error",
+                                  "message": "Invalid file type. Only JPG, JPEG, and PNG files are allowed."}
+                continue
+            try:
+                file_path, image_url = self._save_image(image_file)
+            except Exception as e:
+                results[index] = {"filename": image_file.filename, "status": "error",
+                                  "message": f"Error saving receipt: {str(e)}"}
+                continue
+            saved.append((index, image_file.filename, file_path, image_url))
+
+        gate = threading.BoundedSemaphore(concurrency)
+
+        def extract(file_path):
+            for attempt in range(max_retries + 1):
+                with gate:
+                    try:
+                        return self._extract_data(file_path)
+                    except Exception as e:
+                        delay = _retry_delay(e, attempt, backoff)
+                        if delay is None or attempt == max_retries:
+                            raise
+                # Sleep outside the semaphore so other receipts keep the slots busy
+                time.sleep(delay)
+
+        pending = []
+        # The first file with a given image hash is extracted; later copies in the batch point to it
+        first_with_hash = {}
+        repeats = []
+        # The loop in extract() is the only retry: the shared client retries on its
+        # own too, which would multiply the attempts and hold a slot while it waits
+        client, self.client = self.client, self.client.with_options(max_retries=0)
+        try:
+            # A few extra threads so slots freed by backing-off calls are reused
+            with ThreadPoolExecutor(max_workers=concurrency * 2, thread_name_prefix="receipt") as executor:
+                futures = []
+                for index, filename, file_path, image_url in saved:
+                    image_hash = self.content_hash(file_path)
+                    existing, same_user = self.find_duplicate(image_hash)
+                    if existing is not None:
+                        results[index] = {"filename": filename, **self._reuse_extraction(existing, same_user, image_url)}
+                    elif image_hash in first_with_hash:
+                        repeats.append((index, filename, first_with_hash[image_hash]))
+                    else:
+                        if image_hash is not None:
+                            first_with_hash[image_hash] = index
+                        futures.append((index, filename, image_url, image_hash, executor.submit(extract, file_path)))
+
+                for index, filename, image_url, image_hash, future in futures:
+                    try:
+                        extracted_data, usage = future.result()
+                        pending.append((index, filename, self._build_receipt(extracted_data, image_url, image_hash),
+                                        usage))
+                    except json.JSONDecodeError:
+                        results[index] = {"filename": filename, "status": "error",
+                                          "message": "Invalid JSON response from AI model"}
+                    except Exception as e:
+                        results[index] = {"filename": filename, "status": "error",
+                                          "message": f"Error processing receipt: {str(e)}"}
+                    if len(pending) >= commit_size:
+                        self._commit_receipts(pending, results)
+                        pending = []
+        finally:
+            self.client = client
+        self._commit_receipts(pending, results)
+        for index, filename, first in repeats:
+            results[index] = dict(results[first], filename=filename)
+            if results[index]["status"] == "success":
+                results[index]["duplicate"] = True
+                # The Vision call is counted against the first copy only
+                results[index].pop("usage", None)
+        return results
+
+    def _commit_receipts(self, pending, results):
+        """Insert a group of (index, filename, ReceiptDetail, usage) in one transaction and record the results"""
+        if not pending:
+            return
+        try:
+            db.session.add_all([receipt for _, _, receipt, _ in pending])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for index, filename, _, usage in pending:
+                results[index] = {"filename": filename, "status": "error",
+                                  "message": f"Error saving receipt: {str(e)}", "usage": usage}
+            return
+        for index, filename, receipt, usage in pending:
+            results[index] = {"filename": filename, "status": "success", "data": receipt.to_dict(), "usage": usage}
+
+    @staticmethod
+    def expand_uploads(files, max_member_size=20 * 1024 * 1024, max_files=500, max_total_size=256 * 1024 * 1024):
+        """Flatten uploaded files, replacing .zip archives by the images inside them
+
+        Returns (files, skipped) where skipped lists archive members larger than
+        `max_member_size`, which are not extracted. The limits are checked
+        against the archives' directories before anything is decompressed:
+        BatchTooLarge is raised if the batch would hold more than `max_files`
+        files or the accepted members add up to more than `max_total_size`
+        bytes (zipfile never inflates a member past its declared size). Members
+        are then decompressed a chunk at a time into temporary files, which the
+        caller should close.
+        """
+        plan, skipped, archives = [], [], []
+        total_size = 0
+        try:
+            for upload in files:
+                if not upload.filename.lower().endswith('.zip'):
+                    plan.append((upload, None, None))
+                    continue
+                archive = zipfile.ZipFile(upload.stream)
+                archives.append(archive)
+                entries = archive.infolist()
+                if len(entries) > max_files:
+                    raise BatchTooLarge(f"At most {max_files} receipts per batch")
+                members = []
+                for member in entries:
+                    name = os.path.basename(member.filename)
+                    # Skip folders and macOS resource forks
+                    if member.is_dir() or not name or name.startswith('.') or '__MACOSX' in member.filename:
+                        continue
+                    if member.file_size > max_member_size:
+                        skipped.append(name)
+                        continue
+                    members.append((member, name))
+                    total_size += member.file_size
+                plan.append((upload, archive, members))
+
+            if sum(1 if archive is None else len(members) for _, archive, members in plan) > max_files:
+                raise BatchTooLarge(f"At most {max_files} receipts per batch")
+            if total_size > max_total_size:
+                raise BatchTooLarge(f"Archives expand to more than {max_total_size} bytes")
+
+            expanded = []
+            for upload, archive, members in plan:
+                if archive is None:
+                    expanded.append(upload)
+                    continue
+                for member, name in members:
+                    spool = tempfile.TemporaryFile()
+                    with archive.open(member) as source:
+                        shutil.copyfileobj(source, spool, UPLOAD_CHUNK)
+                    spool.seek(0)
+                    expanded.append(FileStorage(stream=spool, filename=name,
+                                                content_type=mimetypes.guess_type(name)[0]))
+            return expanded, skipped
+        finally:
+            for archive in archives:
+                archive.close()
+
     # Add this method to your ReceiptExtraction class in services.py
     def _save_image(self, image_file):
-        """Save the image file and return the paths"""
-        filename = secure_filename(f"{uuid.uuid4()}_{image_file.filename}")
-        file_path = os.path.join(self.upload_folder, filename)
-        image_file.save(file_path)
+        """Save the image under the SHA-256 of its bytes and return the paths
+
+        Identical uploads map to the same file, so re-uploading a receipt costs
+        no extra disk space and can be recognised by its name. The upload is
+        copied to disk in chunks and hashed on the way, so it is never held in
+        memory whole.
+        """
+        extension = image_file.filename.rsplit('.', 1)[1].lower() if '.' in image_file.filename else 'jpg'
+        # Write to a temporary name first so a concurrent upload never sees half a file
+        temp_path = os.path.join(self.upload_folder, f"{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        try:
+            with open(temp_path, "wb") as f:
+                while chunk := image_file.stream.read(UPLOAD_CHUNK):
+                    digest.update(chunk)
+                    f.write(chunk)
+            filename = secure_filename(f"{digest.hexdigest()}.{extension}")
+            file_path = os.path.join(self.upload_folder, filename)
+            if os.path.exists(file_path):
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
         image_url = f"/static/image/receipts/{filename}"
         return file_path, image_url
 
+    @property
+    def extraction_version(self):
+        """Identifies the model and prompt an extraction was made with"""
+        return hashlib.sha256(f"{self.model}\n{RECEIPT_PROMPT}\n{RECEIPT_REQUEST}".encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def content_hash(file_path):
+        """SHA-256 of a file saved by _save_image (taken from its name); None for other files"""
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        return stem if CONTENT_HASH.fullmatch(stem) else None
+
+    def find_duplicate(self, image_hash):
+        """Existing receipt extracted from the same image with the current model and prompt
+
+        Prefers the user's own receipt; returns (receipt, same_user) or (None, False).
+        """
+        if image_hash is None:
+            return None, False
+        matches = ReceiptDetail.query.filter_by(image_hash=image_hash, extraction_version=self.extraction_version)
+        own = matches.filter_by(user_id=self.user_id).order_by(ReceiptDetail.id).first()
+        if own is not None:
+            return own, True
+        return matches.order_by(ReceiptDetail.id).first(), False
+
+    def _reuse_extraction(self, existing, same_user, image_url):
+        """Result for a duplicate upload: the user's own receipt, or a copy of another user's extraction"""
+        if same_user:
+            return {"status": "success", "data": existing.to_dict(), "duplicate": True}
+
+        receipt = self._build_receipt(existing.extracted_fields(), image_url, existing.image_hash)
+        db.session.add(receipt)
+        db.session.commit()
+        result = {"status": "success", "data": receipt.to_dict(), "duplicate": False}
+        if current_app.config.get('RECEIPT_FLAG_CROSS_USER_DUPLICATES', False):
+            current_app.logger.warning("Receipt image %s uploaded by user %s was already uploaded by user %s",
+                                       existing.image_hash, self.user_id, existing.user_id)
+            result["duplicate_across_users"] = True
+        return result
+
     # Add this method to your ReceiptExtraction class in services.py
     def _call_ai_model(self, file_path, base64_image):
-        """Call the AI model with the image"""
+        """Call the AI model with the image; returns the response text and its token usage
+
+        The usage is also added to self.usage, the total over this instance's calls.
+        """
         # Determine media type from file extension
         media_type = "image/jpeg"  # Default
         if file_path.lower().endswith('.png'):
@@ -502,57 +1026,22 @@ class ReceiptExtraction:
         elif file_path.lower().endswith('.jpg') or file_path.lower().endswith('.jpeg'):
             media_type = "image/jpeg"
             
-        # Create prompt for AI extraction
-        prompt = """
-        You are an expert receipt scanner. I'll provide you with an image of a receipt.
-        Extract and return ONLY the following information in valid JSON format:
-        
-        1. Date (in YYYY-MM-DD format)
-        2. Currency (3-character currency code like USD, CAD, EUR)
-        3. Vendor name (company/store name)
-        4. Receipt items (array of objects with item_name and item_cost as a number)
-        5. GST/tax amount (for the entire receipt, as a number) - This MUST be returned as "tax" in your JSON
-        6. Total amount (as a number)
-        
-        If any information is not visible or unclear, provide a reasonable default value.
-        If you can't determine the currency, use "USD".
-        If tax/GST is not visible, set it to 0.
-        
-        Your response MUST be in this exact format:
-        
-        {
-            "date": "YYYY-MM-DD",
-            "currency": "USD",
-            "vendor_name": "Store Name",
-            "receipt_items": [
-                {
-                    "item_name": "Item 1",
-                    "item_cost": 11.11
-                },
-                {
-                    "item_name": "Item 2",
-                    "item_cost": 22.22
-                }
-            ],
-            "tax": 12.34,
-            "total": 567.89
-        }
-        
-        Return ONLY the extracted JSON data without any explanation or additional text.
-        """
+        # The instructions are the same for every receipt: send them as a cached system prompt
+        system = cached_system(RECEIPT_PROMPT) if self.prompt_caching else RECEIPT_PROMPT
         
         # Call Claude Vision API
         response = self.client.messages.create(
             model=self.model,
             max_tokens=4000,
             temperature=0,
+            system=system,
             messages=[
                 {
                     "role": "user",
                     "content": [
                         {
                             "type": "text",
-                            "text": prompt
+                            "text": RECEIPT_REQUEST
                         },
                         {
                             "type": "image",
@@ -567,5 +1056,38 @@ class ReceiptExtraction:
             ]
         )
         
+        with self._usage_lock:
+            add_usage(self.usage, response)
+        
         # Extract content from the response
-        return response.content[0].text
\ No newline at end of file
+        return response.content[0].text, add_usage({}, response)
+
+def _retry_delay(error, attempt, base):
+    """Seconds to wait before retrying a failed API call, None if not retryable
+
+    Retries what the SDK's own retries cover: rate limits, overload, timeouts,
+    server errors and dropped connections.
+    """
+    status = getattr(error, "status_code", None)
+    if not (status in (408, 409, 429) or (status or 0) >= 500 or isinstance(error, anthropic.APIConnectionError)):
+        return None
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        # Exponential backoff with jitter so parallel callers don't retry in lockstep
+        return base * (2 ** attempt) * (0.5 + random.random())
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+def add_usage(totals, response):
+    """Add a response's token usage (including prompt-cache reads and writes) to `totals`"""
+    usage = getattr(response, "usage", None)
+    for field in USAGE_FIELDS:
+        totals[field] = totals.get(field, 0) + (getattr(usage, field, None) or 0)
+    return totals
+
+def cached_system(text):
+    """System prompt as a single text block marked for prompt caching"""
+    return [{"type": "text", "text": text, "cache_control": EPHEMERAL}]
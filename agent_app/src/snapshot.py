@@ -0,0 +1,198 @@
+import numpy as np
+from collections import defaultdict
+from datetime import date
+from itertools import repeat
+from flask import current_app, has_app_context
+from sqlalchemy import String, cast, select
+from .cache import LRUCache
+from .database import analytics_session
+from .ledger import ledger_fingerprint, on_ledger_change
+from .models import Transaction, InitialBalance, db, parse_date
+
+transactions = Transaction.__table__
+
+# Type codes double as signs: income adds to the balance, expenses subtract
+INCOME, EXPENSE, OTHER = 1, -1, 0
+TYPE_CODES = {"income": INCOME, "expense": EXPENSE}
+TYPE_NAMES = {INCOME: "income", EXPENSE: "expense"}
+# Day number of rows whose date couldn't be parsed (txn_date NULL); sorts before every real date
+NO_DATE = np.iinfo(np.int64).min
+EPOCH = date(1970, 1, 1)
+LOAD_CHUNK = 10_000
+
+
+def day_number(value):
+    """Days since 1970-01-01 for a date or YYYY-MM-DD string (the unit of datetime64[D]); None if unparseable"""
+    parsed = parse_date(value)
+    return (parsed - EPOCH).days if parsed is not None else None
+
+
+def _labels():
+    """value -> code mapping that gives an unseen value the next code (its size at insertion)"""
+    lookup = defaultdict()
+    lookup.default_factory = lookup.__len__
+    return lookup
+
+
+def _intern(values, lookup):
+    """Codes of `values` in a _labels() mapping, adding unseen values"""
+    return np.fromiter(map(lookup.__getitem__, values), dtype=np.int32, count=len(values))
+
+
+class LedgerSnapshot:
+    """Column arrays of one user's ledger, for the analysis tools
+
+    Rows are sorted by (date, id), undated rows first, so a date range is a
+    contiguous slice found with two binary searches. Per row the snapshot
+    holds the id, the day number, the amount, a type code (+1 income, -1
+    expense) and ids into the interned date-string and description labels,
+    about 30 bytes a row against well over 1 KB for an ORM object.
+    """
+
+    def __init__(self, user_id, initial_balance, ids, days, amounts, type_codes, date_ids, date_labels,
+                 description_ids, descriptions):
+        self.user_id = user_id
+        self.initial_balance = initial_balance
+        self.ids = ids
+        self.days = days
+        self.amounts = amounts
+        self.type_codes = type_codes
+        self.date_ids = date_ids
+        self.date_labels = date_labels
+        self.description_ids = description_ids
+        self.descriptions = descriptions
+        # First dated row; rows before it have no usable date
+        self.dated_from = int(np.searchsorted(days, NO_DATE, side="right"))
+
+    @classmethod
+    def load(cls, user_id, session=None):
+        """Read the ledger with one projected query, streamed a chunk at a time"""
+        session = session or db.session
+        initial = session.execute(
+            select(InitialBalance.balance).where(InitialBalance.user_id == user_id).limit(1)
+        ).scalar()
+        # txn_date as its ISO text, which NumPy parses to datetime64 in C (NULL becomes NaT)
+        statement = select(transactions.c.id, cast(transactions.c.txn_date, String), transactions.c.date,
+                           transactions.c.amount, transactions.c.type, transactions.c.description)\
+            .where(transactions.c.user_id == user_id)\
+            .order_by(transactions.c.txn_date.asc().nulls_first(), transactions.c.id.asc())
+
+        columns = {name: [] for name in ("ids", "days", "amounts", "type_codes", "date_ids", "description_ids")}
+        date_lookup, description_lookup = _labels(), _labels()
+        result = session.execute(statement, execution_options={"stream_results": True})
+        for chunk in result.partitions(LOAD_CHUNK):
+            ids, iso_dates, dates, amounts, types, descriptions = zip(*chunk)
+            columns["ids"].append(np.array(ids, dtype=np.int64))
+            columns["days"].append(np.array(iso_dates, dtype="datetime64[D]").view(np.int64))
+            columns["amounts"].append(np.array(amounts, dtype=np.float64))
+            columns["type_codes"].append(np.fromiter(map(TYPE_CODES.get, types, repeat(OTHER)), dtype=np.int8,
+                                                     count=len(types)))
+            columns["date_ids"].append(_intern(dates, date_lookup))
+            columns["description_ids"].append(_intern(descriptions, description_lookup))
+
+        dtypes = {"ids": np.int64, "days": np.int64, "amounts": np.float64, "type_codes": np.int8,
+                  "date_ids": np.int32, "description_ids": np.int32}
+        arrays = {name: np.concatenate(parts) if parts else np.empty(0, dtype=dtypes[name])
+                  for name, parts in columns.items()}
+        # NaT is the smallest int64, so undated rows already sit at the front
+        return cls(user_id, float(initial) if initial is not None else 0.0,
+                   date_labels=list(date_lookup), descriptions=list(description_lookup), **arrays)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        """Memory held by the column arrays"""
+        return sum(a.nbytes for a in (self.ids, self.days, self.amounts, self.type_codes, self.date_ids,
+                                      self.description_ids))
+
+    def window(self, start_date=None, end_date=None):
+        """slice of the rows dated inside the inclusive range (all rows if no bound is given)
+
+        Raises ValueError for a bound that isn't YYYY-MM-DD.
+        """
+        for bound, value in (("start_date", start_date), ("end_date", end_date)):
+            if value and day_number(value) is None:
+                raise ValueError(f"{bound} must be YYYY-MM-DD")
+        if not start_date and not end_date:
+            return slice(0, len(self))
+        start = np.searchsorted(self.days, day_number(start_date), side="left") if start_date else self.dated_from
+        stop = np.searchsorted(self.days, day_number(end_date), side="right") if end_date else len(self)
+        return slice(max(int(start), self.dated_from), int(stop))
+
+    def balance(self):
+        return self.initial_balance + float(np.dot(self.amounts, self.type_codes))
+
+    def totals_by_type(self, start_date=None, end_date=None):
+        """{"income": total, "expense": total} over a date range"""
+        rows = self.window(start_date, end_date)
+        amounts, codes = self.amounts[rows], self.type_codes[rows]
+        return {"income": float(amounts[codes == INCOME].sum()), "expense": float(amounts[codes == EXPENSE].sum())}
+
+    def rows(self, start_date=None, end_date=None):
+        """Rows in a date range as the dicts get_transactions returns
+
+        Without bounds the undated rows (txn_date NULL) are included, first and
+        labelled "undated": True, so consumers don't take their date strings
+        for ISO dates.
+        """
+        rows = self.window(start_date, end_date)
+        dates, descriptions = self.date_labels, self.descriptions
+        result = [{"id": row_id, "date": dates[date_id], "description": descriptions[description_id],
+                   "amount": amount, "type": TYPE_NAMES.get(code, "")}
+                  for row_id, date_id, description_id, amount, code in zip(
+                      self.ids[rows].tolist(), self.date_ids[rows].tolist(), self.description_ids[rows].tolist(),
+                      self.amounts[rows].tolist(), self.type_codes[rows].tolist())]
+        for row in result[:max(self.dated_from - rows.start, 0)]:
+            row["undated"] = True
+        return result
+
+    def dated(self):
+        """(datetime64[D] days, amounts, is_income, description ids) of the rows with a date"""
+        rows = slice(self.dated_from, len(self))
+        return (self.days[rows].view("datetime64[D]"), self.amounts[rows], self.type_codes[rows] == INCOME,
+                self.description_ids[rows])
+
+
+def ledger_snapshot(user_id):
+    """The user's snapshot, shared through the per-process cache when it is enabled
+
+    Entries are keyed by the ledger fingerprint, so a write (including bulk
+    inserts that bypass the ORM) makes the next call load a fresh snapshot.
+    Both are read through the analytics session, i.e. from the read replica
+    when one is configured.
+    """
+    session = analytics_session()
+    cache = snapshot_cache()
+    if cache is None:
+        return LedgerSnapshot.load(user_id, session)
+    key = (user_id, ledger_fingerprint(user_id, session))
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = LedgerSnapshot.load(user_id, session)
+        cache.set(key, snapshot)
+    return snapshot
+
+
+def snapshot_cache():
+    """The current app's snapshot cache, or None when disabled or outside an app"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('ledger_snapshots')
+
+
+def snapshot_cache_from_config(config):
+    """LRU of snapshots from LEDGER_SNAPSHOT_CACHE_SIZE (0 disables it) and LEDGER_SNAPSHOT_CACHE_TTL"""
+    size = config.get('LEDGER_SNAPSHOT_CACHE_SIZE', 16)
+    if not size:
+        return None
+    return LRUCache(max_size=size, ttl=config.get('LEDGER_SNAPSHOT_CACHE_TTL', 3600))
+
+
+@on_ledger_change
+def _drop_snapshots(user_ids):
+    # The fingerprint already keeps stale snapshots from being served; this frees their memory early
+    cache = snapshot_cache()
+    if cache is not None:
+        cache.invalidate(lambda key: key[0] in user_ids)
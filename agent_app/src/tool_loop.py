@@ -0,0 +1,123 @@
+import inspect
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, has_app_context
+from .serializer import estimate_tokens, serialize_tool_result
+
+
+class ToolMemo:
+    """Per-request memo of tool results keyed by tool name and bound arguments
+
+    Arguments are bound to the tool's signature with defaults applied, so
+    calculate_monthly_averages() and calculate_monthly_averages(months=3) share
+    one entry. Results a caller already has (e.g. the forecast snapshot) can be
+    seeded so the model asking for them again costs nothing.
+    """
+
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(name, tool_fn, arguments):
+        try:
+            bound = inspect.signature(tool_fn).bind(**arguments)
+            bound.apply_defaults()
+            arguments = bound.arguments
+        except TypeError:
+            # Let the call itself raise the argument error
+            pass
+        return name, json.dumps(arguments, sort_keys=True, default=str)
+
+    def seed(self, name, tool_fn, value, **arguments):
+        with self._lock:
+            self._results[self.key(name, tool_fn, arguments)] = value
+
+    def lookup(self, key):
+        """Return (found, value) and count the hit or miss"""
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                return True, self._results[key]
+            self.misses += 1
+            return False, None
+
+    def store(self, key, value):
+        with self._lock:
+            self._results[key] = value
+
+
+def run_tool_calls(tool_blocks, tools, memo, max_workers=4, token_budget=2000):
+    """Execute the tool_use blocks of one assistant turn concurrently
+
+    Identical calls within the turn run once, and calls already in `memo` don't
+    run at all. Results are encoded with serialize_tool_result under
+    `token_budget`. Returns (tool_result blocks in the original order, stats) where
+    stats has the calls, memo hits, estimated result tokens and the wall time in
+    milliseconds.
+    """
+    started = time.perf_counter()
+    app = current_app._get_current_object() if has_app_context() else None
+    results = {}
+    pending = {}
+    memo_hits = 0
+
+    for block in tool_blocks:
+        tool_fn = tools.get(block.name)
+        if tool_fn is None:
+            results[block.id] = (f"Error executing tool: unknown tool {block.name}", True)
+            continue
+        key = ToolMemo.key(block.name, tool_fn, block.input)
+        found, value = memo.lookup(key)
+        if found:
+            memo_hits += 1
+            results[block.id] = (value, False)
+        else:
+            pending.setdefault(key, (tool_fn, block.input, []))[2].append(block.id)
+
+    def execute(tool_fn, arguments):
+        # Tools read the database, so worker threads need their own app context
+        if app is None:
+            return tool_fn(**arguments)
+        with app.app_context():
+            return tool_fn(**arguments)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending)), thread_name_prefix="tool") as executor:
+            futures = {key: executor.submit(execute, fn, args) for key, (fn, args, _) in pending.items()}
+            for key, future in futures.items():
+                try:
+                    value, is_error = future.result(), False
+                    memo.store(key, value)
+                except Exception as e:
+                    value, is_error = f"Error executing tool: {str(e)}", True
+                for block_id in pending[key][2]:
+                    results[block_id] = (value, is_error)
+
+    tool_results = []
+    for block in tool_blocks:
+        value, is_error = results[block.id]
+        if not is_error:
+            # Memo hits are encoded here too, so a result that can't be encoded is an
+            # error for the model like a failed call, not the end of the loop
+            try:
+                value = serialize_tool_result(value, token_budget)
+            except Exception as e:
+                value, is_error = f"Error encoding tool result: {str(e)}", True
+        tool_result = {"type": "tool_result", "tool_use_id": block.id, "content": value}
+        if is_error:
+            tool_result["is_error"] = True
+        tool_results.append(tool_result)
+
+    stats = {
+        "tool_calls": [block.name for block in tool_blocks],
+        "executed": len(pending),
+        "memo_hits": memo_hits,
+        "result_tokens": sum(estimate_tokens(result["content"]) for result in tool_results),
+        "tool_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return tool_results, stats
@@ -0,0 +1,97 @@
+import functools
+import inspect
+import typing
+from collections.abc import Mapping
+
+# JSON Schema types for the annotations tools use
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+
+def tool(**descriptions):
+    """Register a method as an LLM tool
+
+    The schema is derived from the signature: parameter types come from the
+    type hints (or the default's type), parameters without a default are
+    required, the description is the docstring, and the keyword arguments
+    given here describe the parameters:
+
+        @tool(months="Number of months to analyze")
+        def calculate_monthly_averages(self, months: int = 3): ...
+    """
+    def register(fn):
+        fn.tool_parameters = descriptions
+        return fn
+    return register
+
+
+def tool_schema(fn, name=None, descriptions=None):
+    """Anthropic tool definition for `fn`"""
+    descriptions = descriptions or {}
+    hints = typing.get_type_hints(fn) if inspect.isroutine(fn) else {}
+    properties, required = {}, []
+    for parameter in inspect.signature(fn).parameters.values():
+        if parameter.name == "self" or parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+            continue
+        annotation = hints.get(parameter.name)
+        if annotation is None and parameter.default not in (parameter.empty, None):
+            annotation = type(parameter.default)
+        # Optional[X] is X for the model; an omitted argument takes the default
+        arguments = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if typing.get_origin(annotation) is typing.Union and len(arguments) == 1:
+            annotation = arguments[0]
+        prop = {"type": JSON_TYPES.get(annotation, "string")}
+        if parameter.name in descriptions:
+            prop["description"] = descriptions[parameter.name]
+        properties[parameter.name] = prop
+        if parameter.default is parameter.empty:
+            required.append(parameter.name)
+
+    name = name or fn.__name__
+    schema = {
+        "name": name,
+        "description": inspect.getdoc(fn) or f"Call the {name} function",
+        "input_schema": {"type": "object", "properties": properties},
+    }
+    if required:
+        schema["input_schema"]["required"] = required
+    return schema
+
+
+@functools.cache
+def tool_registry(cls):
+    """{name: schema} for the @tool methods of `cls` and its bases, built once per class"""
+    registry = {}
+    for klass in reversed(cls.__mro__):
+        for name, member in vars(klass).items():
+            if inspect.isfunction(member) and hasattr(member, "tool_parameters"):
+                registry[name] = tool_schema(member, name, member.tool_parameters)
+    return registry
+
+
+def tool_schemas(cls, tools):
+    """Schemas for a {name: callable} mapping, from the registry of `cls` where possible"""
+    registry = tool_registry(cls)
+    return [registry.get(name) or tool_schema(fn, name) for name, fn in tools.items()]
+
+
+class BoundTools(Mapping):
+    """Read-only {name: bound method} view of an instance's registered tools
+
+    Nothing is built per instance: membership and iteration use the class
+    registry and a lookup is one getattr.
+    """
+
+    def __init__(self, instance):
+        self._instance = instance
+        self._registry = tool_registry(type(instance))
+
+    def __getitem__(self, name):
+        if name not in self._registry:
+            raise KeyError(name)
+        return getattr(self._instance, name)
+
+    def __iter__(self):
+        return iter(self._registry)
+
+    def __len__(self):
+        return len(self._registry)
@@ -1,4 +1,7 @@
 document.addEventListener('DOMContentLoaded', function() {
+    // Fill in the dashboard KPI cards if on the dashboard
+    loadDashboardKpis();
+    
     // Initialize charts if elements exist
     initCharts();
     
@@ -15,6 +18,36 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+// Fetch the dashboard KPIs and fill in the cards
+async function loadDashboardKpis() {
+    const container = document.getElementById('dashboard-kpis');
+    if (!container) return;
+    
+    try {
+        const response = await fetch(container.dataset.kpiUrl);
+        const kpis = await response.json();
+        
+        container.querySelectorAll('[data-kpi]').forEach(element => {
+            const value = kpis[element.dataset.kpi];
+            element.textContent = element.dataset.format === 'percent'
+                ? `${value.toFixed(1)}%`
+                : value.toLocaleString('en-US', { style: 'currency', currency: 'USD' });
+        });
+        
+        container.querySelectorAll('[data-kpi-trend]').forEach(element => {
+            const change = kpis[element.dataset.kpiTrend];
+            const unit = element.dataset.trendUnit || '%';
+            // For expenses a decrease is the good direction
+            const good = 'trendInverse' in element.dataset ? change < 0 : change > 0;
+            element.textContent = `${change > 0 ? '+' : ''}${change.toFixed(1)}${unit === '%' ? '%' : ' ' + unit} from last month`;
+            element.classList.toggle('positive', good);
+            element.classList.toggle('negative', !good);
+        });
+    } catch (error) {
+        console.error('Could not load dashboard KPIs:', error);
+    }
+}
+
 // Initialize dashboard charts
 function initCharts() {
     // Revenue Overview Chart
@@ -251,12 +284,59 @@ function formatForecast(forecast) {
 }
 
 // Function to generate a forecast for a specific period
-async function generateForecast(days) {
+function generateForecast(days) {
     const loadingElement = document.getElementById(`loading-${days}`);
     const resultElement = document.getElementById(`forecast-result-${days}`);
     
     if (!loadingElement || !resultElement) return;
     
+    // Browsers without EventSource fall back to the blocking endpoint
+    if (!window.EventSource) {
+        return fetchForecast(days, loadingElement, resultElement);
+    }
+    
+    // Show loading indicator and a live view of the streamed text
+    loadingElement.classList.remove('d-none');
+    resultElement.innerHTML = `
+        <div class="small text-muted forecast-progress"></div>
+        <pre class="forecast-text forecast-stream"></pre>
+    `;
+    const progressElement = resultElement.querySelector('.forecast-progress');
+    const streamElement = resultElement.querySelector('.forecast-stream');
+    
+    const source = new EventSource(`/api/forecast/${days}/stream`);
+    const finish = (html) => {
+        // Close explicitly, otherwise EventSource reconnects when the server ends the stream
+        source.close();
+        loadingElement.classList.add('d-none');
+        resultElement.innerHTML = html;
+    };
+    
+    source.addEventListener('status', (e) => {
+        progressElement.textContent = JSON.parse(e.data).message;
+    });
+    source.addEventListener('text', (e) => {
+        streamElement.textContent += JSON.parse(e.data).delta;
+    });
+    source.addEventListener('tool_call', (e) => {
+        progressElement.textContent = `Running ${JSON.parse(e.data).name}...`;
+    });
+    source.addEventListener('tools', (e) => {
+        const data = JSON.parse(e.data);
+        progressElement.textContent = `Turn ${data.turn}: ran ${data.tool_calls.join(', ')} in ${data.tool_ms} ms`;
+    });
+    source.addEventListener('forecast', (e) => {
+        finish(formatForecast(JSON.parse(e.data).forecast));
+    });
+    source.addEventListener('error', (e) => {
+        // Server-sent error events carry data; connection failures don't
+        const message = e.data ? JSON.parse(e.data).error : 'Connection to the forecast stream was lost';
+        finish(`<div class="alert alert-danger">Error: ${message}</div>`);
+    });
+}
+
+// Blocking forecast request (used when streaming is unavailable)
+async function fetchForecast(days, loadingElement, resultElement) {
     // Show loading indicator
     loadingElement.classList.remove('d-none');
     resultElement.innerHTML = '';
@@ -495,11 +575,22 @@ function initReceiptExtractor() {
         })
         .then(response => response.json())
         .then(data => {
+            // Known images come back extracted right away
             if (data.status === 'success') {
-                displayExtractionResults(data.data);
-            } else {
+                return {status: 'done', data: data.data};
+            }
+            if (data.status !== 'queued') {
                 throw new Error(data.message || 'Error processing receipt');
             }
+            // Extraction runs in a background job; wait for it to finish
+            return waitForReceiptJob(data);
+        })
+        .then(job => {
+            if (job.status === 'done') {
+                displayExtractionResults(job.data);
+            } else {
+                throw new Error(job.error || 'Error processing receipt');
+            }
         })
         .catch(error => {
             document.getElementById('error-message').textContent = error.message;
@@ -507,6 +598,37 @@ function initReceiptExtractor() {
         });
     });
     
+    // Resolve with the finished job, via SSE when available and polling otherwise
+    function waitForReceiptJob(queued) {
+        return new Promise((resolve, reject) => {
+            const finished = job => job.status === 'done' || job.status === 'error';
+            
+            const poll = () => {
+                fetch(queued.status_url)
+                    .then(response => response.json())
+                    .then(job => finished(job) ? resolve(job) : setTimeout(poll, 1000))
+                    .catch(reject);
+            };
+            
+            if (!window.EventSource) {
+                return poll();
+            }
+            const source = new EventSource(queued.events_url);
+            source.addEventListener('job', (e) => {
+                const job = JSON.parse(e.data);
+                if (finished(job)) {
+                    source.close();
+                    resolve(job);
+                }
+            });
+            source.onerror = () => {
+                // Stream dropped (proxy timeout, server restart): fall back to polling
+                source.close();
+                poll();
+            };
+        });
+    }
+    
     // Display extraction results
     function displayExtractionResults(data) {
         try {
@@ -0,0 +1,70 @@
+"""Compare Python-loop aggregation with the SQL aggregation layer.
+
+Reports wall time and peak Python heap (tracemalloc) for computing the balance
+and monthly averages at several ledger sizes. The SQL path should stay flat as
+the row count grows; the ORM path grows linearly.
+"""
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from agent_app.src.aggregates import LedgerAggregates
+from agent_app.src.models import db, Transaction, InitialBalance
+from .common import make_app, seed_ledger
+
+SIZES = [10_000, 50_000, 200_000]
+
+
+def orm_loop(user_id):
+    """The previous implementation: hydrate every row and add up in Python"""
+    initial = InitialBalance.query.filter_by(user_id=user_id).first()
+    balance = initial.balance if initial else 0.0
+    for tx in Transaction.query.filter_by(user_id=user_id).all():
+        if tx.type == "income":
+            balance += tx.amount
+        elif tx.type == "expense":
+            balance -= tx.amount
+
+    start_date = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
+    income = expenses = 0.0
+    for tx in Transaction.query.filter_by(user_id=user_id).filter(Transaction.date >= start_date).all():
+        if tx.type == "income":
+            income += tx.amount
+        elif tx.type == "expense":
+            expenses += tx.amount
+    return balance, income, expenses
+
+
+def sql_aggregates(user_id):
+    """The aggregation layer: two SUM statements"""
+    start_date = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
+    aggregates = LedgerAggregates(user_id)
+    totals = aggregates.totals_by_type(start_date=start_date)
+    return aggregates.balance(), totals["income"], totals["expense"]
+
+
+def measure(fn, user_id):
+    db.session.expire_all()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn(user_id)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    print(f"{'rows':>8} | {'orm time':>9} {'orm peak':>10} | {'sql time':>9} {'sql peak':>10}")
+    for user_id, size in enumerate(SIZES, start=1):
+        app = make_app()
+        with app.app_context():
+            seed_ledger(user_id, size)
+            orm_result, orm_time, orm_peak = measure(orm_loop, user_id)
+            sql_result, sql_time, sql_peak = measure(sql_aggregates, user_id)
+            assert all(abs(a - b) < 0.01 for a, b in zip(orm_result, sql_result)), (orm_result, sql_result)
+            print(f"{size:>8} | {orm_time:>8.3f}s {orm_peak / 1024:>8.0f}KB | "
+                  f"{sql_time:>8.3f}s {sql_peak / 1024:>8.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Dashboard load test: requests per second and latency as the ledger grows.
+
+A wrk-style closed loop: CLIENTS threads each send GET /api/dashboard through
+the Flask test client back to back for DURATION seconds, against ledgers of
+increasing size. "uncached" sets DASHBOARD_CACHE_TTL to 0, so every request runs
+the grouped query; "cached" uses the default TTL. A write every WRITE_EVERY
+requests invalidates the cache, as a live ledger would. For reference, "legacy"
+runs the two full SUM queries the index page used to issue on every hit.
+"""
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+from agent_app.src.ledger import BalanceLedger
+from agent_app.src.models import db, Transaction
+from .common import make_app, seed_ledger
+
+SIZES = [1_000, 20_000, 200_000]
+CLIENTS = 4
+DURATION = 3.0
+WRITE_EVERY = 500
+
+
+def legacy_index(user_id):
+    total = db.session.query(db.func.sum(Transaction.amount))\
+        .filter(Transaction.user_id == user_id, Transaction.type == 'income').scalar() or 0.0
+    last_month = (datetime.now() - timedelta(days=30)).date()
+    previous = db.session.query(db.func.sum(Transaction.amount))\
+        .filter(Transaction.user_id == user_id, Transaction.type == 'income', Transaction.txn_date < last_month)\
+        .scalar() or 0.0
+    return total, previous
+
+
+def load(app, request):
+    """Run `request` from CLIENTS threads for DURATION seconds; returns (req/s, p50 ms, p99 ms)"""
+    latencies, lock = [], threading.Lock()
+    stop = time.monotonic() + DURATION
+
+    def client():
+        own = []
+        with app.app_context():
+            test_client = app.test_client()
+            while time.monotonic() < stop:
+                started = time.perf_counter()
+                request(test_client)
+                own.append((time.perf_counter() - started) * 1000)
+            db.session.remove()
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return (len(latencies) / DURATION, statistics.median(latencies),
+            latencies[int(len(latencies) * 0.99) - 1])
+
+
+def main():
+    print(f"{CLIENTS} clients x {DURATION:.0f}s per run, a ledger write every {WRITE_EVERY} requests")
+    print(f"{'rows':>8} {'mode':<9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for size in SIZES:
+        for mode, config in (("legacy", {}), ("uncached", {"DASHBOARD_CACHE_TTL": 0}), ("cached", {})):
+            app = make_app(**config)
+            with app.app_context():
+                seed_ledger(1, size)
+                # A live ledger has its balance snapshot; Core seeding skips the hooks
+                BalanceLedger(1).rebuild()
+                db.session.commit()
+            counter = [0]
+            counter_lock = threading.Lock()
+
+            def request(test_client):
+                with counter_lock:
+                    counter[0] += 1
+                    write = counter[0] % WRITE_EVERY == 0
+                if write:
+                    db.session.add(Transaction(user_id=1, date=datetime.now().strftime("%Y-%m-%d"),
+                                               description="Sale", amount=10.0, type="income"))
+                    db.session.commit()
+                if mode == "legacy":
+                    legacy_index(1)
+                else:
+                    test_client.get('/api/dashboard')
+
+            rps, p50, p99 = load(app, request)
+            print(f"{size:>8} {mode:<9} {rps:>8.0f} {p50:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
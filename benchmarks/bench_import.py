@@ -0,0 +1,88 @@
+"""Bulk import throughput and peak memory by file size.
+
+Each run imports a synthetic bank-export CSV into a fresh on-disk database in a
+separate process and reports rows/s and the process's peak RSS above one that
+only starts the app. Flat memory across sizes means the file is streamed. For
+reference, "orm" inserts the 10k-row file the way rows went in before: one ORM
+object per row, which fires the ledger hooks for every insert.
+"""
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from .common import synthetic_rows
+
+SIZES = [10_000, 100_000, 500_000]
+
+
+def write_csv(path, count):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Transaction Date", "Description", "Amount"])
+        for row in synthetic_rows(1, count):
+            month_first = f"{row['date'][5:7]}/{row['date'][8:10]}/{row['date'][:4]}"
+            writer.writerow([month_first, row["description"],
+                             f"{row['amount']:.2f}" if row["type"] == "income" else f"-{row['amount']:.2f}"])
+
+
+def run(mode, path):
+    from agent_app.src.importer import TransactionImporter, normalize_date
+    from agent_app.src.models import db, User, Transaction
+    from .common import make_app
+
+    app = make_app()
+    with app.app_context():
+        db.session.add(User(id=1, username="bench", password="x"))
+        db.session.commit()
+        if mode == "baseline":
+            return {}
+        if mode == "orm":
+            started = time.perf_counter()
+            with open(path, newline="") as f:
+                reader = csv.reader(f)
+                next(reader)
+                for date, description, amount in reader:
+                    amount = float(amount)
+                    db.session.add(Transaction(user_id=1, date=normalize_date(date), description=description,
+                                               amount=abs(amount), type="income" if amount >= 0 else "expense"))
+            db.session.commit()
+            seconds = time.perf_counter() - started
+            count = Transaction.query.count()
+            return {"rows": count, "rows_per_second": round(count / seconds)}
+        return TransactionImporter(1).import_file(path)
+
+
+def measure(mode, path):
+    output = subprocess.run([sys.executable, "-m", "benchmarks.bench_import", mode, path],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) == 3:
+        report = run(*sys.argv[1:])
+        # ru_maxrss is in kilobytes on Linux
+        report["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(json.dumps(report))
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        baseline = measure("baseline", os.devnull)["peak_rss_mb"]
+        print(f"{'rows':>8} {'mode':<7} {'file MB':>8} {'rows/s':>9} {'peak RSS over baseline (MB)':>28}")
+        for size in SIZES:
+            path = os.path.join(folder, f"export-{size}.csv")
+            write_csv(path, size)
+            file_mb = os.path.getsize(path) / (1024 * 1024)
+            for mode in (("orm", "import") if size == SIZES[0] else ("import",)):
+                report = measure(mode, path)
+                print(f"{size:>8} {mode:<7} {file_mb:>8.1f} {report['rows_per_second']:>9} "
+                      f"{report['peak_rss_mb'] - baseline:>28.1f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
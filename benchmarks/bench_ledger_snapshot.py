@@ -0,0 +1,85 @@
+"""The four analysis tools: separate ORM/SQL reads vs one columnar snapshot.
+
+One forecast's worth of tool calls (balance, monthly averages, recurring series
+and the last 90 days of transactions) is timed (best of 3) and then run once
+more under tracemalloc for its peak Python heap, at several ledger sizes:
+
+    previous   what the tools did before: an ORM query per get_transactions,
+               a column query for recurring detection and SQL aggregates
+    snapshot   one projected load into NumPy arrays, then slices (cold)
+    cached     the same with the snapshot already in the per-process cache
+"""
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from agent_app.src.aggregates import LedgerAggregates
+from agent_app.src.ledger import BalanceLedger
+from agent_app.src.models import db, Transaction
+from agent_app.src.recurring import detect_recurring
+from agent_app.src.services import FinancialAnalysis
+from agent_app.src.snapshot import LedgerSnapshot
+from .common import make_app, seed_ledger
+
+SIZES = [10_000, 50_000, 200_000]
+
+
+def previous_tools(user_id):
+    balance = BalanceLedger(user_id).balance()
+    start_date = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
+    totals = LedgerAggregates(user_id).totals_by_type(start_date=start_date)
+    rows = db.session.query(Transaction.date, Transaction.amount, Transaction.type, Transaction.description)\
+        .filter(Transaction.user_id == user_id, Transaction.txn_date.isnot(None)).all()
+    recurring = detect_recurring(*zip(*rows))
+    transactions = [{"id": t.id, "date": t.date, "description": t.description, "amount": t.amount, "type": t.type}
+                    for t in Transaction.query.filter_by(user_id=user_id)
+                    .filter(Transaction.txn_date >= datetime.now().date() - timedelta(days=90)).all()]
+    return balance, totals, recurring, len(transactions)
+
+
+def snapshot_tools(user_id):
+    service = FinancialAnalysis(user_id)
+    start_date = (datetime.now() - timedelta(days=90)).strftime("%Y-%m-%d")
+    return (service.get_balance(), service.calculate_monthly_averages(3), service.get_recurring_transactions(),
+            len(service.get_transactions(start_date)))
+
+
+def measure(fn, user_id):
+    best = float("inf")
+    for _ in range(3):
+        db.session.expire_all()
+        started = time.perf_counter()
+        fn(user_id)
+        best = min(best, time.perf_counter() - started)
+    # Tracing slows Python code down a lot, so memory is measured in a separate run
+    db.session.expire_all()
+    tracemalloc.start()
+    fn(user_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak / (1024 * 1024)
+
+
+def main():
+    print(f"{'rows':>8} {'mode':<9} {'ms':>9} {'peak MB':>9} {'snapshot MB':>12}")
+    for size in SIZES:
+        cold = make_app(LEDGER_SNAPSHOT_CACHE_SIZE=0)
+        with cold.app_context():
+            seed_ledger(1, size)
+            BalanceLedger(1).rebuild()
+            db.session.commit()
+            nbytes = LedgerSnapshot.load(1).nbytes / (1024 * 1024)
+            for mode, fn in (("previous", previous_tools), ("snapshot", snapshot_tools)):
+                elapsed, peak = measure(fn, 1)
+                print(f"{size:>8} {mode:<9} {elapsed:>9.1f} {peak:>9.1f} {nbytes if mode == 'snapshot' else 0:>12.1f}")
+        warm = make_app()
+        with warm.app_context():
+            seed_ledger(1, size)
+            BalanceLedger(1).rebuild()
+            db.session.commit()
+            FinancialAnalysis(1).ledger
+            elapsed, peak = measure(snapshot_tools, 1)
+            print(f"{size:>8} {'cached':<9} {elapsed:>9.1f} {peak:>9.1f} {nbytes:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
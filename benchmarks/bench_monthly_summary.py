@@ -0,0 +1,84 @@
+"""Monthly averages and trend: raw-row scans vs the MonthlySummary rollup.
+
+At several ledger sizes (spread over two years), times (best of 5):
+
+    scan       what had to run without the rollup: a GROUP BY month over every
+               transaction (LedgerAggregates.monthly_totals)
+    snapshot   the columnar snapshot load the averaging tool used before
+    rollup     MonthlyRollup.monthly_totals(): one statement over O(months) rows
+
+and the write-side cost the rollup adds: an ORM insert + commit, an amount edit
+(which recomputes that month's summary row) and a delete.
+"""
+import time
+from agent_app.src.aggregates import LedgerAggregates
+from agent_app.src.ledger import BalanceLedger
+from agent_app.src.models import db, Transaction
+from agent_app.src.rollup import MonthlyRollup, monthly_averages, monthly_trend
+from agent_app.src.snapshot import LedgerSnapshot
+from .common import make_app, seed_ledger
+
+SIZES = [10_000, 50_000, 200_000]
+WRITES = 200
+
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        db.session.expire_all()
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def per_write(fn):
+    started = time.perf_counter()
+    for i in range(WRITES):
+        fn(i)
+        db.session.commit()
+    return (time.perf_counter() - started) * 1000 / WRITES
+
+
+def main():
+    print(f"{'rows':>8} {'scan ms':>9} {'snapshot ms':>12} {'rollup ms':>10} {'months':>7} | "
+          f"{'insert ms':>10} {'edit ms':>8} {'delete ms':>10}")
+    for size in SIZES:
+        app = make_app(LEDGER_SNAPSHOT_CACHE_SIZE=0)
+        with app.app_context():
+            seed_ledger(1, size)
+            BalanceLedger(1).rebuild()
+            db.session.commit()
+
+            scan = best_of(lambda: LedgerAggregates(1).monthly_totals())
+            snapshot = best_of(lambda: LedgerSnapshot.load(1).totals_by_type())
+
+            def from_rollup():
+                history = MonthlyRollup(1).monthly_totals()
+                return monthly_averages(history, 3), monthly_trend(history, 12)
+            rollup = best_of(from_rollup)
+            months = len(MonthlyRollup(1).monthly_totals())
+
+            rows = []
+
+            def insert(i):
+                row = Transaction(user_id=1, date=f"2024-{i % 12 + 1:02d}-15", description="Bench write",
+                                  amount=10.0 + i, type="expense")
+                db.session.add(row)
+                rows.append(row)
+
+            def edit(i):
+                rows[i].amount += 1.0
+
+            def delete(i):
+                db.session.delete(rows[i])
+
+            inserted = per_write(insert)
+            edited = per_write(edit)
+            deleted = per_write(delete)
+        print(f"{size:>8} {scan:>9.1f} {snapshot:>12.1f} {rollup:>10.2f} {months:>7} | "
+              f"{inserted:>10.2f} {edited:>8.2f} {deleted:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Receipt throughput: one-at-a-time extraction vs the concurrent batch path.
+
+The Vision API is replaced by a fake client with a fixed latency that answers
+every tenth first attempt with a 429, so the numbers show the effect of
+concurrency, backoff and bulk commits rather than network noise.
+"""
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from werkzeug.datastructures import FileStorage
+from agent_app.src.models import db, User, ReceiptDetail
+from agent_app.src.services import ReceiptExtraction
+from .common import make_app
+
+RECEIPTS = 100
+LATENCY = 0.1
+SAMPLES = os.path.join("agent_app", "static", "image", "sample-receipts")
+
+RESPONSE = json.dumps({"date": "2024-03-01", "currency": "USD", "vendor_name": "Cafe",
+                       "receipt_items": [{"item_name": "Latte", "item_cost": 4.5}], "tax": 0.5, "total": 5.0})
+
+
+class RateLimited(Exception):
+    status_code = 429
+    response = None
+
+
+class FakeVisionClient:
+    """messages.create that sleeps LATENCY seconds and rate-limits every tenth new request"""
+
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.messages = SimpleNamespace(create=self.create)
+
+    def create(self, **kwargs):
+        with self.lock:
+            self.calls += 1
+            limited = self.calls % 10 == 0
+        time.sleep(LATENCY)
+        if limited:
+            raise RateLimited("rate limited")
+        return SimpleNamespace(content=[SimpleNamespace(text=RESPONSE)])
+
+
+def uploads():
+    images = sorted(name for name in os.listdir(SAMPLES) if not name.startswith("."))
+    for i in range(RECEIPTS):
+        name = images[i % len(images)]
+        with open(os.path.join(SAMPLES, name), "rb") as f:
+            yield FileStorage(stream=io.BytesIO(f.read()), filename=f"{i}_{name}")
+
+
+def service(upload_folder):
+    receipt_service = ReceiptExtraction(user_id=1)
+    receipt_service.client = FakeVisionClient()
+    receipt_service.upload_folder = upload_folder
+    return receipt_service
+
+
+def sequential(upload_folder):
+    """The single-file endpoint in a loop: one Vision call and one commit per receipt"""
+    receipt_service = service(upload_folder)
+    results = []
+    for upload in uploads():
+        result = receipt_service.extract_receipt_details(upload)
+        if result["status"] != "success":
+            # The single-file path has no backoff; retry once like a client would
+            upload.stream.seek(0)
+            result = receipt_service.extract_receipt_details(upload)
+        results.append(result)
+    return results
+
+
+def main():
+    app = make_app(RECEIPT_BATCH_BACKOFF=0.05)
+    with app.app_context():
+        db.session.add(User(id=1, username="bench", password="x"))
+        db.session.commit()
+        print(f"{RECEIPTS} receipts, {LATENCY * 1000:.0f} ms fake Vision latency, every 10th call rate-limited")
+        print(f"{'mode':<22} {'seconds':>8} {'receipts/s':>11} {'ok':>5}")
+
+        runs = [("sequential", sequential)] + [
+            (f"batch concurrency={n}", lambda folder, n=n: service(folder).extract_batch(list(uploads()), concurrency=n))
+            for n in (1, 4, 8, 16)
+        ]
+        baseline = None
+        for label, run in runs:
+            ReceiptDetail.query.delete()
+            db.session.commit()
+            with tempfile.TemporaryDirectory() as folder:
+                started = time.perf_counter()
+                results = run(folder)
+                elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            ok = sum(1 for r in results if r["status"] == "success")
+            print(f"{label:<22} {elapsed:>8.2f} {RECEIPTS / elapsed:>11.1f} {ok:>5}  ({baseline / elapsed:.1f}x)")
+        db.session.remove()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Concurrent read/write stress test of the SQLite engine settings.
+
+WRITERS threads add one transaction each through the ORM and commit (the
+ledger hooks also update the balance snapshot row, so every writer contends on
+it); READERS threads run the dashboard aggregate and a transactions page. Each
+mode runs for DURATION seconds on a file database seeded with SEED_ROWS rows:
+
+    default     driver defaults (rollback journal, synchronous=FULL, 5 s timeout)
+    tuned       WAL, synchronous=NORMAL, busy_timeout, mmap and cache pragmas
+    serialized  tuned, plus writers queued on an in-process lock
+
+"errors" counts operations that failed, e.g. with "database is locked".
+"""
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+from sqlalchemy.exc import OperationalError
+from agent_app.src.aggregates import LedgerAggregates
+from agent_app.src.ledger import BalanceLedger
+from agent_app.src.models import db, Transaction
+from agent_app.src.pagination import TransactionPages
+from .common import make_app, seed_ledger
+
+MODES = {
+    "default": {"SQLITE_TUNING": False},
+    "tuned": {},
+    "serialized": {"SQLITE_SERIALIZE_WRITES": True},
+}
+SEED_ROWS = 50_000
+WRITERS = 8
+READERS = 4
+DURATION = 5.0
+
+
+def write(_):
+    db.session.add(Transaction(user_id=1, date=date.today().isoformat(), description="Stress write",
+                               amount=1.0, type="income"))
+    db.session.commit()
+
+
+def read(_):
+    today = date.today()
+    LedgerAggregates(1).window_totals((today - timedelta(days=30)).isoformat(),
+                                      (today - timedelta(days=60)).isoformat())
+    TransactionPages(1).page(limit=50)
+
+
+def worker(app, operation, stop, results):
+    latencies, errors = [], 0
+    with app.app_context():
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            try:
+                operation(None)
+                latencies.append((time.perf_counter() - started) * 1000)
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+        db.session.remove()
+    results.append((latencies, errors))
+
+
+def run(config):
+    app = make_app(**config)
+    with app.app_context():
+        seed_ledger(1, SEED_ROWS)
+        BalanceLedger(1).rebuild()
+        db.session.commit()
+
+    stop = time.monotonic() + DURATION
+    writes, reads = [], []
+    threads = [threading.Thread(target=worker, args=(app, write, stop, writes)) for _ in range(WRITERS)]
+    threads += [threading.Thread(target=worker, args=(app, read, stop, reads)) for _ in range(READERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    def summary(results):
+        latencies = sorted(l for own, _ in results for l in own)
+        errors = sum(e for _, e in results)
+        if not latencies:
+            return 0.0, float("nan"), float("nan"), errors
+        return (len(latencies) / DURATION, statistics.median(latencies),
+                latencies[max(int(len(latencies) * 0.99) - 1, 0)], errors)
+
+    return summary(writes), summary(reads)
+
+
+def main():
+    print(f"{WRITERS} writers + {READERS} readers for {DURATION:.0f}s on {SEED_ROWS} rows")
+    print(f"{'mode':<11} {'writes/s':>9} {'w p50':>8} {'w p99':>9} {'w err':>6} | "
+          f"{'reads/s':>8} {'r p50':>8} {'r p99':>9} {'r err':>6}")
+    for mode, config in MODES.items():
+        (wps, wp50, wp99, werr), (rps, rp50, rp99, rerr) = run(config)
+        print(f"{mode:<11} {wps:>9.0f} {wp50:>8.1f} {wp99:>9.1f} {werr:>6} | "
+              f"{rps:>8.0f} {rp50:>8.1f} {rp99:>9.1f} {rerr:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Token cost of get_transactions results sent to the model.
+
+Seeds a synthetic ledger and compares the previous str(result) payload with the
+columnar encoding and with the budgeted serializer (which falls back to weekly
+or 30-day buckets) for several date ranges. Token counts use the same
+chars-per-token estimate the serializer budgets with.
+"""
+from datetime import date, timedelta
+from agent_app.src.models import db
+from agent_app.src.serializer import columnar_transactions, compact_json, estimate_tokens, serialize_tool_result
+from agent_app.src.services import FinancialAnalysis
+from .common import make_app, seed_ledger
+
+TRANSACTIONS = 3_000  # roughly four per day over the two synthetic years
+RANGES = [30, 90, 365]
+BUDGET = 2_000
+
+
+def main():
+    app = make_app()
+    with app.app_context():
+        seed_ledger(1, TRANSACTIONS)
+        service = FinancialAnalysis(user_id=1, api_key="bench")
+        print(f"{'range':>7} {'rows':>6} {'str()':>9} {'columnar':>9} {'budgeted':>9} {'saving':>7}  encoding")
+        for days in RANGES:
+            start = (date.today() - timedelta(days=days)).isoformat()
+            result = service.get_transactions(start_date=start)
+            before = estimate_tokens(str(result))
+            columnar = estimate_tokens(compact_json(columnar_transactions(result)))
+            payload = serialize_tool_result(result, token_budget=BUDGET)
+            after = estimate_tokens(payload)
+            encoding = payload.split('"format":"', 1)[1].split('"', 1)[0]
+            if encoding == "buckets":
+                encoding += " (" + payload.split('"bucket_days":', 1)[1].split(",", 1)[0] + "d)"
+            print(f"{days:>6}d {len(result):>6} {before:>9,} {columnar:>9,} {after:>9,} {before / after:>6.1f}x  {encoding}")
+        db.session.remove()
+
+
+if __name__ == "__main__":
+    main()
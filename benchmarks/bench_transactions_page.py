@@ -0,0 +1,60 @@
+"""Transactions page latency as the ledger grows.
+
+"legacy" is what /transactions used to do: load every row through the ORM and
+render all of them into the template. "first page" and "deep page" time
+GET /api/transactions for the newest page and for a page near the oldest rows
+(reached with a cursor, so no OFFSET); "filtered" adds a type filter and a
+description search.
+"""
+import time
+from flask import render_template
+from agent_app.src.models import db, Transaction
+from agent_app.src.pagination import encode_cursor
+from .common import make_app, seed_ledger
+
+SIZES = [1_000, 20_000, 200_000]
+REPEAT = 20
+
+
+def timed(fn, repeat=REPEAT):
+    """Best-of-`repeat` wall time of fn() in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def legacy_page():
+    rows = Transaction.query.filter_by(user_id=1)\
+        .order_by(Transaction.txn_date.desc(), Transaction.id.desc()).all()
+    with_template = render_template('transaction.html', page_size=50)
+    # The old template rendered one <tr> per row; approximate its size and cost
+    body = "".join(f"<tr><td>{t.date}</td><td>{t.description}</td><td>{t.amount}</td><td>{t.type}</td></tr>"
+                   for t in rows)
+    return len(with_template) + len(body)
+
+
+def main():
+    print(f"{'rows':>8} {'legacy ms':>10} {'legacy KB':>10} {'first ms':>9} {'deep ms':>8} {'filtered ms':>12}")
+    for size in SIZES:
+        app = make_app()
+        with app.app_context():
+            seed_ledger(1, size)
+            oldest = db.session.query(Transaction.txn_date, Transaction.id)\
+                .filter(Transaction.user_id == 1)\
+                .order_by(Transaction.txn_date.asc(), Transaction.id.asc()).offset(60).first()
+            deep_cursor = encode_cursor(oldest.txn_date, oldest.id)
+            client = app.test_client()
+            with app.test_request_context():
+                legacy_bytes = legacy_page()
+                legacy = timed(legacy_page, repeat=3)
+            first = timed(lambda: client.get('/api/transactions?limit=50'))
+            deep = timed(lambda: client.get(f'/api/transactions?limit=50&cursor={deep_cursor}'))
+            filtered = timed(lambda: client.get('/api/transactions?limit=50&type=expense&q=rent'))
+        print(f"{size:>8} {legacy:>10.1f} {legacy_bytes / 1024:>10.0f} {first:>9.2f} {deep:>8.2f} {filtered:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
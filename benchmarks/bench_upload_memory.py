@@ -0,0 +1,90 @@
+"""Peak memory of one receipt upload: whole-file reads vs the streaming path.
+
+Each mode runs in a fresh subprocess that saves a large phone-sized JPEG through
+ReceiptExtraction and encodes it for a (fake) Vision call; the number reported
+is that process's peak RSS above an identical process that only starts the app.
+
+    legacy      the previous code: read the upload to hash it, read the file
+                back whole, base64 it and decode the result (three full copies)
+    streaming   chunked save and chunked base64, preprocessing off
+    preprocess  chunked save, image decoded from disk and downscaled first
+"""
+import base64
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from unittest.mock import patch
+from werkzeug.datastructures import FileStorage
+
+RESPONSE = json.dumps({"date": "2024-03-01", "currency": "USD", "vendor_name": "Cafe",
+                       "receipt_items": [], "tax": 0.0, "total": 5.0})
+MODES = ("baseline", "legacy", "streaming", "preprocess")
+
+
+def make_photo(path):
+    """A noisy 4032x3024 quality-98 JPEG, roughly the size a phone uploads"""
+    from PIL import Image
+    Image.effect_noise((4032, 3024), 48).convert("RGB").save(path, "JPEG", quality=98)
+
+
+def legacy_upload(service, upload):
+    data = upload.read()
+    file_path = os.path.join(service.upload_folder, hashlib.sha256(data).hexdigest() + ".jpg")
+    with open(file_path, "wb") as f:
+        f.write(data)
+    with open(file_path, "rb") as f:
+        return service._call_ai_model(file_path, base64.b64encode(f.read()).decode("utf-8"))
+
+
+def run(mode, photo, upload_folder):
+    from agent_app.src.services import ReceiptExtraction
+    from .common import make_app
+
+    app = make_app(RECEIPT_PREPROCESS=mode == "preprocess")
+    with app.app_context():
+        service = ReceiptExtraction(user_id=1)
+        service.upload_folder = upload_folder
+        if mode == "baseline":
+            return
+        with open(photo, "rb") as stream, \
+                patch.object(service, "_call_ai_model", return_value=(RESPONSE, {})):
+            # Werkzeug hands large uploads over as a spooled temporary file, like this one
+            upload = FileStorage(stream=stream, filename="receipt.jpg")
+            if mode == "legacy":
+                legacy_upload(service, upload)
+            else:
+                file_path, _ = service._save_image(upload)
+                service._extract_data(file_path)
+
+
+def peak_rss_mb(mode, photo, upload_folder):
+    output = subprocess.run([sys.executable, "-m", "benchmarks.bench_upload_memory", mode, photo, upload_folder],
+                            check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) == 4:
+        run(*sys.argv[1:])
+        # ru_maxrss is in kilobytes on Linux
+        print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        photo = os.path.join(folder, "photo.jpg")
+        make_photo(photo)
+        size_mb = os.path.getsize(photo) / (1024 * 1024)
+        print(f"upload: 4032x3024 JPEG, {size_mb:.1f} MB")
+        print(f"{'mode':<12} {'peak RSS over baseline (MB)':>28} {'x upload size':>14}")
+        results = {mode: peak_rss_mb(mode, photo, folder) for mode in MODES}
+        for mode in MODES[1:]:
+            extra = results[mode] - results["baseline"]
+            print(f"{mode:<12} {extra:>28.1f} {extra / size_mb:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Shared helpers for the benchmark scripts.
+
+Run benchmarks from the repository root, e.g. ``python -m benchmarks.bench_aggregates``.
+"""
+import os
+import random
+import tempfile
+from datetime import date, timedelta
+from agent_app import create_app
+from agent_app.src.models import db, User, Transaction, InitialBalance
+
+DESCRIPTIONS = {
+    "income": ["Client payment", "Consulting invoice", "Product sale", "Subscription revenue"],
+    "expense": ["Office rent", "Payroll", "AWS", "NETFLIX", "Coffee beans", "Insurance", "Utilities"],
+}
+
+
+def make_app(**config):
+    """Create an app backed by a throwaway on-disk SQLite database"""
+    tmpdir = tempfile.mkdtemp(prefix="cashagent-bench-")
+    settings = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmpdir, 'bench.db'),
+    }
+    settings.update(config)
+    app = create_app(test_config=settings)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def synthetic_rows(user_id, count, days=730, seed=42):
+    """Yield transaction mappings spread over the last `days` days"""
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=days)
+    for _ in range(count):
+        tx_type = "income" if rng.random() < 0.4 else "expense"
+        yield {
+            "user_id": user_id,
+            "date": (start + timedelta(days=rng.randrange(days))).strftime("%Y-%m-%d"),
+            "description": f"{rng.choice(DESCRIPTIONS[tx_type])} {rng.randrange(1000)}",
+            "amount": round(rng.uniform(5, 5000), 2),
+            "type": tx_type,
+        }
+
+
+def seed_ledger(user_id, count, initial_balance=10000.0, batch_size=10000):
+    """Insert a user, an initial balance and `count` synthetic transactions"""
+    if db.session.get(User, user_id) is None:
+        db.session.add(User(id=user_id, username=f"bench{user_id}", password="x"))
+        db.session.add(InitialBalance(user_id=user_id, balance=initial_balance))
+        db.session.commit()
+
+    batch = []
+    for row in synthetic_rows(user_id, count):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(Transaction.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Transaction.__table__.insert(), batch)
+    db.session.commit()
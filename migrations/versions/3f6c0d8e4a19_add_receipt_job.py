@@ -0,0 +1,44 @@
+"""Add receipt job table
+
+Revision ID: 3f6c0d8e4a19
+Revises: b7d3a91c5e20
+Create Date: 2026-10-18 15:21:09.337410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6c0d8e4a19'
+down_revision = 'b7d3a91c5e20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('receipt_job',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('file_path', sa.String(length=255), nullable=False),
+    sa.Column('image_url', sa.String(length=255), nullable=False),
+    sa.Column('receipt_id', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['receipt_id'], ['receipt_detail.id'], name='fk_receipt_job_receipt'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_receipt_job_user'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('receipt_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_receipt_job_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('receipt_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_receipt_job_status'))
+
+    op.drop_table('receipt_job')
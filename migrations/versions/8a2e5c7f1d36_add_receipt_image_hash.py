@@ -0,0 +1,32 @@
+"""Add image hash and extraction version to receipts
+
+Revision ID: 8a2e5c7f1d36
+Revises: 3f6c0d8e4a19
+Create Date: 2026-10-18 16:02:51.774103
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a2e5c7f1d36'
+down_revision = '3f6c0d8e4a19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('receipt_detail', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('extraction_version', sa.String(length=16), nullable=True))
+        batch_op.create_index(batch_op.f('ix_receipt_detail_image_hash'), ['image_hash'], unique=False)
+    # Receipts stored before this revision keep their uuid-named images and no hash;
+    # they are simply never matched as duplicates.
+
+
+def downgrade():
+    with op.batch_alter_table('receipt_detail', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_receipt_detail_image_hash'))
+        batch_op.drop_column('extraction_version')
+        batch_op.drop_column('image_hash')
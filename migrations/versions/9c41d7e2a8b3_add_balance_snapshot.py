@@ -0,0 +1,37 @@
+"""Add balance snapshot
+
+Revision ID: 9c41d7e2a8b3
+Revises: 53f2414512f1
+Create Date: 2026-10-18 09:12:44.108215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c41d7e2a8b3'
+down_revision = '53f2414512f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('balance_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('initial_balance', sa.Float(), nullable=False),
+    sa.Column('balance', sa.Float(), nullable=False),
+    sa.Column('last_transaction_id', sa.Integer(), nullable=False),
+    sa.Column('last_transaction_date', sa.String(length=10), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_balance_snapshot_user'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id')
+    )
+    # Snapshots are created lazily on the first write; run `flask ledger reconcile`
+    # after upgrading to materialize them for existing ledgers.
+
+
+def downgrade():
+    op.drop_table('balance_snapshot')
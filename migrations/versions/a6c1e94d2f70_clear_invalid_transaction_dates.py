@@ -0,0 +1,34 @@
+"""Clear txn_date values the e5b8f2c17a04 backfill copied from impossible dates
+
+Revision ID: a6c1e94d2f70
+Revises: f2a7c4e91b38
+Create Date: 2026-10-18 22:14:08.317265
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c1e94d2f70'
+down_revision = 'f2a7c4e91b38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The backfill used to copy any NNNN-NN-NN string on SQLite, so databases
+    # upgraded before it parsed the dates may hold values like 2024-13-45 or
+    # 2024-02-30. date() rejects the first; '+0 days' rolls the second over to
+    # March, so neither comes back unchanged. Postgres' CAST never let them in
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "UPDATE \"transaction\" SET txn_date = NULL "
+        "WHERE txn_date IS NOT NULL AND date(txn_date, '+0 days') IS NOT txn_date"
+    )
+
+
+def downgrade():
+    # The cleared values were never valid dates
+    pass
@@ -0,0 +1,26 @@
+"""Add ledger version to balance snapshot
+
+Revision ID: b7d3a91c5e20
+Revises: e5b8f2c17a04
+Create Date: 2026-10-18 14:03:27.551902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d3a91c5e20'
+down_revision = 'e5b8f2c17a04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('balance_snapshot', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ledger_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('balance_snapshot', schema=None) as batch_op:
+        batch_op.drop_column('ledger_version')
@@ -0,0 +1,62 @@
+"""Add monthly summary rollup and (user_id, id) index on transactions
+
+Revision ID: d41f6b2c9e57
+Revises: 8a2e5c7f1d36
+Create Date: 2026-10-18 19:40:12.316842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f6b2c9e57'
+down_revision = '8a2e5c7f1d36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    monthly_summary = op.create_table('monthly_summary',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('year_month', sa.String(length=7), nullable=False),
+    sa.Column('type', sa.String(length=10), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('min_amount', sa.Float(), nullable=True),
+    sa.Column('max_amount', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_monthly_summary_user'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'year_month', 'type', name='uq_monthly_summary_user_month_type')
+    )
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_transaction_user_id', ['user_id', 'id'], unique=False)
+
+    # Backfill up to each balance snapshot's checkpoint, which is what the rollup covers;
+    # ledgers without a snapshot get both on their first write (or `flask ledger rebuild-summaries`)
+    transaction = sa.table('transaction', sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+                           sa.column('txn_date', sa.Date), sa.column('type', sa.String),
+                           sa.column('amount', sa.Float))
+    snapshot = sa.table('balance_snapshot', sa.column('user_id', sa.Integer),
+                        sa.column('last_transaction_id', sa.Integer))
+    year, month = sa.extract('year', transaction.c.txn_date), sa.extract('month', transaction.c.txn_date)
+    rows = op.get_bind().execute(
+        sa.select(transaction.c.user_id, year, month, transaction.c.type, sa.func.sum(transaction.c.amount),
+                  sa.func.count(transaction.c.id), sa.func.min(transaction.c.amount),
+                  sa.func.max(transaction.c.amount))
+        .select_from(transaction.join(snapshot, snapshot.c.user_id == transaction.c.user_id))
+        .where(transaction.c.id <= snapshot.c.last_transaction_id, transaction.c.txn_date.isnot(None))
+        .group_by(transaction.c.user_id, year, month, transaction.c.type)
+    )
+    op.bulk_insert(monthly_summary, [
+        {'user_id': user_id, 'year_month': f'{int(y):04d}-{int(m):02d}', 'type': tx_type, 'total': total,
+         'count': count, 'min_amount': low, 'max_amount': high}
+        for user_id, y, m, tx_type, total, count, low, high in rows
+    ])
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_user_id')
+    op.drop_table('monthly_summary')
@@ -0,0 +1,64 @@
+"""Index transaction dates and add typed txn_date column
+
+Revision ID: e5b8f2c17a04
+Revises: 9c41d7e2a8b3
+Create Date: 2026-10-18 10:03:27.551930
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b8f2c17a04'
+down_revision = '9c41d7e2a8b3'
+branch_labels = None
+depends_on = None
+
+
+BACKFILL_BATCH = 10000
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def upgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('txn_date', sa.Date(), nullable=True))
+
+    # Backfill from the YYYY-MM-DD string column, parsed the way the model's
+    # parse_date does; malformed or impossible dates (2024-13-45) stay NULL.
+    # A pattern check in SQL would let those through, and CAST would abort on them
+    transaction = sa.table('transaction', sa.column('id', sa.Integer), sa.column('date', sa.String),
+                           sa.column('txn_date', sa.Date))
+    update = transaction.update().where(transaction.c.id == sa.bindparam('row_id'))\
+        .values(txn_date=sa.bindparam('parsed'))
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.select(transaction.c.id, transaction.c.date)
+                            .where(transaction.c.id > last_id).order_by(transaction.c.id)
+                            .limit(BACKFILL_BATCH)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        values = [{'row_id': row_id, 'parsed': parsed} for row_id, value in rows
+                  if (parsed := _parse_date(value)) is not None]
+        if values:
+            bind.execute(update, values)
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_transaction_user_date', ['user_id', 'txn_date'], unique=False)
+        batch_op.create_index('ix_transaction_user_type_date', ['user_id', 'type', 'txn_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_user_type_date')
+        batch_op.drop_index('ix_transaction_user_date')
+        batch_op.drop_column('txn_date')
@@ -0,0 +1,33 @@
+"""Never reuse transaction ids on SQLite (AUTOINCREMENT)
+
+Revision ID: f2a7c4e91b38
+Revises: d41f6b2c9e57
+Create Date: 2026-10-18 21:05:37.504128
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a7c4e91b38'
+down_revision = 'd41f6b2c9e57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Other backends draw ids from a sequence, which never goes back
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('transaction', schema=None, recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('transaction', schema=None, recreate='always',
+                              table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+        pass
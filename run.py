@@ -18,4 +18,8 @@ else:
 from agent_app import app
 
 if __name__ == "__main__":
+    # Resume jobs left queued or running by the last run. With the reloader on,
+    # only its child process serves requests, so only it runs workers
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        app.extensions['receipt_jobs'].start()
     app.run(debug=True, port=5001)
\ No newline at end of file
@@ -0,0 +1,79 @@
+import unittest
+from datetime import datetime, timedelta
+from agent_app import create_app
+from agent_app.src.aggregates import LedgerAggregates
+from agent_app.src.services import FinancialAnalysis
+from agent_app.src.models import db, User, Transaction, InitialBalance
+
+class TestLedgerAggregates(unittest.TestCase):
+    """Test case for the SQL aggregation layer"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        db.session.add_all([User(id=1, username='alice', password='x'),
+                            User(id=2, username='bob', password='x')])
+        db.session.add(InitialBalance(user_id=1, balance=1000.0))
+
+        # Mid-month of the last complete month, inside the monthly averages' window
+        recent = (datetime.now().replace(day=1) - timedelta(days=1)).replace(day=15).strftime("%Y-%m-%d")
+        db.session.add_all([
+            Transaction(user_id=1, date='2020-01-15', description='Old sale', amount=500.0, type='income'),
+            Transaction(user_id=1, date='2020-01-20', description='Old rent', amount=200.0, type='expense'),
+            Transaction(user_id=1, date='2020-02-03', description='Old sale', amount=100.0, type='income'),
+            Transaction(user_id=1, date=recent, description='Sale', amount=300.0, type='income'),
+            Transaction(user_id=1, date=recent, description='Rent', amount=150.0, type='expense'),
+            # Another user's rows must never leak into the totals
+            Transaction(user_id=2, date=recent, description='Sale', amount=9999.0, type='income'),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_balance(self):
+        """Balance is initial + income - expenses for the user only"""
+        self.assertAlmostEqual(LedgerAggregates(1).balance(), 1000 + 500 - 200 + 100 + 300 - 150)
+        self.assertAlmostEqual(LedgerAggregates(2).balance(), 9999.0)
+        self.assertAlmostEqual(LedgerAggregates(3).balance(), 0.0)
+
+    def test_totals_by_type_with_range(self):
+        """Totals honour the inclusive date range"""
+        totals = LedgerAggregates(1).totals_by_type(start_date='2020-01-01', end_date='2020-01-31')
+        self.assertEqual(totals, {"income": 500.0, "expense": 200.0})
+
+    def test_malformed_bounds_rejected(self):
+        """A bound that isn't YYYY-MM-DD raises instead of matching nothing"""
+        with self.assertRaisesRegex(ValueError, "start_date must be YYYY-MM-DD"):
+            LedgerAggregates(1).totals_by_type(start_date='2020-01')
+        with self.assertRaisesRegex(ValueError, "end_date must be YYYY-MM-DD"):
+            LedgerAggregates(1).net_total(end_date='yesterday')
+
+    def test_monthly_totals(self):
+        """Rows are grouped by calendar month and type"""
+        months = LedgerAggregates(1).monthly_totals(end_date='2020-12-31')
+        self.assertEqual(months, [
+            {"month": "2020-01", "income": 500.0, "expense": 200.0, "count": 2},
+            {"month": "2020-02", "income": 100.0, "expense": 0.0, "count": 1},
+        ])
+
+    def test_financial_analysis_shapes_unchanged(self):
+        """The agent tools keep returning the same shapes"""
+        analysis = FinancialAnalysis(user_id=1)
+        self.assertAlmostEqual(analysis.get_balance(), 1550.0)
+
+        averages = analysis.calculate_monthly_averages(months=3)
+        self.assertEqual(set(averages), {"avg_monthly_income", "avg_monthly_expenses", "avg_monthly_net"})
+        self.assertAlmostEqual(averages["avg_monthly_income"], 100.0)
+        self.assertAlmostEqual(averages["avg_monthly_expenses"], 50.0)
+        self.assertAlmostEqual(averages["avg_monthly_net"], 50.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import json
+from datetime import date, timedelta
+from sqlalchemy import event
+from agent_app import create_app
+from agent_app.src.dashboard import dashboard_service
+from agent_app.src.models import db, User, Transaction, InitialBalance
+
+def days_ago(days):
+    return (date.today() - timedelta(days=days)).isoformat()
+
+class TestDashboard(unittest.TestCase):
+    """Test case for the cached dashboard KPI service"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(InitialBalance(user_id=1, balance=1000.0))
+        db.session.add_all([
+            Transaction(user_id=1, date=days_ago(5), description='Sale', amount=600.0, type='income'),
+            Transaction(user_id=1, date=days_ago(10), description='Rent', amount=150.0, type='expense'),
+            Transaction(user_id=1, date=days_ago(45), description='Sale', amount=400.0, type='income'),
+            Transaction(user_id=1, date=days_ago(40), description='Rent', amount=200.0, type='expense'),
+            Transaction(user_id=1, date=days_ago(200), description='Sale', amount=1000.0, type='income'),
+        ])
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def count_statements(self, fn):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            result = fn()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        return result, statements
+
+    def test_kpis(self):
+        """Totals, 30-day windows, changes against the previous window and the balance"""
+        kpis = json.loads(self.client.get('/api/dashboard').data)
+        self.assertEqual(kpis["total_revenue"], 2000.0)
+        self.assertEqual((kpis["revenue_30d"], kpis["expenses_30d"], kpis["net_30d"]), (600.0, 150.0, 450.0))
+        self.assertEqual(kpis["revenue_change"], 50.0)
+        self.assertEqual(kpis["expenses_change"], -25.0)
+        self.assertEqual(kpis["net_change"], 125.0)
+        self.assertEqual(kpis["profit_margin"], 75.0)
+        self.assertEqual(kpis["profit_margin_change"], 25.0)
+        self.assertEqual(kpis["percent_change"], 42.9)
+        self.assertEqual(kpis["balance"], 2650.0)
+
+    def test_revenue_and_expenses_come_from_one_grouped_query(self):
+        """The transaction table is aggregated by a single GROUP BY statement"""
+        _, statements = self.count_statements(lambda: dashboard_service().compute(1))
+        grouped = [s for s in statements if 'GROUP BY' in s]
+        self.assertEqual(len(grouped), 1)
+        self.assertEqual(sum('FROM "transaction"' in s or 'FROM transaction' in s for s in statements
+                             if s not in grouped), 1)  # the balance snapshot's delta scan
+
+    def test_cached_until_a_write_commits(self):
+        """Repeat reads hit the cache; a committed transaction drops the user's entry"""
+        first = dashboard_service().kpis(1)
+        second, statements = self.count_statements(lambda: dashboard_service().kpis(1))
+        self.assertIs(second, first)
+        self.assertEqual(statements, [])
+
+        db.session.add(Transaction(user_id=1, date=days_ago(1), description='Sale', amount=100.0, type='income'))
+        db.session.commit()
+        self.assertEqual(dashboard_service().kpis(1)["revenue_30d"], 700.0)
+
+    def test_index_renders_without_ledger_queries(self):
+        """The page itself no longer aggregates; it hydrates from the endpoint"""
+        response, statements = self.count_statements(lambda: self.client.get('/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'data-kpi-url="/api/dashboard"', response.data)
+        self.assertEqual(statements, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from agent_app import create_app
+from agent_app.src.database import on_connect, _connect_hooks
+from agent_app.src.models import db, User, Transaction
+
+class TestSQLiteTuning(unittest.TestCase):
+    """Test case for the SQLite connection pragmas, connect hooks and write serialization"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.folder = tempfile.mkdtemp()
+        self.contexts = []
+
+    def tearDown(self):
+        """Clean up after tests"""
+        for context in reversed(self.contexts):
+            db.session.remove()
+            db.drop_all()
+            context.pop()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def make_app(self, **config):
+        app = create_app(test_config=dict({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(self.folder, f'{len(self.contexts)}.db'),
+        }, **config))
+        context = app.app_context()
+        context.push()
+        self.contexts.append(context)
+        db.create_all()
+        return app
+
+    def pragma(self, name):
+        return db.session.connection().exec_driver_sql(f"PRAGMA {name}").scalar()
+
+    def test_pragmas_applied(self):
+        """New connections use WAL, synchronous=NORMAL, a busy timeout, mmap and a larger cache"""
+        self.make_app()
+        self.assertEqual(self.pragma("journal_mode"), "wal")
+        self.assertEqual(self.pragma("synchronous"), 1)
+        self.assertEqual(self.pragma("busy_timeout"), 5000)
+        self.assertEqual(self.pragma("mmap_size"), 256 * 1024 * 1024)
+        self.assertEqual(self.pragma("cache_size"), -16000)
+
+    def test_pragmas_configurable(self):
+        """SQLITE_PRAGMAS overrides or drops defaults; SQLITE_TUNING = False keeps the driver's"""
+        self.make_app(SQLITE_PRAGMAS={"busy_timeout": 250, "mmap_size": None})
+        self.assertEqual(self.pragma("busy_timeout"), 250)
+        self.assertEqual(self.pragma("mmap_size"), 0)
+        db.session.remove()
+
+        self.make_app(SQLITE_TUNING=False)
+        self.assertEqual(self.pragma("journal_mode"), "delete")
+
+    def test_connect_hooks(self):
+        """on_connect hooks run on every new connection with the dialect name"""
+        seen = []
+        hook = on_connect(lambda connection, dialect: seen.append(dialect))
+        try:
+            self.make_app()
+        finally:
+            _connect_hooks.remove(hook)
+        self.assertIn("sqlite", seen)
+
+    def test_writers_are_serialized(self):
+        """A write transaction holds the writer lock until it commits or rolls back; reads don't take it"""
+        app = self.make_app(SQLITE_SERIALIZE_WRITES=True)
+        lock = app.extensions['write_serializer']._lock
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.commit()
+
+        def lock_free():
+            """Whether another thread could take the writer lock right now"""
+            acquired = []
+
+            def try_lock():
+                acquired.append(lock.acquire(timeout=0.05))
+                if acquired[0]:
+                    lock.release()
+
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+            return acquired[0]
+
+        Transaction.query.all()
+        self.assertTrue(lock_free())
+
+        db.session.add(Transaction(user_id=1, date='2024-01-01', description='a', amount=1.0, type='income'))
+        db.session.flush()
+        self.assertFalse(lock_free())
+        db.session.commit()
+        self.assertTrue(lock_free())
+
+        db.session.add(Transaction(user_id=1, date='2024-01-02', description='b', amount=1.0, type='income'))
+        db.session.flush()
+        db.session.rollback()
+        self.assertTrue(lock_free())
+        self.assertEqual(Transaction.query.count(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+import json
+import os
+import tempfile
+import time
+from unittest.mock import patch
+from agent_app import create_app
+from agent_app.src.cache import LRUCache, ForecastCache
+from agent_app.src.ledger import ledger_fingerprint, notify_ledger_change
+from agent_app.src.services import CashFlowForecast
+from agent_app.src.models import db, User, Transaction, InitialBalance
+
+class TestLRUCache(unittest.TestCase):
+    """Test case for the in-process LRU tier"""
+
+    def test_evicts_least_recently_used(self):
+        """The oldest untouched entry goes first once the cache is full"""
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_entries_expire(self):
+        """Entries older than the TTL are misses"""
+        cache = LRUCache(max_size=2, ttl=0.05)
+        cache.set('a', 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class TestForecastCache(unittest.TestCase):
+    """Test case for forecast caching and ledger-driven invalidation"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(InitialBalance(user_id=1, balance=100.0))
+        db.session.add(Transaction(user_id=1, date='2024-01-01', description='Sale', amount=50.0, type='income'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_repeat_forecast_is_served_from_cache(self):
+        """The second identical request does not call the LLM again"""
+        with patch.object(CashFlowForecast, '_call_llm', return_value={"result": "Forecast"}) as mock_llm:
+            first = CashFlowForecast(user_id=1).forecast(days=30)
+            second = CashFlowForecast(user_id=1).forecast(days=30)
+
+        self.assertEqual(mock_llm.call_count, 1)
+        self.assertEqual(first, second)
+        stats = json.loads(self.client.get('/api/forecast/cache-stats').data)
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_ledger_writes_invalidate(self):
+        """Inserts, edits and initial balance changes all force a fresh forecast"""
+        with patch.object(CashFlowForecast, '_call_llm', return_value={"result": "Forecast"}) as mock_llm:
+            service = CashFlowForecast(user_id=1)
+            service.forecast(days=30)
+
+            tx = Transaction(user_id=1, date='2024-01-02', description='Rent', amount=20.0, type='expense')
+            db.session.add(tx)
+            db.session.commit()
+            service.forecast(days=30)
+
+            tx.amount = 25.0
+            db.session.commit()
+            service.forecast(days=30)
+
+            InitialBalance.query.filter_by(user_id=1).first().balance = 200.0
+            db.session.commit()
+            service.forecast(days=30)
+
+        self.assertEqual(mock_llm.call_count, 4)
+
+    def test_fingerprint_tracks_edits_and_bulk_inserts(self):
+        """Edits bump the ledger version; Core inserts change the id/count part"""
+        before = ledger_fingerprint(1)
+        tx = Transaction.query.first()
+        tx.amount = 60.0
+        db.session.commit()
+        after_edit = ledger_fingerprint(1)
+        self.assertNotEqual(before, after_edit)
+
+        db.session.execute(Transaction.__table__.insert(), [
+            {"user_id": 1, "date": "2024-02-01", "description": "bulk", "amount": 5.0, "type": "income"},
+        ])
+        db.session.commit()
+        self.assertNotEqual(after_edit, ledger_fingerprint(1))
+
+    def test_commit_notifies_and_rollback_does_not(self):
+        """Cached entries are dropped on commit only"""
+        cache = self.app.extensions['forecast_cache']
+        key = cache.key(1, 30, 'llm')
+        cache.set(key, {"forecast_text": "x"})
+
+        db.session.add(Transaction(user_id=1, date='2024-01-03', description='a', amount=1.0, type='income'))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(len(cache.memory), 1)
+
+        notify_ledger_change([1])
+        self.assertEqual(len(cache.memory), 0)
+
+    def test_errors_are_not_cached(self):
+        """A failed forecast is retried on the next request"""
+        with patch.object(CashFlowForecast, '_call_llm', return_value={"error": "boom"}) as mock_llm:
+            CashFlowForecast(user_id=1).forecast(days=30)
+            CashFlowForecast(user_id=1).forecast(days=30)
+        self.assertEqual(mock_llm.call_count, 2)
+
+    def test_persistent_tier_survives_restart(self):
+        """A new process (fresh memory tier) still finds the forecast in the SQLite store"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'cache.db')
+            key = (1, 30, 'llm', 'fp', '2024-01-01')
+            ForecastCache(path=path).set(key, {"forecast_text": "x"})
+
+            restarted = ForecastCache(path=path)
+            self.assertEqual(restarted.get(key), {"forecast_text": "x"})
+            self.assertEqual(restarted.stats()["persistent_hits"], 1)
+            restarted.invalidate_user(1)
+            self.assertIsNone(ForecastCache(path=path).get(key))
+
+    def test_cache_can_be_disabled(self):
+        """FORECAST_CACHE_SIZE = 0 turns caching off"""
+        app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                                      'FORECAST_CACHE_SIZE': 0})
+        self.assertNotIn('forecast_cache', app.extensions)
+
+if __name__ == '__main__':
+    unittest.main()
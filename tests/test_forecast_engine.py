@@ -0,0 +1,132 @@
+import unittest
+import json
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from agent_app import create_app
+from agent_app.src.forecast_engine import LocalForecastEngine, series_from_summaries
+from agent_app.src.services import CashFlowForecast
+from agent_app.src.models import db, User, Transaction, InitialBalance
+
+class TestLocalForecastEngine(unittest.TestCase):
+    """Test case for the deterministic forecasting engine"""
+
+    def test_projection_places_recurring_series(self):
+        """Recurring amounts land on their dates and the baseline fills the rest"""
+        engine = LocalForecastEngine(
+            balance=1000.0,
+            monthly_averages={"avg_monthly_income": 0.0, "avg_monthly_expenses": 0.0, "avg_monthly_net": 0.0},
+            recurring_series=[
+                {"description": "Rent", "type": "expense", "amount": 300.0, "period_days": 30, "next_date": "2024-01-05"},
+                {"description": "Salary", "type": "income", "amount": 100.0, "period_days": 7, "next_date": "2024-01-01"},
+            ],
+            start_date=date(2024, 1, 1)
+        )
+        result = engine.forecast(30)
+        daily = result["daily"]
+
+        self.assertEqual(len(daily), 30)
+        self.assertEqual(daily[0]["date"], "2024-01-01")
+        self.assertEqual(daily[4]["expenses"], 300.0)
+        self.assertEqual([row["date"] for row in daily if row["income"]],
+                         ["2024-01-01", "2024-01-08", "2024-01-15", "2024-01-22", "2024-01-29"])
+        self.assertEqual(result["summary"]["total_income"], 500.0)
+        self.assertEqual(result["summary"]["final_balance"], 1200.0)
+        self.assertEqual(result["summary"]["lowest_balance"], 800.0)
+        self.assertEqual(daily[-1]["balance"], 1200.0)
+
+    def test_baseline_excludes_recurring_share(self):
+        """Monthly averages already explained by recurring series are not double counted"""
+        engine = LocalForecastEngine(
+            balance=0.0,
+            monthly_averages={"avg_monthly_income": 0.0, "avg_monthly_expenses": 365.25 / 12 * 10, "avg_monthly_net": 0.0},
+            recurring_series=[],
+            start_date=date(2024, 1, 1)
+        )
+        self.assertAlmostEqual(engine.forecast(10)["summary"]["total_expenses"], 100.0)
+
+    def test_seasonality_scales_the_baseline(self):
+        """Seasonal multipliers scale each day's baseline by its calendar month"""
+        factors = [1.0] * 12
+        factors[1] = 2.0
+        engine = LocalForecastEngine(
+            balance=0.0,
+            monthly_averages={"avg_monthly_income": 365.25 / 12, "avg_monthly_expenses": 0.0, "avg_monthly_net": 0.0},
+            recurring_series=[],
+            start_date=date(2024, 1, 30),
+            seasonality={"income": factors}
+        )
+        daily = engine.forecast(4)["daily"]
+        self.assertEqual([row["income"] for row in daily], [1.0, 1.0, 2.0, 2.0])
+
+    def test_series_from_summaries(self):
+        """Active recurring summaries become projectable series"""
+        summaries = [
+            {"description": "rent", "type": "expense", "mean_amount": 1000.0, "period_days": 30,
+             "next_expected_date": "2024-03-31", "active": True},
+            {"description": "old gym", "type": "expense", "mean_amount": 40.0, "period_days": 30,
+             "next_expected_date": "2022-01-01", "active": False},
+        ]
+        self.assertEqual(series_from_summaries(summaries), [
+            {"description": "rent", "type": "expense", "amount": 1000.0, "period_days": 30, "next_date": "2024-03-31"}
+        ])
+
+
+class TestForecastModes(unittest.TestCase):
+    """Test case for the mode parameter of the forecast API"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(InitialBalance(user_id=1, balance=500.0))
+        today = datetime.now()
+        for months_ago in range(1, 4):
+            day = (today - timedelta(days=30 * months_ago)).strftime("%Y-%m-%d")
+            db.session.add(Transaction(user_id=1, date=day, description='Payroll', amount=2000.0, type='income'))
+            db.session.add(Transaction(user_id=1, date=day, description='Rent', amount=800.0, type='expense'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_local_mode_skips_llm(self):
+        """mode=local answers without touching the LLM and includes the daily series"""
+        with patch.object(CashFlowForecast, '_call_llm') as mock_llm:
+            response = self.client.get('/api/forecast/30?mode=local')
+            mock_llm.assert_not_called()
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertIn("deterministic projection", data["forecast_text"])
+        self.assertEqual(data["metadata"]["mode"], "local")
+        self.assertEqual(data["metadata"]["forecast_days"], 30)
+        self.assertAlmostEqual(data["metadata"]["current_balance"], 4100.0)
+        self.assertEqual(len(data["daily"]), 30)
+        self.assertEqual(set(data["daily"][0]), {"date", "income", "expenses", "net", "balance"})
+
+    def test_hybrid_mode_uses_llm_for_narrative_only(self):
+        """mode=hybrid keeps the computed numbers and takes only the text from the LLM"""
+        with patch.object(CashFlowForecast, '_call_llm', return_value={"result": "Narrative"}) as mock_llm:
+            data = CashFlowForecast(user_id=1).forecast(days=90, mode="hybrid")
+
+        self.assertEqual(data["forecast_text"], "Narrative")
+        self.assertEqual(len(data["daily"]), 90)
+        self.assertNotIn("tools", mock_llm.call_args.kwargs)
+        self.assertIn("Do not recompute", mock_llm.call_args.kwargs["system"])
+        self.assertIn("Final Projected Balance", mock_llm.call_args.args[0])
+
+    def test_invalid_mode(self):
+        """Unknown modes are rejected"""
+        response = self.client.get('/api/forecast/30?mode=magic')
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import time
+from unittest.mock import patch
+from agent_app import create_app
+from agent_app.src.services import CashFlowForecast
+from agent_app.src.models import db, User, Transaction, InitialBalance
+
+def slow_llm(delays):
+    """Fake _call_llm that sleeps according to the horizon named in the prompt"""
+    def call(self, prompt, max_tokens=4000, tools=None, timeout=None, **kwargs):
+        for days, delay in delays.items():
+            if f"next {days} days" in prompt:
+                time.sleep(delay)
+                return {"result": f"forecast {days}"}
+        return {"result": "forecast"}
+    return call
+
+class TestForecastPeriods(unittest.TestCase):
+    """Test case for concurrent multi-horizon forecasting"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(InitialBalance(user_id=1, balance=250.0))
+        db.session.add(Transaction(user_id=1, date='2024-01-01', description='Sale', amount=50.0, type='income'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_horizons_share_one_snapshot(self):
+        """Balance, averages and recurring series are computed once for all horizons"""
+        service = CashFlowForecast(user_id=1)
+        with patch.object(CashFlowForecast, 'get_recurring_transactions', return_value=[]) as recurring, \
+                patch.object(CashFlowForecast, 'get_balance', return_value=300.0) as balance:
+            results = service.forecast_periods(mode="local")
+
+        self.assertEqual(recurring.call_count, 1)
+        self.assertEqual(balance.call_count, 1)
+        self.assertEqual({key: len(r["daily"]) for key, r in results.items()}, {"30d": 30, "90d": 90, "180d": 180})
+        self.assertEqual(results["90d"]["metadata"]["current_balance"], 300.0)
+
+    def test_horizons_run_concurrently(self):
+        """Total latency is close to the slowest horizon, not the sum"""
+        with patch.object(CashFlowForecast, '_call_llm', slow_llm({30: 0.3, 90: 0.3, 180: 0.3})):
+            started = time.monotonic()
+            results = CashFlowForecast(user_id=1).forecast_periods(timeout=5)
+            elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 0.8)
+        self.assertEqual(results["180d"]["forecast_text"], "forecast 180")
+
+    def test_slow_horizon_times_out_alone(self):
+        """A horizon that exceeds its timeout becomes an error; the others still return"""
+        with patch.object(CashFlowForecast, '_call_llm', slow_llm({30: 0.0, 90: 0.0, 180: 2.0})):
+            started = time.monotonic()
+            results = CashFlowForecast(user_id=1).forecast_periods(timeout=0.5)
+            elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(results["30d"]["forecast_text"], "forecast 30")
+        self.assertEqual(results["90d"]["forecast_text"], "forecast 90")
+        self.assertIn("timed out", results["180d"]["error"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import json
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+from agent_app import create_app
+from agent_app.src.models import db, User, Transaction, InitialBalance
+
+class FakeStream:
+    """Context manager mimicking client.messages.stream(...)"""
+
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        for block in self.content:
+            if block.type == "text":
+                # Deliver the text in two deltas like the real stream would
+                half = len(block.text) // 2
+                yield SimpleNamespace(type="text", text=block.text[:half])
+                yield SimpleNamespace(type="text", text=block.text[half:])
+            else:
+                yield SimpleNamespace(type="content_block_start", content_block=block)
+
+    def get_final_message(self):
+        stop_reason = "tool_use" if any(block.type == "tool_use" for block in self.content) else "end_turn"
+        return SimpleNamespace(content=self.content, stop_reason=stop_reason)
+
+class FakeStreamingClient:
+    """Stand-in for anthropic.Anthropic that only supports streaming"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.messages = SimpleNamespace(stream=lambda **kwargs: FakeStream(self.responses.pop(0)))
+
+def parse_sse(body):
+    """Split an SSE body into (event, data) pairs"""
+    events = []
+    for chunk in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in chunk.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+class TestForecastStream(unittest.TestCase):
+    """Test case for the streaming forecast endpoint"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.client = self.app.test_client()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(InitialBalance(user_id=1, balance=100.0))
+        db.session.add(Transaction(user_id=1, date='2024-01-01', description='Sale', amount=50.0, type='income'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def stream(self, url, responses):
+        fake = FakeStreamingClient(responses)
+        with patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test"}), \
+                patch('agent_app.src.llm.anthropic.Anthropic', return_value=fake):
+            response = self.client.get(url)
+            body = response.get_data(as_text=True)
+        return response, parse_sse(body)
+
+    def test_streams_text_and_tool_progress(self):
+        """Status comes first, then deltas and tool progress, then the full forecast"""
+        response, events = self.stream('/api/forecast/30/stream', [
+            [SimpleNamespace(type="tool_use", id="a", name="get_transactions", input={})],
+            [SimpleNamespace(type="text", text="Balance stays positive")],
+        ])
+
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        names = [name for name, _ in events]
+        self.assertEqual(names, ["status", "tool_call", "tools", "text", "text", "forecast"])
+        self.assertEqual(events[2][1]["tool_calls"], ["get_transactions"])
+        self.assertEqual("".join(data["delta"] for name, data in events if name == "text"), "Balance stays positive")
+        forecast = events[-1][1]["forecast"]
+        self.assertEqual(forecast["forecast_text"], "Balance stays positive")
+        self.assertEqual(forecast["metadata"]["current_balance"], 150.0)
+
+    def test_local_mode_streams_without_llm(self):
+        """mode=local sends the deterministic forecast as a single forecast event"""
+        response, events = self.stream('/api/forecast/90/stream?mode=local', [])
+        self.assertEqual([name for name, _ in events], ["status", "forecast"])
+        self.assertEqual(len(events[-1][1]["forecast"]["daily"]), 90)
+
+    def test_errors_become_error_events(self):
+        """A failing model call ends the stream with an error event"""
+        with patch.dict(os.environ, {"ANTHROPIC_API_KEY": ""}):
+            body = self.client.get('/api/forecast/30/stream').get_data(as_text=True)
+        events = parse_sse(body)
+        self.assertEqual(events[-1], ("error", {"error": "API key not configured"}))
+
+    def test_non_streaming_endpoint_unchanged(self):
+        """The blocking endpoint still returns plain JSON"""
+        response = self.client.get('/api/forecast/30?mode=local')
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertIn("forecast_text", json.loads(response.data))
+
+    def test_invalid_parameters(self):
+        """Bad horizons and modes are rejected before streaming starts"""
+        self.assertEqual(self.client.get('/api/forecast/45/stream').status_code, 400)
+        self.assertEqual(self.client.get('/api/forecast/30/stream?mode=magic').status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+from agent_app import create_app
+from agent_app.src.ledger import BalanceLedger, reconcile_balances
+from agent_app.src.commands import ledger_cli
+from agent_app.src.models import db, User, Transaction, InitialBalance, BalanceSnapshot
+
+class TestBalanceLedger(unittest.TestCase):
+    """Test case for the materialized balance snapshot"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(InitialBalance(user_id=1, balance=100.0))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add(self, amount, tx_type, date='2024-01-01'):
+        tx = Transaction(user_id=1, date=date, description='tx', amount=amount, type=tx_type)
+        db.session.add(tx)
+        db.session.commit()
+        return tx
+
+    def snapshot(self):
+        return BalanceSnapshot.query.filter_by(user_id=1).first()
+
+    def test_insert_updates_snapshot_incrementally(self):
+        """Each ORM insert moves the balance and the checkpoint"""
+        self.add(50.0, 'income')
+        last = self.add(20.0, 'expense', date='2024-02-01')
+
+        snapshot = self.snapshot()
+        self.assertAlmostEqual(snapshot.balance, 130.0)
+        self.assertEqual(snapshot.last_transaction_id, last.id)
+        self.assertEqual(snapshot.last_transaction_date, '2024-02-01')
+        self.assertAlmostEqual(BalanceLedger(1).balance(), 130.0)
+
+    def test_edit_and_delete(self):
+        """Edits and deletes below the checkpoint adjust the snapshot"""
+        income = self.add(50.0, 'income')
+        expense = self.add(20.0, 'expense')
+
+        income.amount = 80.0
+        db.session.commit()
+        self.assertAlmostEqual(BalanceLedger(1).balance(), 160.0)
+
+        expense.type = 'income'
+        db.session.commit()
+        self.assertAlmostEqual(BalanceLedger(1).balance(), 200.0)
+
+        db.session.delete(income)
+        db.session.commit()
+        self.assertAlmostEqual(BalanceLedger(1).balance(), 120.0)
+        self.assertAlmostEqual(self.snapshot().balance, 120.0)
+
+    def test_initial_balance_change(self):
+        """Changing the initial balance shifts the snapshot"""
+        self.add(50.0, 'income')
+        initial = InitialBalance.query.filter_by(user_id=1).first()
+        initial.balance = 1000.0
+        db.session.commit()
+        self.assertAlmostEqual(BalanceLedger(1).balance(), 1050.0)
+
+    def test_bulk_insert_covered_by_delta_scan(self):
+        """Core inserts bypass the hooks but are read through the delta scan"""
+        self.add(50.0, 'income')
+        db.session.execute(Transaction.__table__.insert(), [
+            {"user_id": 1, "date": "2024-03-01", "description": "bulk", "amount": 5.0, "type": "expense"},
+            {"user_id": 1, "date": "2024-03-02", "description": "bulk", "amount": 7.0, "type": "income"},
+        ])
+        db.session.commit()
+        self.assertAlmostEqual(self.snapshot().balance, 150.0)
+        self.assertAlmostEqual(BalanceLedger(1).balance(), 152.0)
+
+        BalanceLedger(1).checkpoint()
+        db.session.commit()
+        self.assertAlmostEqual(self.snapshot().balance, 152.0)
+        self.assertEqual(self.snapshot().last_transaction_date, '2024-03-02')
+
+    def test_orm_insert_after_bulk_insert(self):
+        """An ORM insert folds earlier un-checkpointed bulk rows in instead of skipping past them"""
+        self.add(10.0, 'income')
+        db.session.execute(Transaction.__table__.insert(), [
+            {"user_id": 1, "date": "2024-03-01", "description": "bulk", "amount": 100.0, "type": "income"},
+        ])
+        db.session.commit()
+        last = self.add(1.0, 'income', date='2024-02-01')
+
+        self.assertAlmostEqual(BalanceLedger(1).balance(), 211.0)
+        self.assertEqual(self.snapshot().last_transaction_id, last.id)
+        self.assertEqual(self.snapshot().last_transaction_date, '2024-03-01')
+        self.assertEqual(reconcile_balances(fix=False)[0]["status"], "ok")
+
+    def test_insert_after_deleting_newest(self):
+        """The id of a deleted newest row isn't handed out again, so the next insert passes the checkpoint"""
+        self.add(10.0, 'income')
+        newest = self.add(20.0, 'income')
+        checkpoint = newest.id
+        db.session.delete(newest)
+        db.session.commit()
+        added = self.add(500.0, 'income')
+
+        self.assertGreater(added.id, checkpoint)
+        self.assertAlmostEqual(BalanceLedger(1).balance(), 610.0)
+        self.assertEqual(self.snapshot().last_transaction_id, added.id)
+        self.assertEqual(reconcile_balances(fix=False)[0]["status"], "ok")
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        """Reconciliation rebuilds the snapshot and reports the drift"""
+        self.add(50.0, 'income')
+        db.session.query(BalanceSnapshot).update({"balance": 999.0})
+        db.session.commit()
+
+        reports = reconcile_balances()
+        db.session.commit()
+        self.assertEqual(len(reports), 1)
+        self.assertEqual(reports[0]["status"], "drift")
+        self.assertAlmostEqual(reports[0]["drift"], 849.0)
+        self.assertAlmostEqual(self.snapshot().balance, 150.0)
+
+        self.assertEqual(reconcile_balances()[0]["status"], "ok")
+
+    def test_reconcile_command(self):
+        """The CLI command rebuilds missing snapshots"""
+        db.session.execute(Transaction.__table__.insert(), [
+            {"user_id": 1, "date": "2024-03-01", "description": "bulk", "amount": 5.0, "type": "income"},
+        ])
+        db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(ledger_cli, ['reconcile'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('no snapshot', result.output)
+        self.assertAlmostEqual(self.snapshot().balance, 105.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import json
+from datetime import date, timedelta
+from sqlalchemy import event
+from agent_app import create_app
+from agent_app.src.aggregates import LedgerAggregates
+from agent_app.src.ledger import BalanceLedger
+from agent_app.src.recurring import detect_recurring
+from agent_app.src.serializer import serialize_tool_result
+from agent_app.src.services import FinancialAnalysis
+from agent_app.src.snapshot import LedgerSnapshot, snapshot_cache
+from agent_app.src.models import db, User, Transaction, InitialBalance
+
+def days_ago(days):
+    return (date.today() - timedelta(days=days)).isoformat()
+
+class TestLedgerSnapshot(unittest.TestCase):
+    """Test case for the columnar ledger snapshot behind the analysis tools"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(User(id=2, username='bob', password='x'))
+        db.session.add(InitialBalance(user_id=1, balance=500.0))
+        rows = []
+        for month in range(6):
+            rows.append(Transaction(user_id=1, date=days_ago(30 * month + 1), description=f'Rent #{month}',
+                                    amount=1200.0, type='expense'))
+            rows.append(Transaction(user_id=1, date=days_ago(30 * month + 3), description='Client payment',
+                                    amount=3000.0 + month, type='income'))
+            rows.append(Transaction(user_id=1, date=days_ago(30 * month + 3), description='Coffee',
+                                    amount=4.5, type='expense'))
+        rows.append(Transaction(user_id=1, date='yesterday', description='Undated', amount=7.0, type='expense'))
+        rows.append(Transaction(user_id=2, date=days_ago(2), description='Other user', amount=99.0, type='income'))
+        db.session.add_all(rows)
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_matches_the_database(self):
+        """Balance, range totals, rows and recurring series agree with the SQL paths"""
+        snapshot = LedgerSnapshot.load(1)
+        self.assertEqual(len(snapshot), 19)
+        self.assertAlmostEqual(snapshot.balance(), BalanceLedger(1).balance())
+        for start, end in ((None, None), (days_ago(90), None), (None, days_ago(60)), (days_ago(91), days_ago(31))):
+            self.assertEqual(snapshot.totals_by_type(start, end), LedgerAggregates(1).totals_by_type(start, end))
+
+        expected = [{"id": t.id, "date": t.date, "description": t.description, "amount": t.amount, "type": t.type,
+                     **({"undated": True} if t.txn_date is None else {})}
+                    for t in Transaction.query.filter_by(user_id=1)
+                    .order_by(Transaction.txn_date.is_not(None), Transaction.txn_date, Transaction.id)]
+        self.assertEqual(snapshot.rows(), expected)
+        self.assertEqual(expected[0]["description"], "Undated")
+        # The tool result for an unbounded range serializes with the undated row kept apart
+        payload = json.loads(serialize_tool_result(snapshot.rows()))
+        self.assertEqual((payload["count"], payload["undated"]["date"]), (18, ["yesterday"]))
+        self.assertEqual(snapshot.rows(days_ago(33), days_ago(31)), [row for row in expected if row["date"] in
+                                                                    (days_ago(33), days_ago(31))])
+        with self.assertRaisesRegex(ValueError, "start_date must be YYYY-MM-DD"):
+            snapshot.rows("not a date")
+        self.assertEqual(FinancialAnalysis(1).get_transactions(end_date="2024-02"),
+                         {"error": "end_date must be YYYY-MM-DD"})
+
+        dated = Transaction.query.filter(Transaction.user_id == 1, Transaction.txn_date.is_not(None)).all()
+        self.assertEqual(FinancialAnalysis(1).get_recurring_transactions(),
+                         detect_recurring([t.date for t in dated], [t.amount for t in dated],
+                                          [t.type for t in dated], [t.description for t in dated]))
+
+    def test_tools_share_one_load(self):
+        """The four tools read the ledger once (initial balance and one projected query) plus the monthly rollup"""
+        self.app.extensions.pop('ledger_snapshots')
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        service = FinancialAnalysis(1)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            service.get_balance()
+            service.calculate_monthly_averages(3)
+            service.get_recurring_transactions()
+            service.get_transactions(days_ago(60))
+            service.get_transactions()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(sum('FROM monthly_summary' in s for s in statements), 1)
+
+    def test_process_cache_follows_the_ledger_version(self):
+        """Services share a snapshot until the ledger changes, including through bulk inserts"""
+        first = FinancialAnalysis(1).ledger
+        self.assertIs(FinancialAnalysis(1).ledger, first)
+
+        db.session.add(Transaction(user_id=1, date=days_ago(0), description='Sale', amount=10.0, type='income'))
+        db.session.commit()
+        second = FinancialAnalysis(1).ledger
+        self.assertIsNot(second, first)
+        self.assertEqual(len(second), len(first) + 1)
+
+        # Core inserts skip the change hooks; the fingerprint still moves
+        db.session.execute(Transaction.__table__.insert(), [{"user_id": 1, "date": days_ago(0), "description": "Bulk",
+                                                            "amount": 1.0, "type": "income"}])
+        db.session.commit()
+        self.assertEqual(len(FinancialAnalysis(1).ledger), len(second) + 1)
+        self.assertLessEqual(len(snapshot_cache()), 3)
+
+    def test_compact(self):
+        """Column arrays cost a few dozen bytes a row"""
+        snapshot = LedgerSnapshot.load(1)
+        self.assertLessEqual(snapshot.nbytes / len(snapshot), 40)
+        self.assertEqual(len(snapshot.descriptions), 9)  # Six rents, payment, coffee and the undated row
+
+if __name__ == '__main__':
+    unittest.main()
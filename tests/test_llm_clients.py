@@ -0,0 +1,96 @@
+import unittest
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import anthropic
+from agent_app import create_app
+from agent_app.src.llm import LLMClientRegistry
+from agent_app.src.services import CashFlowForecast, ReceiptExtraction
+
+MESSAGE = {"id": "msg_1", "type": "message", "role": "assistant", "model": "test",
+           "content": [{"type": "text", "text": "{}"}], "stop_reason": "end_turn", "stop_sequence": None,
+           "usage": {"input_tokens": 1, "output_tokens": 1}}
+
+class FakeAnthropicHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a canned message over a keep-alive connection"""
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # One handler instance per TCP connection
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = json.dumps(MESSAGE).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestLLMClients(unittest.TestCase):
+    """Test case for the app-scoped, pooled Anthropic client registry"""
+
+    def setUp(self):
+        """Start a fake Anthropic API and an app pointing at it"""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeAnthropicHandler)
+        self.server.connections, self.server.lock = 0, threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                                           'ANTHROPIC_BASE_URL': base_url, 'LLM_MAX_RETRIES': 0})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        env = patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test"})
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        """Stop the fake API"""
+        self.app.extensions['llm_clients'].close()
+        self.app_context.pop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_services_share_one_client(self):
+        """Every service built in the app gets the same client object"""
+        clients = [CashFlowForecast(user_id=1).client, CashFlowForecast(user_id=2).client,
+                   ReceiptExtraction(user_id=1).client]
+        self.assertTrue(all(client is clients[0] for client in clients))
+        self.assertIsNot(self.app.extensions['llm_clients'].get("other key"), clients[0])
+
+    def test_requests_reuse_one_connection(self):
+        """Successive requests from new service instances go over the same keep-alive connection"""
+        for user_id in range(5):
+            CashFlowForecast(user_id=user_id)._call_llm("hello", max_tokens=10)
+            ReceiptExtraction(user_id=user_id).client.messages.create(
+                model="test", max_tokens=10, messages=[{"role": "user", "content": "hi"}])
+        self.assertEqual(self.server.connections, 1)
+
+    def test_per_request_clients_reconnect(self):
+        """For contrast: a new anthropic.Anthropic per request opens a new connection each time"""
+        base_url = self.app.config['ANTHROPIC_BASE_URL']
+        for _ in range(3):
+            client = anthropic.Anthropic(api_key="test", base_url=base_url, max_retries=0)
+            client.messages.create(model="test", max_tokens=10, messages=[{"role": "user", "content": "hi"}])
+        self.assertEqual(self.server.connections, 3)
+
+    def test_registry_settings_from_config(self):
+        """Pool limits, timeouts and retries come from the LLM_* settings"""
+        registry = LLMClientRegistry.from_config({'LLM_MAX_CONNECTIONS': 7, 'LLM_TIMEOUT': 30, 'LLM_MAX_RETRIES': 4})
+        client = registry.get("key")
+        self.assertEqual(client.max_retries, 4)
+        self.assertEqual(client.timeout.read, 30)
+        self.assertEqual(registry.max_connections, 7)
+        registry.close()
+
+if __name__ == '__main__':
+    unittest.main()
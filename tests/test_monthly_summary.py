@@ -0,0 +1,221 @@
+import unittest
+import io
+from datetime import date
+from sqlalchemy import event
+from agent_app import create_app
+from agent_app.src.commands import ledger_cli
+from agent_app.src.importer import TransactionImporter
+from agent_app.src.ledger import BalanceLedger
+from agent_app.src.rollup import MonthlyRollup, monthly_averages, monthly_trend, seasonal_multipliers
+from agent_app.src.services import FinancialAnalysis
+from agent_app.src.models import db, User, Transaction, MonthlySummary
+
+def summary_rows(user_id=1):
+    return sorted((s.year_month, s.type, round(s.total, 2), s.count, s.min_amount, s.max_amount)
+                  for s in MonthlySummary.query.filter_by(user_id=user_id))
+
+def history(totals):
+    """monthly_totals()-shaped rows from {month: (income, expense)}"""
+    return [{"month": month, "income": income, "expense": expense, "count": 2}
+            for month, (income, expense) in sorted(totals.items())]
+
+class TestMonthlySummary(unittest.TestCase):
+    """Test case for the MonthlySummary rollup and the analytics read from it"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add_all([User(id=1, username='alice', password='x'), User(id=2, username='bob', password='x')])
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add(self, date, amount, tx_type='expense', user_id=1):
+        tx = Transaction(user_id=user_id, date=date, description='tx', amount=amount, type=tx_type)
+        db.session.add(tx)
+        db.session.commit()
+        return tx
+
+    def assert_matches_rebuild(self):
+        for user_id in (1, 2):
+            incremental = MonthlyRollup(user_id).groups()
+            BalanceLedger(user_id).rebuild()
+            self.assertEqual(incremental, MonthlyRollup(user_id).groups())
+
+    def test_maintained_on_writes(self):
+        """ORM inserts, edits and deletes keep the rollup equal to a full rebuild"""
+        rent = self.add('2024-01-31', 1000.0)
+        coffee = self.add('2024-01-05', 4.0)
+        self.add('2024-02-29', 3000.0, 'income')
+        self.add('2024-02-01', 50.0)
+        self.add('not a date', 7.0)
+        self.assertEqual(summary_rows(), [
+            ('2024-01', 'expense', 1004.0, 2, 4.0, 1000.0),
+            ('2024-02', 'expense', 50.0, 1, 50.0, 50.0),
+            ('2024-02', 'income', 3000.0, 1, 3000.0, 3000.0),
+        ])
+
+        rent.amount = 1200.0
+        db.session.commit()
+        coffee.date = '2024-02-10'
+        db.session.commit()
+        self.assertEqual(summary_rows()[0], ('2024-01', 'expense', 1200.0, 1, 1200.0, 1200.0))
+        self.assert_matches_rebuild()
+
+        rent.description = 'Rent'
+        rent.type = 'income'
+        db.session.commit()
+        db.session.delete(coffee)
+        db.session.commit()
+        rent.user_id = 2
+        db.session.commit()
+        self.assertEqual(summary_rows(), [('2024-02', 'expense', 50.0, 1, 50.0, 50.0),
+                                          ('2024-02', 'income', 3000.0, 1, 3000.0, 3000.0)])
+        self.assertEqual(MonthlyRollup(2).monthly_totals(),
+                         [{"month": "2024-01", "income": 1200.0, "expense": 0.0, "count": 1}])
+        self.assert_matches_rebuild()
+
+    def test_bulk_inserts(self):
+        """Rows inserted past the checkpoint are read on the fly and folded in by checkpoint() and imports"""
+        self.add('2024-01-10', 100.0, 'income')
+        db.session.execute(Transaction.__table__.insert(), [
+            {"user_id": 1, "date": "2024-01-20", "description": "Bulk", "amount": 40.0, "type": "income"},
+            {"user_id": 1, "date": "2024-03-02", "description": "Bulk", "amount": 5.0, "type": "expense"},
+        ])
+        db.session.commit()
+        expected = [{"month": "2024-01", "income": 140.0, "expense": 0.0, "count": 2},
+                    {"month": "2024-03", "income": 0.0, "expense": 5.0, "count": 1}]
+        self.assertEqual(MonthlyRollup(1).monthly_totals(), expected)
+        self.assertEqual(len(summary_rows()), 1)
+
+        BalanceLedger(1).checkpoint()
+        db.session.commit()
+        self.assertEqual(len(summary_rows()), 2)
+        self.assertEqual(MonthlyRollup(1).monthly_totals(), expected)
+
+        csv = io.StringIO("date,description,amount,type\n2024-03-15,Sale,60,income\n2024-04-01,Fee,2,expense\n")
+        TransactionImporter(1).import_stream(csv, 'csv')
+        self.assertEqual(summary_rows()[-2:], [('2024-03', 'income', 60.0, 1, 60.0, 60.0),
+                                               ('2024-04', 'expense', 2.0, 1, 2.0, 2.0)])
+        self.assert_matches_rebuild()
+
+    def test_orm_insert_after_bulk_inserts(self):
+        """An ORM insert that moves the checkpoint past bulk-inserted rows folds them into the rollup"""
+        self.add('2024-01-10', 100.0, 'income')
+        db.session.execute(Transaction.__table__.insert(), [
+            {"user_id": 1, "date": "2024-01-20", "description": "Bulk", "amount": 40.0, "type": "income"},
+            {"user_id": 1, "date": "2024-02-02", "description": "Bulk", "amount": 5.0, "type": "expense"},
+        ])
+        db.session.commit()
+        self.add('2024-02-10', 20.0)
+        self.add('2024-02-11', 1.0)
+        self.assertEqual(summary_rows(), [
+            ('2024-01', 'income', 140.0, 2, 40.0, 100.0),
+            ('2024-02', 'expense', 26.0, 3, 1.0, 20.0),
+        ])
+        self.assert_matches_rebuild()
+
+    def test_insert_after_deleting_newest(self):
+        """A row inserted after the newest one was deleted is rolled up like any other"""
+        self.add('2024-01-10', 100.0, 'income')
+        newest = self.add('2024-01-20', 30.0)
+        db.session.delete(newest)
+        db.session.commit()
+        self.add('2024-01-25', 500.0, 'income')
+        self.assertEqual(summary_rows(), [('2024-01', 'income', 600.0, 2, 100.0, 500.0)])
+        self.assertEqual(MonthlyRollup(1).monthly_totals(),
+                         [{"month": "2024-01", "income": 600.0, "expense": 0.0, "count": 2}])
+        self.assert_matches_rebuild()
+
+    def test_reads_one_statement(self):
+        """The rollup is read in one statement that returns a row per month and type"""
+        for month in range(1, 13):
+            for day in (3, 17, 25):
+                db.session.add(Transaction(user_id=1, date=f'2023-{month:02d}-{day:02d}', description='tx',
+                                           amount=10.0, type='expense'))
+        db.session.commit()
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            totals = MonthlyRollup(1).monthly_totals()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(len(totals), 12)
+        self.assertEqual(totals[1], {"month": "2023-02", "income": 0.0, "expense": 30.0, "count": 3})
+
+    def test_rebuild_command(self):
+        """`flask ledger rebuild-summaries` restores a damaged rollup"""
+        self.add('2024-01-10', 100.0, 'income')
+        self.add('2024-02-10', 30.0)
+        expected = summary_rows()
+        MonthlySummary.query.filter_by(user_id=1).update({"total": 0.0})
+        db.session.commit()
+
+        result = self.app.test_cli_runner().invoke(ledger_cli, ['rebuild-summaries'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('user 1: 2 monthly summary row(s)', result.output)
+        self.assertEqual(summary_rows(), expected)
+
+    def test_calendar_averages(self):
+        """Averages use whole calendar months before the current one, from the first active month on"""
+        months = history({"2023-11": (900.0, 0.0), "2023-12": (0.0, 310.0), "2024-01": (600.0, 0.0),
+                          "2024-02": (300.0, 290.0), "2024-03": (5000.0, 5000.0)})
+        averages = monthly_averages(months, 3, today=date(2024, 3, 10))
+        self.assertAlmostEqual(averages["avg_monthly_income"], 300.0)
+        self.assertAlmostEqual(averages["avg_monthly_expenses"], 200.0)
+        self.assertAlmostEqual(averages["avg_monthly_net"], 100.0)
+
+        # A two-month-old ledger is averaged over its two complete months
+        young = history({"2024-01": (600.0, 0.0), "2024-02": (0.0, 0.0)})
+        self.assertAlmostEqual(monthly_averages(young, 6, today=date(2024, 3, 10))["avg_monthly_income"], 300.0)
+        # No complete month yet: the month to date is extrapolated
+        new = history({"2024-02": (100.0, 0.0)})
+        self.assertAlmostEqual(monthly_averages(new, 3, today=date(2024, 2, 10))["avg_monthly_income"], 290.0)
+        self.assertEqual(monthly_averages([], 3)["avg_monthly_net"], 0.0)
+
+    def test_trend_and_seasonality(self):
+        """Trends are per-month slopes over complete months; seasonal indexes need two years of history"""
+        totals = {}
+        for year in (2022, 2023):
+            for month in range(1, 13):
+                totals[f"{year}-{month:02d}"] = (1000.0 + 10 * month, 400.0 if month == 12 else 200.0)
+        trend = monthly_trend(history(totals), months=6, today=date(2024, 1, 5))
+        self.assertEqual([row["month"] for row in trend["months"]],
+                         ["2023-07", "2023-08", "2023-09", "2023-10", "2023-11", "2023-12"])
+        self.assertAlmostEqual(trend["trend"]["income"], 10.0)
+        self.assertEqual(len(trend["seasonality"]["expense"]), 12)
+        self.assertGreater(trend["seasonality"]["expense"][11], 1.5)
+        self.assertAlmostEqual(trend["seasonality"]["expense"][0], trend["seasonality"]["expense"][5])
+
+        # December relative to the Oct-Dec window the averages were taken over
+        multipliers = seasonal_multipliers(trend["seasonality"], months=3, today=date(2024, 1, 5))
+        self.assertAlmostEqual(multipliers["expense"][11] / multipliers["expense"][0], 2.0)
+        self.assertIsNone(monthly_trend(history({"2023-11": (1.0, 1.0)}), today=date(2024, 1, 5))["seasonality"])
+
+    def test_tools_read_the_rollup(self):
+        """The averaging and trend tools read the rollup, months without rows count as zero"""
+        today = date.today()
+        last_month = date(today.year - (today.month == 1), (today.month - 2) % 12 + 1, 15)
+        self.add(last_month.isoformat(), 900.0, 'income')
+        self.add(date(last_month.year - 1, last_month.month, 1).isoformat(), 120.0)
+        service = FinancialAnalysis(1)
+        self.assertAlmostEqual(service.calculate_monthly_averages(3)["avg_monthly_income"], 300.0)
+        trend = service.get_monthly_trend(24)
+        self.assertEqual(len(trend["months"]), 13)
+        self.assertEqual(trend["months"][-1]["net"], 900.0)
+        self.assertIsNone(trend["seasonality"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from types import SimpleNamespace
+from agent_app import create_app
+from agent_app.src.services import CashFlowForecast, ReceiptExtraction, FORECAST_SYSTEM_PROMPT, RECEIPT_PROMPT
+from agent_app.src.models import db, User, Transaction, InitialBalance
+
+def usage(cache_read=0, cache_write=0):
+    return SimpleNamespace(input_tokens=50, output_tokens=20,
+                           cache_read_input_tokens=cache_read, cache_creation_input_tokens=cache_write)
+
+class FakeClient:
+    """Stand-in for anthropic.Anthropic that replays scripted (content, usage) responses"""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = []
+        self.messages = SimpleNamespace(create=self.create)
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content, response_usage = self.script.pop(0)
+        stop_reason = "tool_use" if any(block.type == "tool_use" for block in content) else "end_turn"
+        return SimpleNamespace(content=content, stop_reason=stop_reason, usage=response_usage)
+
+def text(value):
+    return SimpleNamespace(type="text", text=value)
+
+class TestPromptCaching(unittest.TestCase):
+    """Test case for prompt-caching markers and cache usage reporting"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                                           'FORECAST_CACHE_SIZE': 0})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(InitialBalance(user_id=1, balance=100.0))
+        db.session.add(Transaction(user_id=1, date='2024-01-01', description='Sale', amount=50.0, type='income'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def forecast(self, script):
+        service = CashFlowForecast(user_id=1, api_key='test')
+        service.client = FakeClient(script)
+        return service, service.forecast(days=30)
+
+    def test_static_instructions_and_tools_are_cached(self):
+        """The system prompt and the last tool carry cache_control; the user message holds the figures"""
+        service, _ = self.forecast([([text("Forecast")], usage())])
+        call = service.client.calls[0]
+
+        self.assertEqual(call["system"], [{"type": "text", "text": FORECAST_SYSTEM_PROMPT,
+                                           "cache_control": {"type": "ephemeral"}}])
+        self.assertEqual(call["tools"][-1]["cache_control"], {"type": "ephemeral"})
+        self.assertTrue(all("cache_control" not in tool for tool in call["tools"][:-1]))
+        self.assertIn("Current Balance: $150.00", call["messages"][0]["content"])
+        self.assertNotIn("day-by-day", call["messages"][0]["content"])
+
+    def test_cache_usage_reported_in_metadata(self):
+        """Usage is summed over tool turns, with cache reads and writes, and reported per turn"""
+        tool_call = SimpleNamespace(type="tool_use", id="a", name="get_transactions", input={})
+        _, result = self.forecast([([tool_call], usage(cache_write=900)), ([text("Forecast")], usage(cache_read=900))])
+
+        self.assertEqual(result["metadata"]["llm_usage"], {"input_tokens": 100, "output_tokens": 40,
+                                                          "cache_creation_input_tokens": 900,
+                                                          "cache_read_input_tokens": 900})
+        self.assertEqual([turn["cache_read_input_tokens"] for turn in result["metadata"]["llm_turns"]], [0, 900])
+
+    def test_caching_can_be_disabled(self):
+        """LLM_PROMPT_CACHING = False sends plain prompts"""
+        self.app.config['LLM_PROMPT_CACHING'] = False
+        service, _ = self.forecast([([text("Forecast")], usage())])
+        call = service.client.calls[0]
+        self.assertEqual(call["system"], FORECAST_SYSTEM_PROMPT)
+        self.assertTrue(all("cache_control" not in tool for tool in call["tools"]))
+
+    def test_receipt_instructions_are_cached(self):
+        """Receipt calls send the extraction instructions as a cached system prompt and track usage"""
+        service = ReceiptExtraction(user_id=1)
+        service.client = FakeClient([([text("{}")], usage(cache_write=400)), ([text("{}")], usage(cache_read=400))])
+        _, first = service._call_ai_model("a.jpg", "aGk=")
+        _, second = service._call_ai_model("b.jpg", "aGk=")
+
+        call = service.client.calls[0]
+        self.assertEqual(call["system"][0]["text"], RECEIPT_PROMPT)
+        self.assertEqual(call["system"][0]["cache_control"], {"type": "ephemeral"})
+        self.assertEqual([block["type"] for block in call["messages"][0]["content"]], ["text", "image"])
+        self.assertEqual((service.usage["cache_creation_input_tokens"], service.usage["cache_read_input_tokens"]),
+                         (400, 400))
+        # Each call reports its own response's usage; self.usage is the running total
+        self.assertEqual((first["cache_creation_input_tokens"], first["cache_read_input_tokens"]), (400, 0))
+        self.assertEqual((second["cache_creation_input_tokens"], second["cache_read_input_tokens"]), (0, 400))
+
+if __name__ == '__main__':
+    unittest.main()
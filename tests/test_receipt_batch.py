@@ -0,0 +1,201 @@
+import unittest
+import base64
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from types import SimpleNamespace
+from unittest.mock import patch
+from sqlalchemy import event
+from werkzeug.datastructures import FileStorage
+from agent_app import create_app
+from agent_app.src.services import BatchTooLarge, ReceiptExtraction, _retry_delay
+from agent_app.src.models import db, User, ReceiptDetail
+
+AI_RESPONSE = json.dumps({"date": "2024-03-01", "currency": "USD", "vendor_name": "Cafe",
+                          "receipt_items": [{"item_name": "Latte", "item_cost": 4.5}], "tax": 0.5, "total": 5.0})
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        self.response = SimpleNamespace(headers={"retry-after": retry_after} if retry_after else {})
+
+def image(name, content=None):
+    """Fake upload; distinct names get distinct bytes unless `content` is given"""
+    return FileStorage(stream=io.BytesIO(content or f'fake image {name}'.encode()), filename=name)
+
+class TestReceiptBatch(unittest.TestCase):
+    """Test case for concurrent batch receipt extraction"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                                           'RECEIPT_BATCH_BACKOFF': 0.01})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.service = ReceiptExtraction(user_id=1)
+        self.service.upload_folder = self.tmpdir
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_endpoint_returns_per_file_results(self):
+        """Each uploaded file gets its own result; bad files don't sink the batch"""
+        files = [(io.BytesIO(b'a'), 'a.jpg'), (io.BytesIO(b'b'), 'b.png'), (io.BytesIO(b'c'), 'c.gif')]
+        with patch.object(ReceiptExtraction, '_save_image', return_value=('path', '/static/x.jpg')), \
+                patch.object(ReceiptExtraction, '_extract_data', side_effect=lambda path: (json.loads(AI_RESPONSE), {})):
+            response = self.client.post('/api/extract-receipt-details/batch', data={'files': files},
+                                        content_type='multipart/form-data')
+
+        body = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((body["status"], body["succeeded"], body["failed"]), ("partial", 2, 1))
+        self.assertEqual([r["filename"] for r in body["results"]], ['a.jpg', 'b.png', 'c.gif'])
+        self.assertEqual(body["results"][0]["data"]["vendor_name"], "Cafe")
+        self.assertEqual(ReceiptDetail.query.count(), 2)
+
+    def test_zip_archives_are_expanded(self):
+        """Images inside a zip are extracted; folders and resource forks are skipped"""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('march/one.jpg', b'1')
+            zf.writestr('march/two.jpeg', b'2')
+            zf.writestr('__MACOSX/march/._one.jpg', b'x')
+        archive.seek(0)
+
+        files, skipped = ReceiptExtraction.expand_uploads([image('x.png'), FileStorage(archive, 'receipts.zip')])
+        self.assertEqual([f.filename for f in files], ['x.png', 'one.jpg', 'two.jpeg'])
+        self.assertEqual(files[1].read(), b'1')
+        self.assertEqual(skipped, [])
+
+    def test_archive_limits_checked_before_expanding(self):
+        """Archives with too many members or too many bytes once inflated are rejected unread"""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for i in range(3):
+                zf.writestr(f'{i}.jpg', b'\0' * 4096)
+
+        with patch.object(zipfile.ZipFile, 'open') as member_open:
+            archive.seek(0)
+            with self.assertRaisesRegex(BatchTooLarge, 'At most 2'):
+                ReceiptExtraction.expand_uploads([FileStorage(archive, 'r.zip')], max_files=2)
+            archive.seek(0)
+            with self.assertRaisesRegex(BatchTooLarge, 'expand to more than 10000 bytes'):
+                ReceiptExtraction.expand_uploads([FileStorage(archive, 'r.zip')], max_total_size=10000)
+            member_open.assert_not_called()
+
+        self.app.config['RECEIPT_BATCH_MAX_FILES'] = 3
+        archive.seek(0)
+        response = self.client.post('/api/extract-receipt-details/batch',
+                                    data={'files': [(archive, 'r.zip'), (io.BytesIO(b'a'), 'a.jpg')]},
+                                    content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(json.loads(response.data)["message"], "At most 3 receipts per batch")
+
+    def test_receipts_committed_in_bulk(self):
+        """Receipts are inserted in groups of RECEIPT_BATCH_COMMIT_SIZE, not one commit each"""
+        commits = []
+
+        def count(conn):
+            commits.append(1)
+
+        event.listen(db.engine, 'commit', count)
+        try:
+            with patch.object(ReceiptExtraction, '_call_ai_model', return_value=(AI_RESPONSE, {})):
+                results = self.service.extract_batch([image(f'{i}.jpg') for i in range(7)], commit_size=3)
+        finally:
+            event.remove(db.engine, 'commit', count)
+        self.assertTrue(all(r["status"] == "success" for r in results))
+        self.assertEqual(ReceiptDetail.query.count(), 7)
+        self.assertEqual(len(commits), 3)
+
+    def test_results_carry_each_receipts_usage(self):
+        """Each extracted receipt reports its own Vision call's usage; repeats made no call"""
+        usages = {b'fake image a.jpg': {"input_tokens": 7}, b'fake image b.jpg': {"input_tokens": 3}}
+
+        def model(file_path, base64_image):
+            return AI_RESPONSE, usages[base64.b64decode(base64_image)]
+
+        with patch.object(self.service, '_call_ai_model', side_effect=model):
+            results = self.service.extract_batch([image('a.jpg'), image('b.jpg'), image('c.jpg', b'fake image a.jpg')])
+        self.assertEqual([r.get("usage") for r in results], [{"input_tokens": 7}, {"input_tokens": 3}, None])
+        self.assertTrue(results[2]["duplicate"])
+
+    def test_concurrency_is_bounded(self):
+        """No more than `concurrency` Vision calls are in flight"""
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def slow_model(file_path, base64_image):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return AI_RESPONSE, {}
+
+        with patch.object(self.service, '_call_ai_model', side_effect=slow_model):
+            started = time.monotonic()
+            results = self.service.extract_batch([image(f'{i}.jpg') for i in range(12)], concurrency=3)
+            elapsed = time.monotonic() - started
+        self.assertEqual(peak[0], 3)
+        self.assertLess(elapsed, 12 * 0.05)
+        self.assertEqual(len(results), 12)
+
+    def test_rate_limits_back_off_and_retry(self):
+        """A 429 is retried after a backoff; other errors fail the file immediately"""
+        responses = [RateLimited(), RateLimited(retry_after="0"), (AI_RESPONSE, {})]
+
+        def flaky(file_path, base64_image):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        with patch.object(self.service, '_call_ai_model', side_effect=flaky):
+            results = self.service.extract_batch([image('a.jpg')])
+        self.assertEqual(results[0]["status"], "success")
+
+        with patch.object(self.service, '_call_ai_model', side_effect=ValueError("boom")):
+            results = self.service.extract_batch([image('b.jpg')])
+        self.assertIn("boom", results[0]["message"])
+
+    def test_batch_calls_skip_the_client_retries(self):
+        """The batch's backoff is the only retry loop; the service gets its client back afterwards"""
+        client = self.service.client
+        seen = []
+
+        def model(file_path, base64_image):
+            seen.append(self.service.client.max_retries)
+            return AI_RESPONSE, {}
+
+        with patch.object(self.service, '_call_ai_model', side_effect=model):
+            self.service.extract_batch([image('a.jpg')])
+        self.assertEqual(seen, [0])
+        self.assertIs(self.service.client, client)
+
+    def test_retry_delay(self):
+        """Retry-After wins; otherwise exponential backoff with jitter"""
+        self.assertEqual(_retry_delay(RateLimited(retry_after="7"), 0, 1.0), 7.0)
+        self.assertTrue(2.0 <= _retry_delay(RateLimited(), 2, 1.0) <= 6.0)
+        self.assertIsNone(_retry_delay(ValueError(), 0, 1.0))
+        # What the SDK would have retried: server errors, but not bad requests
+        self.assertIsNotNone(_retry_delay(SimpleNamespace(status_code=500, response=None), 0, 1.0))
+        self.assertIsNone(_retry_delay(SimpleNamespace(status_code=400, response=None), 0, 1.0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from werkzeug.datastructures import FileStorage
+from agent_app import create_app
+from agent_app.src.services import ReceiptExtraction
+from agent_app.src.models import db, User, ReceiptDetail
+
+AI_RESPONSE = json.dumps({"date": "2024-03-01", "currency": "USD", "vendor_name": "Cafe",
+                          "receipt_items": [{"item_name": "Latte", "item_cost": 4.5}], "tax": 0.5, "total": 5.0})
+
+def image(content=b'receipt bytes', name='receipt.jpg'):
+    return FileStorage(stream=io.BytesIO(content), filename=name)
+
+class TestReceiptDedupe(unittest.TestCase):
+    """Test case for content-addressed receipt storage and extraction reuse"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(User(id=2, username='bob', password='x'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.tmpdir)
+
+    def service(self, user_id=1):
+        service = ReceiptExtraction(user_id=user_id)
+        service.upload_folder = self.tmpdir
+        return service
+
+    def test_images_are_stored_by_content_hash(self):
+        """Identical bytes land in one file named after their SHA-256, whatever the upload name"""
+        first, _ = self.service()._save_image(image(name='a.JPG'))
+        second, url = self.service()._save_image(image(name='b.jpg'))
+        other, _ = self.service()._save_image(image(b'other bytes'))
+
+        self.assertNotEqual(first, other)
+        self.assertEqual(os.path.basename(second), os.path.basename(url))
+        self.assertEqual(len(ReceiptExtraction.content_hash(second)), 64)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), sorted({os.path.basename(p) for p in (first, second, other)}))
+
+    def test_duplicate_upload_reuses_extraction(self):
+        """The second upload of an image returns the existing receipt without calling the model"""
+        service = self.service()
+        with patch.object(ReceiptExtraction, '_call_ai_model', return_value=(AI_RESPONSE, {})) as model:
+            first = service.extract_receipt_details(image())
+            second = service.extract_receipt_details(image(name='again.jpg'))
+
+        self.assertEqual(model.call_count, 1)
+        self.assertTrue(second["duplicate"])
+        self.assertEqual(second["data"]["id"], first["data"]["id"])
+        self.assertEqual(ReceiptDetail.query.count(), 1)
+
+    def test_new_model_or_prompt_extracts_again(self):
+        """Cached extractions are keyed by model and prompt version"""
+        with patch.object(ReceiptExtraction, '_call_ai_model', return_value=(AI_RESPONSE, {})) as model:
+            self.service().extract_receipt_details(image())
+            upgraded = self.service()
+            upgraded.model = 'a-newer-model'
+            result = upgraded.extract_receipt_details(image())
+
+        self.assertEqual(model.call_count, 2)
+        self.assertFalse(result.get("duplicate"))
+
+    def test_other_users_extraction_is_copied_and_optionally_flagged(self):
+        """Another user's upload of the same image gets its own receipt without a model call"""
+        self.app.config['RECEIPT_FLAG_CROSS_USER_DUPLICATES'] = True
+        with patch.object(ReceiptExtraction, '_call_ai_model', return_value=(AI_RESPONSE, {})) as model:
+            original = self.service(1).extract_receipt_details(image())
+            copy = self.service(2).extract_receipt_details(image())
+
+        self.assertEqual(model.call_count, 1)
+        self.assertTrue(copy["duplicate_across_users"])
+        self.assertNotEqual(copy["data"]["id"], original["data"]["id"])
+        self.assertEqual(copy["data"]["receipt_items"], original["data"]["receipt_items"])
+        self.assertEqual(db.session.get(ReceiptDetail, copy["data"]["id"]).user_id, 2)
+
+        self.app.config['RECEIPT_FLAG_CROSS_USER_DUPLICATES'] = False
+        db.session.add(User(id=3, username='carol', password='x'))
+        db.session.commit()
+        self.assertNotIn("duplicate_across_users", self.service(3).extract_receipt_details(image()))
+
+    def test_batch_extracts_each_distinct_image_once(self):
+        """Repeats inside a batch share one model call and one receipt"""
+        with patch.object(ReceiptExtraction, '_call_ai_model', return_value=(AI_RESPONSE, {})) as model:
+            results = self.service().extract_batch([image(name='a.jpg'), image(b'other'), image(name='c.jpg')])
+
+        self.assertEqual(model.call_count, 2)
+        self.assertEqual([r["status"] for r in results], ["success"] * 3)
+        self.assertTrue(results[2]["duplicate"])
+        self.assertEqual(results[2]["filename"], "c.jpg")
+        self.assertEqual(results[2]["data"]["id"], results[0]["data"]["id"])
+        self.assertEqual(ReceiptDetail.query.count(), 2)
+
+    def test_upload_endpoint_answers_duplicates_immediately(self):
+        """A known image returns 200 with the receipt instead of queueing a job"""
+        save_image = ReceiptExtraction._save_image
+        with patch.object(ReceiptExtraction, '_call_ai_model', return_value=(AI_RESPONSE, {})), \
+                patch.object(ReceiptExtraction, '_save_image', autospec=True,
+                             side_effect=lambda service, f: save_image(self.service(), f)):
+            self.service().extract_receipt_details(image())
+            response = self.app.test_client().post('/api/extract-receipt-details',
+                                                   data={'file': (io.BytesIO(b'receipt bytes'), 'r.jpg')},
+                                                   content_type='multipart/form-data')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.data)["duplicate"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -95,18 +95,18 @@ class TestReceiptExtraction(unittest.TestCase):
                         ],
                         "tax": 1.50,
                         "total": 18.48
-                    })
+                    }), {}
                 # For invalid JSON case
                 elif getattr(self, 'test_mode', None) == 'invalid_json':
-                    return "This is not valid JSON"
+                    return "This is not valid JSON", {}
                 # For missing fields case
                 elif getattr(self, 'test_mode', None) == 'missing_fields':
                     return json.dumps({
                         "date": "2023-06-15",
                         "vendor_name": "Test Store"
                         # Missing fields
-                    })
-                return "{}"
+                    }), {}
+                return "{}", {}
         
         # Split this into three separate tests to avoid database state issues
         self._test_successful_extraction(TestReceiptExtractionService)
@@ -129,7 +129,8 @@ class TestReceiptExtraction(unittest.TestCase):
         """Test successful receipt extraction"""
         with patch('agent_app.src.services.os.makedirs'):
             with patch('agent_app.src.services.open'):
-                with patch('agent_app.src.services.base64.b64encode') as mock_b64encode:
+                with patch('agent_app.src.services.base64.b64encode') as mock_b64encode, \
+                        patch('agent_app.src.services.base64_file', return_value='base64_encoded_data'):
                     mock_b64encode.return_value = b'base64_encoded_data'
                     
                     mock_file = MagicMock()
@@ -159,7 +160,8 @@ class TestReceiptExtraction(unittest.TestCase):
         """Test extraction with invalid JSON response"""
         with patch('agent_app.src.services.os.makedirs'):
             with patch('agent_app.src.services.open'):
-                with patch('agent_app.src.services.base64.b64encode') as mock_b64encode:
+                with patch('agent_app.src.services.base64.b64encode') as mock_b64encode, \
+                        patch('agent_app.src.services.base64_file', return_value='base64_encoded_data'):
                     mock_b64encode.return_value = b'base64_encoded_data'
                     
                     mock_file = MagicMock()
@@ -186,7 +188,8 @@ class TestReceiptExtraction(unittest.TestCase):
         """Test extraction with missing fields in AI response"""
         with patch('agent_app.src.services.os.makedirs'):
             with patch('agent_app.src.services.open'):
-                with patch('agent_app.src.services.base64.b64encode') as mock_b64encode:
+                with patch('agent_app.src.services.base64.b64encode') as mock_b64encode, \
+                        patch('agent_app.src.services.base64_file', return_value='base64_encoded_data'):
                     mock_b64encode.return_value = b'base64_encoded_data'
                     
                     mock_file = MagicMock()
@@ -0,0 +1,202 @@
+import unittest
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from agent_app import create_app
+from agent_app.src.services import ReceiptExtraction
+from agent_app.src.models import db, User, ReceiptJob, ReceiptDetail
+
+AI_RESPONSE = json.dumps({"date": "2024-03-01", "currency": "USD", "vendor_name": "Cafe",
+                          "receipt_items": [{"item_name": "Latte", "item_cost": 4.5}], "tax": 0.5, "total": 5.0})
+
+class TestReceiptJobs(unittest.TestCase):
+    """Test case for the asynchronous receipt extraction queue"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.app = create_app(test_config={
+            'TESTING': True,
+            # Workers use their own connections, so use a file rather than :memory:
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(self.tmpdir, 'test.db'),
+            'RECEIPT_JOB_WORKERS': 2,
+            'RECEIPT_JOB_MAX_QUEUED': 10,
+        })
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.jobs = self.app.extensions['receipt_jobs']
+
+        save = patch.object(ReceiptExtraction, '_save_image', autospec=True, side_effect=self.save_image)
+        save.start()
+        self.addCleanup(save.stop)
+
+    def tearDown(self):
+        """Clean up after tests"""
+        self.jobs.shutdown()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.tmpdir)
+
+    def save_image(self, service, image_file):
+        path = os.path.join(self.tmpdir, image_file.filename)
+        image_file.save(path)
+        return path, f"/static/image/receipts/{image_file.filename}"
+
+    def upload(self, name='receipt.jpg'):
+        return self.client.post('/api/extract-receipt-details',
+                                data={'file': (io.BytesIO(b'fake image'), name)},
+                                content_type='multipart/form-data')
+
+    def test_upload_returns_job_and_worker_extracts(self):
+        """The upload answers 202 at once; polling the job returns the stored receipt"""
+        with patch.object(ReceiptExtraction, '_call_ai_model', return_value=(AI_RESPONSE, {})):
+            response = self.upload()
+            self.assertEqual(response.status_code, 202)
+            body = json.loads(response.data)
+            self.assertEqual(body["status"], "queued")
+            self.assertEqual(self.jobs.wait(body["job_id"], timeout=5), 'done')
+
+        job = json.loads(self.client.get(body["status_url"]).data)
+        self.assertEqual(job["status"], "done")
+        self.assertEqual(job["data"]["vendor_name"], "Cafe")
+        self.assertEqual(job["data"]["receipt_items"], [{"item_name": "Latte", "item_cost": 4.5}])
+        self.assertEqual(ReceiptDetail.query.count(), 1)
+
+    def test_failed_extraction_marks_job_as_error(self):
+        """Extraction errors are recorded on the job instead of raised"""
+        with patch.object(ReceiptExtraction, '_call_ai_model', return_value=("not json", {})):
+            job_id = json.loads(self.upload().data)["job_id"]
+            self.assertEqual(self.jobs.wait(job_id, timeout=5), 'error')
+        job = db.session.get(ReceiptJob, job_id)
+        self.assertIn("Invalid JSON", job.error)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_worker_concurrency_is_bounded(self):
+        """No more than RECEIPT_JOB_WORKERS extractions run at the same time"""
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def slow_model(service, file_path, base64_image):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.2)
+            with lock:
+                running[0] -= 1
+            return AI_RESPONSE, {}
+
+        with patch.object(ReceiptExtraction, '_call_ai_model', autospec=True, side_effect=slow_model):
+            job_ids = [json.loads(self.upload(f'r{i}.jpg').data)["job_id"] for i in range(5)]
+            for job_id in job_ids:
+                self.assertEqual(self.jobs.wait(job_id, timeout=10), 'done')
+        self.assertEqual(peak[0], 2)
+
+    def test_queue_limit_rejects_uploads(self):
+        """Uploads beyond RECEIPT_JOB_MAX_QUEUED get 503 with Retry-After"""
+        for i in range(10):
+            db.session.add(ReceiptJob(id=f'job{i}', user_id=1, filename='x.jpg', file_path='x', image_url='x'))
+        db.session.commit()
+        response = self.upload()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
+    def test_invalid_file_type_rejected_before_queueing(self):
+        """Unsupported files are refused synchronously"""
+        response = self.upload('receipt.gif')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ReceiptJob.query.count(), 0)
+
+    def test_event_stream_ends_when_job_finishes(self):
+        """The SSE endpoint sends status changes and closes after the final one"""
+        with patch.object(ReceiptExtraction, '_call_ai_model', return_value=(AI_RESPONSE, {})):
+            body = json.loads(self.upload().data)
+            stream = self.client.get(body["events_url"]).get_data(as_text=True)
+        statuses = [json.loads(line[len("data: "):])["status"]
+                    for line in stream.splitlines() if line.startswith("data: ")]
+        self.assertEqual(statuses[-1], "done")
+        self.assertEqual(self.client.get('/api/receipt-jobs/missing').status_code, 404)
+
+    def test_event_stream_ends_when_job_is_deleted(self):
+        """A job deleted while its stream is open ends the stream with an error event"""
+        # Claimed by a live worker elsewhere, so opening the stream doesn't resume it here
+        db.session.add(ReceiptJob(id='gone', user_id=1, status='running', filename='a.jpg', file_path='a.jpg',
+                                  image_url='/static/image/receipts/a.jpg', started_at=datetime.now()))
+        db.session.commit()
+
+        def delete():
+            time.sleep(0.2)
+            with self.app.app_context():
+                ReceiptJob.query.filter_by(id='gone').delete()
+                db.session.commit()
+                db.session.remove()
+            self.jobs._notify()
+
+        thread = threading.Thread(target=delete)
+        thread.start()
+        stream = self.client.get('/api/receipt-jobs/gone/events').get_data(as_text=True)
+        thread.join()
+        self.assertIn('event: error', stream)
+        self.assertIn('Job not found', stream)
+
+    def test_running_jobs_resume_only_after_the_lease(self):
+        """A job claimed recently is left to its worker; one past the lease is presumed orphaned"""
+        self.jobs.lease = 60
+        db.session.add(ReceiptJob(id='busy', user_id=1, status='running', filename='a.jpg', file_path='a.jpg',
+                                  image_url='/static/image/receipts/a.jpg', started_at=datetime.now()))
+        db.session.add(ReceiptJob(id='orphan', user_id=1, status='running', filename='b.jpg', file_path='b.jpg',
+                                  image_url='/static/image/receipts/b.jpg',
+                                  started_at=datetime.now() - timedelta(seconds=120)))
+        db.session.commit()
+
+        self.assertEqual(self.jobs.recover(), ['orphan'])
+        db.session.expire_all()
+        self.assertEqual(db.session.get(ReceiptJob, 'busy').status, 'running')
+        self.assertEqual(db.session.get(ReceiptJob, 'orphan').status, 'queued')
+
+    def test_unfinished_jobs_resume_on_start(self):
+        """Jobs a previous process left queued or running are picked up again"""
+        path = os.path.join(self.tmpdir, 'old.jpg')
+        with open(path, 'wb') as f:
+            f.write(b'fake image')
+        db.session.add(ReceiptJob(id='stale', user_id=1, status='running', filename='old.jpg',
+                                  file_path=path, image_url='/static/image/receipts/old.jpg'))
+        db.session.commit()
+
+        with patch.object(ReceiptExtraction, '_call_ai_model', return_value=(AI_RESPONSE, {})):
+            self.jobs.start()
+            self.assertEqual(self.jobs.wait('stale', timeout=5), 'done')
+
+    def test_polling_resumes_unfinished_jobs(self):
+        """After a restart the first status poll starts the workers, without waiting for a new upload"""
+        path = os.path.join(self.tmpdir, 'old.jpg')
+        with open(path, 'wb') as f:
+            f.write(b'fake image')
+        db.session.add(ReceiptJob(id='stale', user_id=1, status='queued', filename='old.jpg',
+                                  file_path=path, image_url='/static/image/receipts/old.jpg'))
+        db.session.commit()
+
+        with patch.object(ReceiptExtraction, '_call_ai_model', return_value=(AI_RESPONSE, {})):
+            self.assertEqual(self.client.get('/api/receipt-jobs/stale').status_code, 200)
+            self.assertEqual(self.jobs.wait('stale', timeout=5), 'done')
+
+    def test_save_failure_returns_json_error(self):
+        """An image that can't be saved gets a JSON error and no job"""
+        with patch.object(ReceiptExtraction, '_save_image', side_effect=OSError("disk full")):
+            response = self.upload()
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(json.loads(response.data),
+                         {"status": "error", "message": "Error processing receipt: disk full"})
+        self.assertEqual(ReceiptJob.query.count(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
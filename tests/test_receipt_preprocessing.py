@@ -0,0 +1,85 @@
+import unittest
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from agent_app import create_app
+from agent_app.src.imaging import ReceiptImagePreprocessor
+from agent_app.src.services import ReceiptExtraction
+from agent_app.src.models import db
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+AI_RESPONSE = json.dumps({"date": "2024-03-01", "currency": "USD", "vendor_name": "Cafe",
+                          "receipt_items": [], "tax": 0.0, "total": 5.0})
+
+def photo(size=(4000, 3000), orientation=None, image_format='JPEG'):
+    """Noisy colour image like a phone photo, optionally tagged with an EXIF orientation"""
+    image = Image.effect_noise(size, 64).convert('RGB')
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    output = io.BytesIO()
+    if image_format == 'JPEG':
+        image.save(output, image_format, quality=95, exif=exif)
+    else:
+        image.save(output, image_format)
+    return output.getvalue()
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+class TestReceiptPreprocessing(unittest.TestCase):
+    """Test case for shrinking receipt images before the Vision call"""
+
+    def test_large_photo_is_downscaled_uprighted_and_grayscaled(self):
+        """The long edge is capped, EXIF rotation applied and the result is smaller"""
+        original = photo(orientation=6)  # stored landscape, displayed portrait
+        processed = ReceiptImagePreprocessor(max_edge=1000).process(original)
+
+        image = Image.open(io.BytesIO(processed))
+        self.assertEqual(image.size, (750, 1000))
+        self.assertEqual(image.mode, 'L')
+        self.assertEqual(image.format, 'JPEG')
+        self.assertLess(len(processed), len(original) / 10)
+
+    def test_png_stays_png(self):
+        """The output format matches the input so the media type stays right"""
+        processed = ReceiptImagePreprocessor(max_edge=500).process(photo((1200, 800), image_format='PNG'))
+        image = Image.open(io.BytesIO(processed))
+        self.assertEqual((image.format, image.size), ('PNG', (500, 333)))
+
+    def test_original_kept_when_nothing_is_gained(self):
+        """Disabled preprocessing, unreadable bytes and already-small images pass through unchanged"""
+        original = photo((600, 400))
+        self.assertIs(ReceiptImagePreprocessor(enabled=False).process(original), original)
+        self.assertEqual(ReceiptImagePreprocessor().process(b'not an image'), b'not an image')
+        small = ReceiptImagePreprocessor(grayscale=False, quality=100).process(original)
+        self.assertLessEqual(len(small), len(original))
+
+    def test_extraction_sends_preprocessed_image(self):
+        """_extract_data base64-encodes the preprocessed bytes, configured from the app"""
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                                      'RECEIPT_IMAGE_MAX_EDGE': 800})
+        path = os.path.join(tmpdir, 'receipt.jpg')
+        with open(path, 'wb') as f:
+            f.write(photo())
+
+        with app.app_context():
+            db.create_all()
+            service = ReceiptExtraction(user_id=1)
+            with patch.object(service, '_call_ai_model', return_value=(AI_RESPONSE, {})) as model:
+                service._extract_data(path)
+            db.drop_all()
+
+        sent = Image.open(io.BytesIO(base64.b64decode(model.call_args.args[1])))
+        self.assertEqual(sent.size, (800, 600))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from werkzeug.datastructures import FileStorage
+from agent_app import create_app
+from agent_app.src.imaging import base64_file
+from agent_app.src.services import ReceiptExtraction, UPLOAD_CHUNK
+from agent_app.src.models import db
+
+AI_RESPONSE = json.dumps({"date": "2024-03-01", "currency": "USD", "vendor_name": "Cafe",
+                          "receipt_items": [], "tax": 0.0, "total": 5.0})
+
+class RecordingStream(io.BytesIO):
+    """BytesIO that remembers how much each read asked for"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.requests = []
+
+    def read(self, size=-1):
+        self.requests.append(size)
+        return super().read(size)
+
+class TestReceiptUploadIO(unittest.TestCase):
+    """Test case for the chunked receipt upload and encoding path"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+                                           'MAX_CONTENT_LENGTH': 4096, 'RECEIPT_PREPROCESS': False})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.service = ReceiptExtraction(user_id=1)
+        self.service.upload_folder = self.tmpdir
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, data):
+        path = os.path.join(self.tmpdir, 'image.jpg')
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_base64_file_matches_one_shot_encoding(self):
+        """Chunked encoding gives the same text for empty, odd-sized and multi-chunk files"""
+        for size in (0, 1, 5, 3 * 7, 3 * 7 + 2, 1000):
+            data = os.urandom(size)
+            self.assertEqual(base64_file(self.write(data), chunk_size=21), base64.b64encode(data).decode("ascii"))
+
+    def test_missing_file_is_not_preprocessed(self):
+        """A file that can't be stat'ed is left to the plain encoding path instead of raising"""
+        service = ReceiptExtraction(user_id=1)
+        service.preprocessor.enabled = True
+        self.assertIsNone(service.preprocessor.process_file(os.path.join(self.tmpdir, 'missing.jpg')))
+        with self.assertRaises(FileNotFoundError):
+            base64_file(os.path.join(self.tmpdir, 'missing.jpg'))
+
+    def test_upload_is_saved_in_chunks(self):
+        """_save_image never asks the upload for more than UPLOAD_CHUNK bytes at once"""
+        data = os.urandom(UPLOAD_CHUNK * 3 + 10)
+        stream = RecordingStream(data)
+        file_path, _ = self.service._save_image(FileStorage(stream=stream, filename='big.jpg'))
+
+        self.assertTrue(all(0 < size <= UPLOAD_CHUNK for size in stream.requests))
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(os.listdir(self.tmpdir), [os.path.basename(file_path)])
+
+    def test_unprocessed_image_is_encoded_from_disk(self):
+        """Without preprocessing, the model gets the file's base64 text"""
+        data = os.urandom(1000)
+        path = self.write(data)
+        with patch.object(self.service, '_call_ai_model', return_value=(AI_RESPONSE, {})) as model:
+            self.service._extract_data(path)
+        self.assertEqual(model.call_args.args[1], base64.b64encode(data).decode("ascii"))
+
+    def test_result_reports_its_own_call_usage(self):
+        """Each receipt's result carries the usage of its own Vision call, not the running total"""
+        calls = [(AI_RESPONSE, {"input_tokens": 7}), (AI_RESPONSE, {"input_tokens": 3})]
+        with patch.object(self.service, '_call_ai_model', side_effect=calls):
+            first = self.service.process_saved_image(self.write(b'a'), '/static/a.jpg')
+            second = self.service.process_saved_image(self.write(b'b'), '/static/b.jpg')
+        self.assertEqual((first["usage"], second["usage"]), ({"input_tokens": 7}, {"input_tokens": 3}))
+
+    def test_oversized_request_is_rejected(self):
+        """Requests over MAX_CONTENT_LENGTH get a JSON 413 and nothing is saved"""
+        response = self.app.test_client().post('/api/extract-receipt-details',
+                                               data={'file': (io.BytesIO(b'x' * 8192), 'big.jpg')},
+                                               content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(json.loads(response.data)["max_bytes"], 4096)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_batch_has_its_own_request_limit(self):
+        """Batches over MAX_CONTENT_LENGTH still reach extraction; RECEIPT_BATCH_MAX_CONTENT_LENGTH caps them"""
+        client = self.app.test_client()
+        files = [(io.BytesIO(b'x' * 3000), f'{i}.jpg') for i in range(3)]
+        with patch.object(ReceiptExtraction, 'extract_batch', return_value=[]) as extract_batch:
+            response = client.post('/api/extract-receipt-details/batch', data={'files': files},
+                                   content_type='multipart/form-data')
+        self.assertNotEqual(response.status_code, 413)
+        self.assertEqual(len(extract_batch.call_args[0][0]), 3)
+
+        self.app.config['RECEIPT_BATCH_MAX_CONTENT_LENGTH'] = 8192
+        response = client.post('/api/extract-receipt-details/batch',
+                               data={'files': [(io.BytesIO(b'x' * 3000), f'{i}.jpg') for i in range(3)]},
+                               content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(json.loads(response.data)["max_bytes"], 8192)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+from datetime import date, timedelta
+from agent_app import create_app
+from agent_app.src.recurring import detect_recurring, normalize_description
+from agent_app.src.services import FinancialAnalysis
+from agent_app.src.models import db, User, Transaction
+
+def every(start, step_days, count):
+    return [(start + timedelta(days=step_days * i)).strftime("%Y-%m-%d") for i in range(count)]
+
+class TestRecurringDetection(unittest.TestCase):
+    """Test case for the vectorized recurring-transaction detector"""
+
+    def test_normalize_description(self):
+        """Reference numbers and punctuation don't split a series"""
+        self.assertEqual(normalize_description("NETFLIX 123"), "netflix")
+        self.assertEqual(normalize_description("Netflix #456"), "netflix")
+        self.assertEqual(normalize_description("AMZN Mktp US*2K3"), "amzn mktp us")
+        self.assertEqual(normalize_description("12345"), "12345")
+
+    def test_cadences_and_amount_clusters(self):
+        """Weekly, biweekly and monthly series are separated by amount and cadence"""
+        rows = []
+        for i, day in enumerate(every(date(2024, 1, 1), 7, 8)):
+            rows.append((day, 15.99, "expense", f"NETFLIX {100 + i}"))
+        for day in every(date(2024, 1, 5), 14, 6):
+            rows.append((day, 2500.0, "income", "Payroll ACME"))
+        for day in ["2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30"]:
+            rows.append((day, 1200.0, "expense", "Rent"))
+        # Same description, very different amount: a separate, irregular cluster
+        rows.append(("2024-02-10", 300.0, "expense", "Rent"))
+        rows.append(("2024-03-17", 310.0, "expense", "Rent"))
+        # One-off
+        rows.append(("2024-02-02", 80.0, "expense", "Hardware store"))
+
+        dates, amounts, types, descriptions = zip(*rows)
+        summaries = detect_recurring(dates, amounts, types, descriptions, today=date(2024, 5, 1))
+        by_name = {(s["description"], s["cadence"]): s for s in summaries}
+
+        self.assertEqual(set(by_name), {("netflix", "weekly"), ("payroll acme", "biweekly"), ("rent", "monthly")})
+
+        netflix = by_name[("netflix", "weekly")]
+        self.assertEqual(netflix["occurrences"], 8)
+        self.assertEqual(netflix["mean_amount"], 15.99)
+        self.assertEqual(netflix["next_expected_date"], "2024-02-26")
+        self.assertFalse(netflix["active"])
+
+        rent = by_name[("rent", "monthly")]
+        self.assertEqual(rent["occurrences"], 4)
+        self.assertEqual(rent["next_expected_date"], "2024-05-30")
+        self.assertEqual(rent["type"], "expense")
+        self.assertTrue(rent["active"])
+        self.assertGreater(rent["confidence"], 0.7)
+
+        payroll = by_name[("payroll acme", "biweekly")]
+        self.assertEqual(payroll["type"], "income")
+        self.assertEqual(payroll["period_days"], 14)
+
+    def test_empty_ledger(self):
+        """No rows, no series"""
+        self.assertEqual(detect_recurring([], [], [], []), [])
+
+
+class TestRecurringTool(unittest.TestCase):
+    """Test case for the get_recurring_transactions agent tool"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        for i, day in enumerate(every(date.today() - timedelta(days=90), 30, 4)):
+            db.session.add(Transaction(user_id=1, date=day, description=f"SPOTIFY P{i}1X", amount=9.99, type='expense'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_returns_compact_summaries(self):
+        """The tool returns one summary per series instead of raw occurrences"""
+        summaries = FinancialAnalysis(user_id=1).get_recurring_transactions()
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0]["description"], "spotify")
+        self.assertEqual(summaries[0]["cadence"], "monthly")
+        self.assertEqual(summaries[0]["occurrences"], 4)
+        self.assertEqual(FinancialAnalysis(user_id=2).get_recurring_transactions(), [])
+
+if __name__ == '__main__':
+    unittest.main()
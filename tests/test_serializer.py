@@ -0,0 +1,79 @@
+import unittest
+import json
+from datetime import date, timedelta
+from agent_app.src.serializer import estimate_tokens, serialize_tool_result
+
+def ledger(days):
+    """One income and one expense per day starting 2024-01-01"""
+    rows = []
+    for offset in range(days):
+        day = (date(2024, 1, 1) + timedelta(days=offset)).isoformat()
+        rows.append({"id": len(rows), "date": day, "description": "Sale", "amount": 100.0, "type": "income"})
+        rows.append({"id": len(rows), "date": day, "description": "Coffee", "amount": 4.5, "type": "expense"})
+    return rows
+
+class TestSerializer(unittest.TestCase):
+    """Test case for the token-budgeted tool result serializer"""
+
+    def test_small_results_are_columnar(self):
+        """Transactions become signed amounts with day deltas"""
+        payload = json.loads(serialize_tool_result(ledger(3)))
+        self.assertEqual(payload["format"], "columnar")
+        self.assertEqual(payload["start"], "2024-01-01")
+        self.assertEqual(payload["day_delta"], [0, 0, 1, 0, 1, 0])
+        self.assertEqual(payload["amount"][:2], [100.0, -4.5])
+        self.assertNotIn("id", payload)
+
+    def test_large_results_fall_back_to_weekly_buckets(self):
+        """Over the budget, transactions are pre-aggregated per calendar week"""
+        rows = ledger(365)
+        text = serialize_tool_result(rows, token_budget=1000)
+        payload = json.loads(text)
+        self.assertLessEqual(estimate_tokens(text), 1000)
+        self.assertLess(estimate_tokens(text), estimate_tokens(str(rows)) / 20)
+        self.assertEqual(payload["bucket_days"], 7)
+        self.assertEqual(payload["start"][0], "2024-01-01")  # a Monday
+        self.assertEqual(payload["income"][0], 700.0)
+        self.assertEqual(payload["count"], 730)
+        self.assertAlmostEqual(payload["total_expense"], 365 * 4.5)
+
+    def test_other_results_are_compact_json(self):
+        """Dicts and scalars are whitespace-free JSON rounded to cents"""
+        self.assertEqual(serialize_tool_result({"avg": 1.23456}), '{"avg":1.23}')
+        self.assertEqual(serialize_tool_result(150.0), "150.0")
+        self.assertEqual(serialize_tool_result([]), "[]")
+
+    def test_truncates_only_as_last_resort(self):
+        """A result that can't be aggregated is cut to the budget as valid JSON saying what was kept"""
+        text = serialize_tool_result({"blob": "x" * 1000}, token_budget=50)
+        payload = json.loads(text)
+        self.assertLessEqual(estimate_tokens(text), 50)
+        self.assertEqual(payload["truncated"]["chars_total"], len('{"blob":""}') + 1000)
+        self.assertEqual(len(payload["preview"]), payload["truncated"]["chars_returned"])
+
+        text = serialize_tool_result([{"name": f"item {i}"} for i in range(100)], token_budget=100)
+        payload = json.loads(text)
+        self.assertLessEqual(estimate_tokens(text), 100)
+        self.assertEqual(payload["truncated"]["items_total"], 100)
+        self.assertEqual(len(payload["items"]), payload["truncated"]["items_returned"])
+        self.assertGreater(len(payload["items"]), 0)
+
+    def test_undated_and_other_types(self):
+        """Rows without a YYYY-MM-DD date are kept apart; only 'expense' rows count as expenses"""
+        rows = ledger(2) + [
+            {"id": 90, "date": "01/06/2024", "description": "Cash", "amount": 20.0, "type": "expense"},
+            {"id": 91, "date": "2024-01-02", "description": "Move", "amount": 50.0, "type": "transfer"},
+        ]
+        payload = json.loads(serialize_tool_result(rows))
+        self.assertEqual(payload["count"], 5)
+        self.assertEqual(payload["amount"][-1], 0.0)
+        self.assertEqual(payload["undated"], {"count": 1, "date": ["01/06/2024"], "amount": [-20.0],
+                                              "description": ["Cash"]})
+
+        payload = json.loads(serialize_tool_result(rows + ledger(365), token_budget=1000))
+        self.assertEqual(payload["format"], "buckets")
+        self.assertAlmostEqual(payload["total_expense"], 367 * 4.5)
+        self.assertEqual(payload["undated"], {"income": 0.0, "expense": 20.0, "n": 1})
+
+if __name__ == '__main__':
+    unittest.main()
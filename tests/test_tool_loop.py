@@ -0,0 +1,139 @@
+import unittest
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+from agent_app import create_app
+from agent_app.src.services import FinancialAnalysis, CashFlowForecast
+from agent_app.src.models import db, User, Transaction, InitialBalance
+
+def tool_use(block_id, name, **arguments):
+    return SimpleNamespace(type="tool_use", id=block_id, name=name, input=arguments)
+
+def text(value):
+    return SimpleNamespace(type="text", text=value)
+
+class FakeClient:
+    """Stand-in for anthropic.Anthropic that replays scripted responses"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+        self.messages = SimpleNamespace(create=self.create)
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        content = self.responses.pop(0)
+        stop_reason = "tool_use" if any(block.type == "tool_use" for block in content) else "end_turn"
+        return SimpleNamespace(content=content, stop_reason=stop_reason)
+
+class TestToolLoop(unittest.TestCase):
+    """Test case for the multi-turn tool loop in _call_llm"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(InitialBalance(user_id=1, balance=100.0))
+        db.session.add(Transaction(user_id=1, date='2024-01-01', description='Sale', amount=50.0, type='income'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def service(self, responses, cls=FinancialAnalysis):
+        service = cls(user_id=1, api_key='test')
+        service.client = FakeClient(responses)
+        return service
+
+    def test_loops_until_final_answer(self):
+        """Tool turns are answered until Claude stops asking, with one report per turn"""
+        service = self.service([
+            [tool_use("a", "get_balance")],
+            [tool_use("b", "get_transactions", start_date="2024-01-01")],
+            [text("Done")],
+        ])
+        result = service._call_llm("prompt", tools=service.tools)
+
+        self.assertEqual(result["result"], "Done")
+        self.assertEqual([turn["turn"] for turn in result["turns"]], [1, 2, 3])
+        self.assertEqual(result["turns"][0]["tool_calls"], ["get_balance"])
+        self.assertIn("llm_ms", result["turns"][2])
+        last_messages = service.client.calls[-1]["messages"]
+        self.assertEqual(len(last_messages), 5)
+        self.assertEqual(last_messages[2]["content"][0]["content"], "150.0")
+
+    def test_tools_in_one_turn_run_in_parallel(self):
+        """Independent tool calls from one turn overlap instead of running back to back"""
+        def slow(*args, **kwargs):
+            time.sleep(0.3)
+            return 1
+
+        service = self.service([
+            [tool_use("a", "get_balance"), tool_use("b", "calculate_monthly_averages", months=6)],
+            [text("Done")],
+        ])
+        tools = {"get_balance": slow, "calculate_monthly_averages": slow}
+        started = time.monotonic()
+        service._call_llm("prompt", tools=tools)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_unencodable_result_is_a_tool_error(self):
+        """A result the serializer chokes on goes back to Claude as an error instead of ending the loop"""
+        service = self.service([[tool_use("a", "get_balance")], [text("Done")]])
+        with patch('agent_app.src.tool_loop.serialize_tool_result', side_effect=ValueError("bad row")):
+            result = service._call_llm("prompt", tools=service.tools)
+
+        self.assertEqual(result["result"], "Done")
+        tool_result = service.client.calls[-1]["messages"][2]["content"][0]
+        self.assertTrue(tool_result["is_error"])
+        self.assertIn("bad row", tool_result["content"])
+
+    def test_identical_calls_are_memoized(self):
+        """Repeated calls with the same (default-expanded) arguments hit the database once"""
+        service = self.service([
+            [tool_use("a", "calculate_monthly_averages"), tool_use("b", "calculate_monthly_averages", months=3)],
+            [tool_use("c", "calculate_monthly_averages", months=3)],
+            [text("Done")],
+        ])
+        with patch.object(FinancialAnalysis, 'calculate_monthly_averages', autospec=True,
+                          return_value={"avg_monthly_income": 1.0}) as averages:
+            result = service._call_llm("prompt", tools={"calculate_monthly_averages": service.calculate_monthly_averages})
+
+        self.assertEqual(averages.call_count, 1)
+        self.assertEqual(result["turns"][1]["memo_hits"], 1)
+
+    def test_turn_budget_forces_an_answer(self):
+        """The last allowed turn disables tools so the loop always terminates"""
+        service = self.service([
+            [tool_use("a", "get_balance")],
+            [text("Best effort")],
+        ])
+        result = service._call_llm("prompt", tools=service.tools, max_turns=2)
+
+        self.assertEqual(result["result"], "Best effort")
+        self.assertNotIn("tool_choice", service.client.calls[0])
+        self.assertEqual(service.client.calls[1]["tool_choice"], {"type": "none"})
+
+    def test_forecast_seeds_memo_from_snapshot(self):
+        """Data already in the forecast prompt is not fetched again when Claude asks for it"""
+        service = self.service([
+            [tool_use("a", "get_balance"), tool_use("b", "get_recurring_transactions")],
+            [text("Forecast")],
+        ], cls=CashFlowForecast)
+        snapshot = service.data_snapshot()
+        with patch.object(CashFlowForecast, 'get_balance') as balance, \
+                patch.object(CashFlowForecast, 'get_recurring_transactions') as recurring:
+            result = service.forecast(days=30, snapshot=snapshot)
+
+        balance.assert_not_called()
+        recurring.assert_not_called()
+        self.assertEqual(result["metadata"]["llm_turns"][0]["memo_hits"], 2)
+
+if __name__ == '__main__':
+    unittest.main()
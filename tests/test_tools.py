@@ -0,0 +1,88 @@
+import unittest
+from typing import Optional
+from types import SimpleNamespace
+from agent_app import create_app
+from agent_app.src.services import FinancialAnalysis
+from agent_app.src.tools import tool, tool_registry, tool_schema
+from agent_app.src.models import db, User, InitialBalance
+
+class BudgetAnalysis(FinancialAnalysis):
+    """Subclass adding a tool without touching the LLM loop"""
+
+    @tool(category="Expense category", limit="Monthly limit")
+    def check_budget(self, category: str, limit: float, strict: Optional[bool] = None):
+        """Compare a category's spending with a limit"""
+        return {"category": category, "limit": limit, "strict": strict}
+
+class FakeClient:
+    """Records the tool definitions it is sent and answers with text"""
+
+    def __init__(self):
+        self.calls = []
+        self.messages = SimpleNamespace(create=self.create)
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text="ok")], stop_reason="end_turn")
+
+class TestTools(unittest.TestCase):
+    """Test case for the decorator-based tool registry"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(InitialBalance(user_id=1, balance=100.0))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_schema_derived_from_signature(self):
+        """Types come from hints or defaults, required from missing defaults, text from the docstring"""
+        schema = tool_registry(BudgetAnalysis)["check_budget"]
+        self.assertEqual(schema["description"], "Compare a category's spending with a limit")
+        self.assertEqual(schema["input_schema"], {
+            "type": "object",
+            "properties": {
+                "category": {"type": "string", "description": "Expense category"},
+                "limit": {"type": "number", "description": "Monthly limit"},
+                "strict": {"type": "boolean"},
+            },
+            "required": ["category", "limit"],
+        })
+        months = tool_registry(FinancialAnalysis)["calculate_monthly_averages"]["input_schema"]["properties"]["months"]
+        self.assertEqual(months, {"type": "integer", "description": "Number of months to analyze"})
+        self.assertEqual(tool_schema(lambda days=7: None, "window")["input_schema"]["properties"]["days"]["type"],
+                         "integer")
+
+    def test_registry_is_built_once_per_class(self):
+        """Schemas are cached per class; subclasses inherit the base tools in definition order"""
+        self.assertIs(tool_registry(FinancialAnalysis), tool_registry(FinancialAnalysis))
+        self.assertEqual(list(tool_registry(BudgetAnalysis)), ["get_transactions", "get_balance",
+                                                               "calculate_monthly_averages", "get_monthly_trend",
+                                                               "get_recurring_transactions", "check_budget"])
+        self.assertNotIn("check_budget", FinancialAnalysis(user_id=1).tools)
+
+    def test_new_tool_is_offered_to_the_model(self):
+        """A subclass tool reaches the model's tool list through the registry"""
+        service = BudgetAnalysis(user_id=1, api_key='test')
+        service.client = FakeClient()
+        service._call_llm("prompt", tools=service.tools)
+        self.assertIn("check_budget", [schema["name"] for schema in service.client.calls[0]["tools"]])
+
+    def test_call_tool_dispatches_by_name(self):
+        """call_tool runs the named tool and reports unknown names"""
+        service = BudgetAnalysis(user_id=1)
+        self.assertEqual(service.call_tool("get_balance"), 100.0)
+        self.assertEqual(service.call_tool("check_budget", category="Rent", limit=800.0)["limit"], 800.0)
+        self.assertEqual(service.call_tool("drop_tables"), {"error": "Tool drop_tables not found"})
+
+if __name__ == '__main__':
+    unittest.main()
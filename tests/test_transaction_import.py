@@ -0,0 +1,176 @@
+import unittest
+import io
+import json
+import os
+import tempfile
+from sqlalchemy import event
+from agent_app import create_app
+from agent_app.src.importer import ImportRowError, TransactionImporter, normalize_date, parse_amount
+from agent_app.src.ledger import on_ledger_change, _change_callbacks
+from agent_app.src.models import db, User, Transaction, InitialBalance, BalanceSnapshot
+
+BANK_CSV = """Transaction Date,Description,Amount
+01/05/2024,Client payment,"1,200.00"
+01/06/2024,  Coffee   beans ,-3.50
+01/06/2024,Coffee beans,-3.50
+not a date,Broken,1.00
+01/07/2024,Rent,(900.00)
+"""
+
+DEBIT_CREDIT_CSV = """Date,Payee,Debit,Credit
+2024-02-01,Payroll,2500.00,
+2024-02-02,Invoice 17,,800.00
+"""
+
+OFX = """OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240305120000.000[-5:EST]<TRNAMT>-45.10<NAME>AWS<MEMO>Cloud
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240306<TRNAMT>300.00<NAME>Consulting invoice
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+class TestTransactionImport(unittest.TestCase):
+    """Test case for the streaming CSV/OFX import pipeline"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(InitialBalance(user_id=1, balance=100.0))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def ledger(self):
+        return [(t.date, t.description, t.amount, t.type)
+                for t in Transaction.query.filter_by(user_id=1).order_by(Transaction.id)]
+
+    def test_normalizes_bank_values(self):
+        """Dates become YYYY-MM-DD and amounts understand separators, signs and parentheses"""
+        self.assertEqual(normalize_date("01/05/2024"), "2024-01-05")
+        self.assertEqual(normalize_date("20240305120000.000[-5:EST]"), "2024-03-05")
+        self.assertEqual(normalize_date("05/01/2024", "%d/%m/%Y"), "2024-01-05")
+        self.assertEqual(normalize_date("5 Jan 2024"), "2024-01-05")
+        self.assertEqual([parse_amount(v) for v in ("1,200.00", "$-3.50", "(900.00)", "12.00-", "")],
+                         [1200.0, -3.5, -900.0, -12.0, None])
+        self.assertEqual([parse_amount(v) for v in ("1.234,56", "€ 12,50", "-1 234,5", "1,234", "1,234,567.8")],
+                         [1234.56, 12.5, -1234.5, 1234.0, 1234567.8])
+        with self.assertRaises(ImportRowError):
+            parse_amount("1.234.567,8.9")
+
+    def test_csv_import(self):
+        """Signed and debit/credit CSVs are imported; bad rows are reported, not fatal"""
+        report = TransactionImporter(1).import_stream(io.StringIO(BANK_CSV), "csv")
+        self.assertEqual((report["rows"], report["inserted"], report["duplicates"], report["invalid"]), (5, 4, 0, 1))
+        self.assertEqual(report["errors"], [{"row": 5, "message": "Unrecognized date 'not a date'"}])
+        self.assertIn("rows_per_second", report)
+
+        report = TransactionImporter(1).import_stream(io.StringIO(DEBIT_CREDIT_CSV + "2024-02-03,Pending,,\n"), "csv")
+        self.assertEqual(report["errors"], [{"row": 4, "message": "Missing amount"}])
+        self.assertEqual(self.ledger(), [
+            ("2024-01-05", "Client payment", 1200.0, "income"),
+            ("2024-01-06", "Coffee beans", 3.5, "expense"),
+            ("2024-01-06", "Coffee beans", 3.5, "expense"),
+            ("2024-01-07", "Rent", 900.0, "expense"),
+            ("2024-02-01", "Payroll", 2500.0, "expense"),
+            ("2024-02-02", "Invoice 17", 800.0, "income"),
+        ])
+
+    def test_ofx_import(self):
+        """SGML OFX statements are parsed read a chunk at a time"""
+        importer = TransactionImporter(1)
+        report = importer.import_stream(io.StringIO(OFX), "ofx")
+        self.assertEqual(report["inserted"], 2)
+        self.assertEqual(self.ledger(), [("2024-03-05", "AWS Cloud", 45.1, "expense"),
+                                         ("2024-03-06", "Consulting invoice", 300.0, "income")])
+
+    def test_reimport_adds_nothing(self):
+        """Rows already in the ledger are skipped, one existing row per imported row"""
+        db.session.add(Transaction(user_id=1, date='2024-01-06', description='Coffee beans', amount=3.5,
+                                   type='expense'))
+        db.session.commit()
+
+        first = TransactionImporter(1, batch_size=2).import_stream(io.StringIO(BANK_CSV), "csv")
+        # The file's second coffee is a new purchase; its first matches the existing row
+        self.assertEqual((first["inserted"], first["duplicates"]), (3, 1))
+        second = TransactionImporter(1, batch_size=2).import_stream(io.StringIO(BANK_CSV), "csv")
+        self.assertEqual((second["inserted"], second["duplicates"]), (0, 4))
+        self.assertEqual(len(self.ledger()), 4)
+
+    def test_batched_inserts_in_one_transaction(self):
+        """One executemany per batch, one commit, then the snapshot and listeners are updated"""
+        rows = "".join(f"2024-04-{day % 28 + 1:02d},Sale {day},{day}.00\n" for day in range(25))
+        statements, commits, notified = [], [], []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO "transaction"'):
+                statements.append(executemany)
+
+        def committed(conn):
+            commits.append(conn)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        event.listen(db.engine, 'commit', committed)
+        callback = on_ledger_change(notified.append)
+        try:
+            report = TransactionImporter(1, batch_size=10).import_stream(
+                io.StringIO("date,description,amount\n" + rows), "csv")
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+            event.remove(db.engine, 'commit', committed)
+            _change_callbacks.remove(callback)
+
+        self.assertEqual(report["inserted"], 25)
+        self.assertEqual(statements, [True, True, True])
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(notified, [{1}])
+        snapshot = BalanceSnapshot.query.filter_by(user_id=1).one()
+        self.assertEqual(snapshot.balance, 100.0 + sum(range(25)))
+        self.assertEqual(snapshot.last_transaction_id, db.session.query(db.func.max(Transaction.id)).scalar())
+
+    def test_unreadable_file_rolls_back(self):
+        """A CSV without the needed columns is rejected and nothing is written"""
+        with self.assertRaises(ValueError):
+            TransactionImporter(1).import_stream(io.StringIO("foo,bar\n1,2\n"), "csv")
+        self.assertEqual(self.ledger(), [])
+
+    def test_import_endpoint(self):
+        """Uploads are imported through /api/transactions/import"""
+        client = self.app.test_client()
+        response = client.post('/api/transactions/import', content_type='multipart/form-data',
+                                data={'file': (io.BytesIO(OFX.encode()), 'statement.qfx')})
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.data)
+        self.assertEqual((body["status"], body["inserted"]), ("success", 2))
+
+        response = client.post('/api/transactions/import', content_type='multipart/form-data',
+                                data={'file': (io.BytesIO(b'foo,bar\n'), 'x.csv')})
+        self.assertEqual(response.status_code, 400)
+
+    def test_import_command(self):
+        """flask transactions import reads a file from disk and reports rows/s"""
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as f:
+            f.write(DEBIT_CREDIT_CSV)
+        try:
+            result = self.app.test_cli_runner().invoke(args=['transactions', 'import', path, '--batch-size', '1'])
+        finally:
+            os.remove(path)
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('2 inserted, 0 duplicate(s), 0 invalid', result.output)
+        self.assertIn('rows/s', result.output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+from datetime import date
+from sqlalchemy import event
+from agent_app import create_app
+from agent_app.src.aggregates import LedgerAggregates
+from agent_app.src.services import FinancialAnalysis
+from agent_app.src.models import db, User, Transaction
+
+class TestTransactionIndexes(unittest.TestCase):
+    """Test case for the typed date column and the range-query indexes"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def query_plan(self, fn):
+        """Run fn, capture the last SELECT it issued and return SQLite's query plan for it"""
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT'):
+                captured.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            fn()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+        statement, parameters = captured[-1]
+        rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        return ' | '.join(row[-1] for row in rows)
+
+    def test_txn_date_kept_in_sync(self):
+        """txn_date follows the string column for ORM and Core writes"""
+        tx = Transaction(user_id=1, date='2024-05-06', description='a', amount=1.0, type='income')
+        db.session.add(tx)
+        db.session.commit()
+        self.assertEqual(tx.txn_date, date(2024, 5, 6))
+
+        tx.date = '2024-07-08'
+        db.session.commit()
+        self.assertEqual(db.session.get(Transaction, tx.id).txn_date, date(2024, 7, 8))
+
+        db.session.execute(Transaction.__table__.insert(), [
+            {"user_id": 1, "date": "2024-01-02", "description": "bulk", "amount": 2.0, "type": "expense"},
+            {"user_id": 1, "date": "not a date", "description": "bulk", "amount": 3.0, "type": "expense"},
+        ])
+        db.session.commit()
+        by_description = {t.amount: t.txn_date for t in Transaction.query.filter_by(description='bulk')}
+        self.assertEqual(by_description, {2.0: date(2024, 1, 2), 3.0: None})
+
+    def test_get_transactions_uses_user_date_index(self):
+        """Range filters in get_transactions search the (user_id, txn_date) index"""
+        plan = self.query_plan(lambda: FinancialAnalysis(user_id=1).get_transactions('2024-01-01', '2024-02-01'))
+        self.assertIn('USING INDEX ix_transaction_user_date', plan)
+        self.assertNotIn('SCAN transaction', plan)
+
+    def test_type_totals_use_user_type_date_index(self):
+        """Per-type range totals search the (user_id, type, txn_date) index"""
+        plan = self.query_plan(lambda: LedgerAggregates(1).totals_by_type(start_date='2024-01-01'))
+        self.assertIn('ix_transaction_user_', plan)
+        self.assertNotIn('SCAN transaction', plan)
+
+    def test_newest_first_listing_uses_index_order(self):
+        """Newest-first listing walks the index instead of sorting the table"""
+        plan = self.query_plan(lambda: Transaction.query.filter_by(user_id=1)
+                               .order_by(Transaction.txn_date.desc(), Transaction.id.desc()).all())
+        self.assertIn('USING INDEX ix_transaction_user_date', plan)
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+if __name__ == '__main__':
+    unittest.main()
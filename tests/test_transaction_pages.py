@@ -0,0 +1,129 @@
+import unittest
+import json
+from datetime import date
+from sqlalchemy import event
+from agent_app import create_app
+from agent_app.src.pagination import TransactionPages, encode_cursor
+from agent_app.src.models import db, User, Transaction
+
+class TestTransactionPages(unittest.TestCase):
+    """Test case for the keyset-paginated transactions API"""
+
+    def setUp(self):
+        """Set up test environment"""
+        self.app = create_app(test_config={'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add(User(id=1, username='alice', password='x'))
+        db.session.add(User(id=2, username='bob', password='x'))
+        rows = []
+        for day in range(1, 21):
+            # Two rows on each day, so pages break inside a date
+            rows.append({"user_id": 1, "date": f"2024-03-{day:02d}", "description": f"Sale {day}",
+                         "amount": float(day), "type": "income"})
+            rows.append({"user_id": 1, "date": f"2024-03-{day:02d}", "description": f"Rent {day}",
+                         "amount": float(day), "type": "expense"})
+        rows.append({"user_id": 1, "date": "someday", "description": "Undated", "amount": 1.0, "type": "expense"})
+        rows.append({"user_id": 2, "date": "2024-03-10", "description": "Sale", "amount": 5.0, "type": "income"})
+        db.session.execute(Transaction.__table__.insert(), rows)
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def get(self, **params):
+        response = self.client.get('/api/transactions', query_string=params)
+        return response.status_code, json.loads(response.data)
+
+    def walk(self, **params):
+        """Follow next_cursor to the end; returns every row and the number of pages"""
+        rows, pages, cursor = [], 0, None
+        while True:
+            status, page = self.get(**params, **({"cursor": cursor} if cursor else {}))
+            self.assertEqual(status, 200)
+            rows += page["transactions"]
+            pages += 1
+            cursor = page["next_cursor"]
+            if not page["has_more"]:
+                self.assertIsNone(cursor)
+                return rows, pages
+
+    def test_pages_cover_the_ledger_newest_first(self):
+        """Walking the cursor returns each row once, newest first, undated rows last"""
+        rows, pages = self.walk(limit=7)
+        expected = Transaction.query.filter_by(user_id=1)\
+            .order_by(Transaction.txn_date.desc(), Transaction.id.desc()).all()
+        self.assertEqual([row["id"] for row in rows], [t.id for t in expected if t.txn_date] +
+                         [t.id for t in expected if t.txn_date is None])
+        self.assertEqual(rows[-1]["description"], "Undated")
+        self.assertEqual(pages, 6)
+
+    def test_filters(self):
+        """Date range, type and description search narrow the rows"""
+        rows, _ = self.walk(start_date='2024-03-05', end_date='2024-03-09', type='expense', limit=2)
+        self.assertEqual([row["description"] for row in rows], [f"Rent {day}" for day in range(9, 4, -1)])
+
+        rows, _ = self.walk(q='sale 1')
+        self.assertEqual(len(rows), 11)  # Sale 1 and Sale 10-19
+        self.assertTrue(all(row["type"] == "income" for row in rows))
+
+        rows, _ = self.walk(q='100%')
+        self.assertEqual(rows, [])
+
+    def test_projection(self):
+        """`fields` returns only the requested columns"""
+        _, page = self.get(fields='amount,date', limit=1)
+        self.assertEqual(page["transactions"], [{"date": "2024-03-20", "amount": 20.0}])
+
+    def test_invalid_arguments(self):
+        """Bad cursors, fields, types and dates are rejected with 400"""
+        for params in ({"cursor": "nope"}, {"fields": "password"}, {"type": "transfer"},
+                       {"start_date": "03/01/2024"}):
+            status, body = self.get(**params)
+            self.assertEqual(status, 400, params)
+            self.assertEqual(body["status"], "error")
+
+    def test_page_is_one_index_range_read(self):
+        """A deep page seeks the (user_id, txn_date) index instead of scanning or sorting"""
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            captured.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            page = TransactionPages(1).page(cursor=encode_cursor(date(2024, 3, 10), 10**6), limit=5)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+        self.assertEqual(len(captured), 1)
+        self.assertEqual(page["transactions"][0]["date"], "2024-03-10")
+        statement, parameters = captured[0]
+        plan = ' | '.join(row[-1] for row in db.session.connection()
+                          .exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall())
+        self.assertIn('USING INDEX ix_transaction_user_date', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_page_renders_without_ledger_queries(self):
+        """The page renders the shell only; rows come from the API"""
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.get('/transactions')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'data-url="/api/transactions"', response.data)
+        self.assertEqual(statements, [])
+
+if __name__ == '__main__':
+    unittest.main()